@@ -4,21 +4,35 @@ Streamlitメインアプリケーション
 【重要】YUTOさんのプロンプトは一切改変しない
 """
 import streamlit as st
+import io
 import os
+import tempfile
+import time
 from datetime import datetime
-from io import BytesIO
 from dotenv import load_dotenv
 
 # 自作モジュール
-from modules.ir_extractor import get_financials_from_ir
-from modules.serp_api import search_market_data, extract_industry_keyword
-from modules.openai_api import generate_step1_report, generate_step2_report
+from modules.pipeline import run_step0
+from modules.checkpoint import open_run, STAGE_LABELS
+from modules.job_queue import get_job_queue, STATUS_DONE, STATUS_ERROR
+from modules.openai_api import OPENAI_MODEL, stream_step1_report, stream_step2_report, generate_step2_report_pipelined
 from modules.prompt_loader import PROMPT_STEP1, PROMPT_STEP2
-from modules.export import export_to_json, export_to_word, export_to_pdf
+from modules.report_store import get_report_store
+from modules.export import EXPORT_FORMATS, export_bytes, export_reports_zip, find_japanese_font, get_cached_export
 from modules.logger import get_logger
+from modules.tracing import trace_run
 
 logger = get_logger(__name__)
 
+# ANALYSIS_MODE=sync で従来どおりスクリプト実行内で分析(既定はバックグラウンドのジョブキュー)
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "background")
+# ジョブ状態の再読み込み間隔(秒)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# 過去の分析の検索結果の最大件数
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "50"))
+# 検索結果ZIPをメモリに置く上限(バイト)。超えた分は一時ファイルへ書き出す
+HISTORY_ZIP_SPOOL_MAX = int(os.getenv("HISTORY_ZIP_SPOOL_MAX", str(8 * 1024 * 1024)))
+
 
 def safe_streamlit_message(text: str) -> str:
     """
@@ -79,6 +93,9 @@ def main():
         st.session_state.company_name = ""
     if "job_info" not in st.session_state:
         st.session_state.job_info = ""
+    if "job_id" not in st.session_state:
+        # ブラウザ再接続(新しいセッション)でもURLのジョブIDから状態を復元
+        st.session_state.job_id = (st.experimental_get_query_params().get("job") or [None])[0]
 
     # 入力フォーム
     with st.form("input_form", clear_on_submit=False):
@@ -107,6 +124,12 @@ def main():
             help="求人票の内容を貼り付けてください(最低50文字)"
         )
 
+        reuse_saved = st.checkbox(
+            "保存済みの同じ分析があれば再利用する",
+            value=True,
+            help="同じ会社名・求人情報の過去の分析があれば、再生成せずに表示します"
+        )
+
         submitted = st.form_submit_button("🚀 分析を開始する", type="primary")
 
     if submitted:
@@ -123,71 +146,310 @@ def main():
             st.error("⚠️ 求人情報が短すぎます(最低50文字)")
             return
 
-        # キー未設定時の早期警告
-        if not openai_key:
-            st.error("❌ OPENAI_API_KEY が未設定です。`.env` に設定後、再起動してください。")
-            return
-        if not serpapi_key:
-            st.warning("⚠️ SERPAPI_KEY 未設定: 業界/IR検索が利用できず一部精度が低下します。続行は可能です。")
+        # 同じ入力の保存済みレポートがあれば再生成せずに表示
+        saved = get_report_store().find_latest(company_name, job_info) if reuse_saved else None
+        if saved:
+            load_saved_report(saved)
+            st.info(
+                "♻️ 保存済みの分析(" + datetime.fromtimestamp(saved["created_at"]).strftime("%Y-%m-%d %H:%M")
+                + " 作成)を表示しています。再分析する場合は「保存済みの同じ分析があれば再利用する」を外してください。"
+            )
+        else:
+            # キー未設定時の早期警告
+            if not openai_key:
+                st.error("❌ OPENAI_API_KEY が未設定です。`.env` に設定後、再起動してください。")
+                return
+            if not serpapi_key:
+                st.warning("⚠️ SERPAPI_KEY 未設定: 業界/IR検索が利用できず一部精度が低下します。続行は可能です。")
+
+            # 分析実行
+            if ANALYSIS_MODE == "sync":
+                run_analysis(company_name, job_info)
+            else:
+                job_id = get_job_queue().submit(company_name, job_info)
+                st.session_state.job_id = job_id
+                st.session_state.analysis_done = False
+                st.experimental_set_query_params(job=job_id)
 
-        # 分析実行
-        run_analysis(company_name, job_info)
+    # 過去の分析の検索・再表示
+    render_report_history()
+
+    # バックグラウンドジョブの進捗表示(完了までポーリング)
+    if st.session_state.job_id and not st.session_state.analysis_done:
+        render_job(st.session_state.job_id)
 
     # 結果表示
     if st.session_state.analysis_done:
         display_results()
 
 
+def load_saved_report(report: dict):
+    """保存済みレポートを結果表示の状態に設定"""
+    st.session_state.final_report = report["final_report"]
+    st.session_state.company_name = report["company_name"]
+    st.session_state.trace_summary = report.get("trace")
+    st.session_state.analysis_done = True
+    st.session_state.job_id = None
+    st.experimental_set_query_params()
+
+
+class _SpooledDownload(io.RawIOBase):
+    """SpooledTemporaryFile を download_button が受け付ける型(RawIOBase)として読み出すラッパー"""
+
+    def __init__(self, spool):
+        self._spool = spool
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._spool.seek(offset, whence)
+
+    def readinto(self, buffer) -> int:
+        data = self._spool.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def build_history_zip(store, report_ids: list):
+    """
+    検索結果のZIPを一時ファイル(上限まではメモリ)に作成し、再実行後もダウンロードできるようセッションに保持
+
+    Args:
+        store: レポートストア
+        report_ids: ZIPに含めるレポートID
+    """
+    previous = st.session_state.pop("history_zip_archive", None)
+    if previous:
+        previous["file"].close()
+    spool = tempfile.SpooledTemporaryFile(max_size=HISTORY_ZIP_SPOOL_MAX)
+    export_reports_zip(store.iter_reports(report_ids), spool)
+    st.session_state.history_zip_archive = {
+        "ids": report_ids,
+        "file": spool,
+        "file_name": f"分析レポート_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+    }
+
+
+def render_report_history():
+    """保存済みレポートの全文検索・再表示・ZIP一括ダウンロード"""
+    with st.expander("📚 過去の分析を検索", expanded=False):
+        store = get_report_store()
+        query = st.text_input(
+            "キーワード(会社名・業界・本文。空白区切りで絞り込み)",
+            key="history_query",
+            placeholder="例: 半導体 DX"
+        )
+        reports = store.search(query, limit=HISTORY_LIMIT)
+        if not reports:
+            st.caption("該当する分析はありません(保存件数: " + str(store.count()) + "件)")
+            return
+
+        st.table([
+            {
+                "作成日時": datetime.fromtimestamp(r["created_at"]).strftime("%Y-%m-%d %H:%M"),
+                "会社名": r["company_name"],
+                "業界": r["industry_keyword"] or "",
+                "売上高": r["revenue"] or "",
+                "営業利益率": r["operating_margin"] or "",
+                "所要秒": r["elapsed_seconds"] or "",
+                "該当箇所": r["snippet"] or "",
+            }
+            for r in reports
+        ])
+
+        labels = {
+            r["id"]: datetime.fromtimestamp(r["created_at"]).strftime("%Y-%m-%d %H:%M") + " " + r["company_name"]
+            for r in reports
+        }
+        selected = st.selectbox("表示する分析", options=list(labels), format_func=labels.get, key="history_selected")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("📄 この分析を表示", key="history_open"):
+                report = store.get(selected)
+                if report:
+                    load_saved_report(report)
+                    st.rerun()
+        with col2:
+            # ZIPは押されたときだけ作成し、検索結果が変わるまでダウンロードボタンを表示し続ける
+            report_ids = [r["id"] for r in reports]
+            if st.button("📦 検索結果をZIPで作成(" + str(len(reports)) + "件)", key="history_zip"):
+                with st.spinner("ZIPを作成中..."):
+                    build_history_zip(store, report_ids)
+            archive = st.session_state.get("history_zip_archive")
+            if archive and archive["ids"] == report_ids:
+                st.download_button(
+                    label="📥 ZIPをダウンロード",
+                    data=_SpooledDownload(archive["file"]),
+                    file_name=archive["file_name"],
+                    mime="application/zip",
+                    key="history_zip_download"
+                )
+
+
+def render_deltas(deltas, placeholder, interval: float = 0.3):
+    """
+    LLMのストリーミング出力をプレースホルダーに逐次描画しつつ、差分をそのまま後段へ流す
+
+    Args:
+        deltas: 生成テキストの差分を返すイテレータ
+        placeholder: st.empty() で作成した描画先
+        interval: 再描画の最小間隔(秒) ※差分ごとに描画すると再描画コストが大きいため
+
+    Yields:
+        受け取った差分
+    """
+    parts = []
+    last_render = 0.0
+    for delta in deltas:
+        parts.append(delta)
+        now = time.perf_counter()
+        if now - last_render >= interval:
+            placeholder.markdown("".join(parts) + " ▌")
+            last_render = now
+        yield delta
+    placeholder.markdown("".join(parts))
+
+
+def render_stream(deltas, placeholder, interval: float = 0.3) -> str:
+    """
+    LLMのストリーミング出力を受け取りながらプレースホルダーに逐次描画する
+
+    Returns:
+        連結済みの全文
+    """
+    return "".join(render_deltas(deltas, placeholder, interval))
+
+
+def render_step0_summary(step0: dict):
+    """ジョブに記録されたStep 0の結果を表示"""
+    financials = step0["financials"]
+    ir_elapsed = "(" + format(step0["ir_elapsed"], ".1f") + "秒)"
+    if step0.get("used_estimation"):
+        st.info("💡 子会社のため業界推定値を使用します")
+        st.success("✅ 財務データ（推定値）取得完了 " + ir_elapsed)
+        with st.expander("📊 取得した財務データ（推定値）"):
+            st.json(financials)
+            st.caption("⚠️ この企業は子会社のため、業界平均に基づく推定値を使用しています")
+    elif "error" in financials:
+        error_msg = str(financials.get('error', '不明なエラー'))
+        st.warning(safe_streamlit_message("⚠️ 財務データ取得失敗: " + error_msg))
+        st.info("💡 分析は継続しますが、財務情報は含まれません")
+    else:
+        st.success("✅ 財務データ取得完了 " + ir_elapsed)
+        with st.expander("📊 取得した財務データ"):
+            st.json(financials)
+
+    market_elapsed = "(" + format(step0["market_elapsed"], ".1f") + "秒)"
+    st.success("✅ 業界データ取得完了(キーワード: " + str(step0["industry_keyword"]) + ") " + market_elapsed)
+    st.caption(
+        "⏱ Step 0 所要時間: IR検索 " + format(step0["ir_elapsed"], ".1f") + "秒 / "
+        + "業界検索 " + format(step0["market_elapsed"], ".1f") + "秒 / "
+        + "合計(並列) " + format(step0["total_elapsed"], ".1f") + "秒"
+    )
+
+
+def render_job(job_id: str):
+    """
+    バックグラウンドジョブの進捗・途中経過を表示し、未完了なら一定間隔で再実行して状態を読み直す
+    ※ 分析はワーカースレッドで継続するため、再実行・再接続しても処理はやり直さない
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.session_state.job_id = None
+        st.experimental_set_query_params()
+        return
+
+    finished = job["status"] in (STATUS_DONE, STATUS_ERROR)
+    st.progress(job["progress"])
+    st.text(("✅ " if finished else "🔄 ") + str(job["stage"] or ""))
+    if job["step0"]:
+        render_step0_summary(job["step0"])
+    if job["draft_report"]:
+        st.success("✅ Step 1 完了")
+        st.caption(f"Step1出力サイズ: {len(job['draft_report'])} 文字")
+    if job["partial_report"]:
+        st.markdown(job["partial_report"] + " ▌")
+
+    if job["status"] == STATUS_DONE:
+        st.session_state.final_report = job["final_report"]
+        st.session_state.company_name = job["company_name"]
+        st.session_state.trace_summary = job["trace"]
+        st.session_state.analysis_done = True
+        st.success("🎉 分析が完了しました!")
+    elif job["status"] == STATUS_ERROR:
+        st.error(safe_streamlit_message("❌ エラーが発生しました: " + str(job["error"])))
+        st.session_state.job_id = None
+        st.experimental_set_query_params()
+    else:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+
 def run_analysis(company_name: str, job_info: str):
-    """分析処理のメイン関数"""
+    """分析処理のメイン関数(区間別の処理時間・トークン使用量を集計)"""
+    started = time.perf_counter()
+    with trace_run("analysis", company=company_name) as run:
+        result = _run_analysis_steps(company_name, job_info)
+    st.session_state.trace_summary = run.summary()
+    if result:
+        step0, final_report = result
+        get_report_store().save(
+            company_name, job_info, final_report, step0=step0, trace=st.session_state.trace_summary,
+            elapsed=time.perf_counter() - started, model=OPENAI_MODEL,
+        )
+
+
+def _run_analysis_steps(company_name: str, job_info: str):
+    """Step 0 → Step 1 → Step 2 を実行して画面に描画(完了時は (step0, final_report) を返す)"""
     progress_bar = st.progress(0)
     status_text = st.empty()
 
     try:
-        # Step 0-1: 財務データ取得
-        status_text.text("🔄 財務データ取得中(IR検索)...")
+        # Step 0: 財務データ(IR検索)と業界データ(Web検索)を並列取得
+        status_text.text("🔄 Step 0: 財務データ(IR検索)と業界データ(Web検索)を並列取得中...")
         progress_bar.progress(10)
-        financials = get_financials_from_ir(company_name)
-
-        if "error" in financials:
-            # フォールバック戦略: 推定値使用
-            if financials.get("use_estimation"):
-                st.info("💡 子会社のため業界推定値を使用します")
-                # 業界推定値を生成
-                from modules.ir_extractor import generate_industry_estimation
-                financials = generate_industry_estimation(company_name, job_info)
-                st.success("✅ 財務データ（推定値）取得完了")
-                with st.expander("📊 取得した財務データ（推定値）"):
-                    st.json(financials)
-                    st.caption("⚠️ この企業は子会社のため、業界平均に基づく推定値を使用しています")
-            else:
-                # 通常のエラー処理
-                error_msg = str(financials.get('error', '不明なエラー'))
-                safe_warning_text = safe_streamlit_message("⚠️ 財務データ取得失敗: " + error_msg)
-                st.warning(safe_warning_text)
-                st.info("💡 分析は継続しますが、財務情報は含まれません")
-        else:
-            st.success("✅ 財務データ取得完了")
-            with st.expander("📊 取得した財務データ"):
-                st.json(financials)
-
-        # Step 0-2: 業界データ取得
-        status_text.text("🔄 業界データ取得中(Web検索)...")
-        progress_bar.progress(30)
-        industry_keyword = extract_industry_keyword(job_info)
-        market_data = search_market_data(industry_keyword)
-        st.success("✅ 業界データ取得完了(キーワード: " + str(industry_keyword) + ")")
+        # 前回の同じ入力の実行が途中で失敗していれば、保存済みの段階から再開
+        checkpoint = open_run(company_name, job_info)
+        if checkpoint.resumed_stages:
+            st.info("♻️ 前回の途中結果から再開します(" + STAGE_LABELS[checkpoint.first_missing()] + " から)")
+        step0 = run_step0(company_name, job_info, checkpoint=checkpoint)
+        financials = step0["financials"]
+        market_data = step0["market_data"]
+        progress_bar.progress(40)
+
+        # Step 0-1 / 0-2: 財務データ・業界データ取得結果
+        render_step0_summary(step0)
 
         # Step 1: 初回分析
         status_text.text("🔄 Step 1: 初回分析生成中...")
         progress_bar.progress(50)
-        draft_report = generate_step1_report(
-            company_name=company_name,
-            job_info=job_info,
-            financials=financials,
-            market_data=market_data,
-            prompt_template=PROMPT_STEP1
-        )
+        step1_view = st.empty()
+        # STEP2_PIPELINED=1: Step1の章が確定し次第、その章のStep2レビューを並列に開始
+        pipelined = os.getenv("STEP2_PIPELINED") == "1" and not checkpoint.has("draft_report")
+        draft_report = checkpoint.get("draft_report")
+        if draft_report is None:
+            step1_deltas = render_deltas(
+                stream_step1_report(
+                    company_name=company_name,
+                    job_info=job_info,
+                    financials=financials,
+                    market_data=market_data,
+                    prompt_template=PROMPT_STEP1
+                ),
+                step1_view
+            )
+            if pipelined:
+                status_text.text("🔄 Step 1 生成中(完成した章から Step 2 レビューを並列実行)...")
+                draft_report, final_report = generate_step2_report_pipelined(step1_deltas, PROMPT_STEP2)
+            else:
+                draft_report = "".join(step1_deltas)
+            if len(draft_report or "") >= 300:
+                checkpoint.save(draft_report=draft_report)
+        step1_view.empty()
         # デバッグ: Step1の出力長とプレビュー
         try:
             step1_len = len(draft_report or "")
@@ -207,11 +469,19 @@ def run_analysis(company_name: str, job_info: str):
         progress_bar.progress(70)
 
         # Step 2: レビュー・修正
-        status_text.text("🔄 Step 2: レビュー・修正中...")
-        final_report = generate_step2_report(
-            draft_report=draft_report,
-            prompt_template=PROMPT_STEP2
-        )
+        if not pipelined:
+            status_text.text("🔄 Step 2: レビュー・修正中...")
+            step2_view = st.empty()
+            final_report = render_stream(
+                stream_step2_report(
+                    draft_report=draft_report,
+                    prompt_template=PROMPT_STEP2
+                ),
+                step2_view
+            )
+            step2_view.empty()
+        if final_report:
+            checkpoint.save(final_report=final_report)
 
         # デバッグ: Step2の出力長とプレビュー
         try:
@@ -230,6 +500,7 @@ def run_analysis(company_name: str, job_info: str):
         st.session_state.analysis_done = True
         st.success("🎉 分析が完了しました!")
         st.balloons()
+        return step0, final_report
 
     except Exception as e:
         error_msg = str(e)[:200]  # 最初200文字のみで安全化
@@ -238,6 +509,32 @@ def run_analysis(company_name: str, job_info: str):
         st.session_state.analysis_done = False
 
 
+def render_export_button(company_name: str, final_report: str, fmt: str, label: str):
+    """
+    エクスポートのダウンロードボタン(未生成なら「作成」ボタンを表示し、押されたときだけ生成)
+
+    Args:
+        company_name: 会社名
+        final_report: 完全版レポート
+        fmt: "json" / "word" / "pdf" / "html"
+        label: ボタンのラベル
+    """
+    data = get_cached_export(company_name, final_report, fmt)
+    if data is None and st.button(label + " を作成", key="export_" + fmt):
+        with st.spinner("ファイルを作成中..."):
+            data = export_bytes(company_name, final_report, fmt)
+    if data is None:
+        return
+    mime, ext = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=label,
+        data=data,
+        file_name=f"{company_name}_分析_{datetime.now().strftime('%Y%m%d_%H%M')}.{ext}",
+        mime=mime,
+        key="download_" + fmt
+    )
+
+
 def display_results():
     """結果表示(1画面完結)"""
     st.markdown("---")
@@ -246,45 +543,38 @@ def display_results():
     company_name = st.session_state.company_name
     final_report = st.session_state.final_report
 
-    # ダウンロードボタン (PDF削除版)
-    col1, col2 = st.columns(2)
-    
+    # ダウンロードボタン
+    # 生成済みのファイルはプロセス内で再利用し、未生成の形式はボタン押下時にだけ生成する
+    col1, col2, col3, col4 = st.columns(4)
+
     with col1:
-        json_data = export_to_json(company_name, final_report)
-        st.download_button(
-            label="📥 JSON",
-            data=json_data,
-            file_name=f"{company_name}_分析_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-            mime="application/json"
-        )
+        render_export_button(company_name, final_report, "json", "📥 JSON")
 
     with col2:
-        doc = export_to_word(company_name, final_report)
-        bio = BytesIO()
-        doc.save(bio)
-        st.download_button(
-            label="📄 Word",
-            data=bio.getvalue(),
-            file_name=f"{company_name}_分析_{datetime.now().strftime('%Y%m%d_%H%M')}.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
+        render_export_button(company_name, final_report, "word", "📄 Word")
+
+    # PDF出力は日本語フォント(fonts/ 配下)を配置した場合のみ
+    if find_japanese_font():
+        with col3:
+            render_export_button(company_name, final_report, "pdf", "📕 PDF")
 
-    # PDF出力は日本語フォント配置が必要なため一時的に無効化
-    # with col3:
-    #     pdf_data = export_to_pdf(company_name, final_report)
-    #     st.download_button(
-    #         label="📕 PDF",
-    #         data=pdf_data,
-    #         file_name=f"{company_name}_分析_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-    #         mime="application/pdf"
-    #     )
+    with col4:
+        render_export_button(company_name, final_report, "html", "🌐 HTML")
 
     st.markdown("---")
     st.markdown(final_report, unsafe_allow_html=False)
     st.markdown("---")
 
+    # 区間別の処理時間・トークン使用量(詳細は logs/trace.jsonl)
+    trace_summary = st.session_state.get("trace_summary")
+    if trace_summary:
+        with st.expander("⏱ 処理時間・トークン使用量の内訳", expanded=False):
+            st.table(trace_summary)
+
     if st.button("🔄 新しい分析を開始"):
         st.session_state.analysis_done = False
+        st.session_state.job_id = None
+        st.experimental_set_query_params()
         st.rerun()
 
 
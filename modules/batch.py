@@ -0,0 +1,424 @@
+"""
+複数の(会社名, 求人情報)をまとめて分析するバッチ処理
+
+- 入力はCSV(列: company_name, job_info, 任意で id)またはJSONL(同じキー)
+- 同一会社のIR取得・同一求人の業界判定・同一業界キーワードの業界データ検索は1回だけ実行して共有
+- ジョブ単位で並列実行(同時実行数は上限付き)、OpenAI呼び出しは背景優先度で送信
+- 完了したジョブは results.jsonl に1行ずつ追記し、再実行時は完了済みをスキップ(中断後の再開)
+- Step1/Step2 は画面版と同じ生成関数・同じプロンプトを使用(出力は同一)
+- --openai-batch 指定時は Step1/Step2 を OpenAI Batch API でまとめて生成(夜間の大量実行向け)
+
+使い方:
+    python -m modules.batch jobs.csv --out batch_output --workers 4
+"""
+import argparse
+import contextvars
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .cache_store import make_cache_key
+from .checkpoint import RunCheckpoint, open_run
+from .ir_extractor import get_financials_from_ir
+from .llm_scheduler import PRIORITY_BACKGROUND, request_priority
+from .logger import get_logger
+from .tracing import trace_run
+from .openai_api import (
+    OPENAI_MODEL,
+    generate_reports_batch,
+    generate_step1_report,
+    generate_step2_report,
+    generate_step2_report_pipelined,
+    stream_step1_report,
+)
+from .pipeline import run_step0
+from .report_store import get_report_store
+from .serp_api import extract_industry_keyword, search_market_data
+
+logger = get_logger(__name__)
+
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+RESULTS_FILENAME = "results.jsonl"
+REPORTS_DIRNAME = "reports"
+
+# 入力列名の別名(Excelで作成した日本語ヘッダーのCSVにも対応)
+COLUMN_ALIASES = {
+    "company_name": ("company_name", "company", "会社名", "企業名"),
+    "job_info": ("job_info", "job", "求人情報", "求人票"),
+    "id": ("id", "job_id", "ID"),
+}
+
+
+def make_job_id(company_name: str, job_info: str) -> str:
+    """(会社名, 求人情報) から安定したジョブIDを作成(再開時の照合に使用)"""
+    return make_cache_key([company_name.strip(), job_info.strip()])[:16]
+
+
+def _pick(row: Dict[str, Any], field: str) -> str:
+    for name in COLUMN_ALIASES[field]:
+        value = row.get(name)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+def load_jobs(path: str) -> List[Dict[str, str]]:
+    """
+    CSV / JSONL からジョブ一覧を読み込む
+
+    Args:
+        path: 入力ファイル(拡張子 .jsonl / .json はJSONL、それ以外はCSVとして読む)
+
+    Returns:
+        [{"id", "company_name", "job_info"}, ...] ※同一IDの重複行は先勝ちで除外
+    """
+    if path.lower().endswith((".jsonl", ".json")):
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        # Excel出力のBOM付きUTF-8にも対応
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    jobs: List[Dict[str, str]] = []
+    seen: Set[str] = set()
+    for line_no, row in enumerate(rows, start=1):
+        company_name = _pick(row, "company_name")
+        job_info = _pick(row, "job_info")
+        if not company_name or not job_info:
+            logger.warning("[Batch] skip row %d: company_name/job_info missing", line_no)
+            continue
+        job_id = _pick(row, "id") or make_job_id(company_name, job_info)
+        if job_id in seen:
+            continue
+        seen.add(job_id)
+        jobs.append({"id": job_id, "company_name": company_name, "job_info": job_info})
+    return jobs
+
+
+class SharedWork:
+    """
+    ジョブ間で共通する取得処理のメモ化(スレッドセーフ)
+
+    同じキーを複数スレッドが同時に要求した場合も実行は1回だけで、他スレッドはその結果を待つ
+    """
+
+    def __init__(self):
+        self._futures: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _once(self, kind: str, key: str, func: Callable[[str], Any]) -> Any:
+        with self._lock:
+            future = self._futures.get((kind, key))
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[(kind, key)] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(func(key))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def financials(self, company_name: str) -> Dict[str, str]:
+        """会社ごとのIR財務データ(呼び出し側で変更できるようコピーを返す)"""
+        return dict(self._once("ir", company_name.strip(), get_financials_from_ir))
+
+    def market(self, job_info: str) -> Tuple[str, str]:
+        """求人ごとの業界キーワード → 業界キーワードごとの業界データ"""
+        industry_keyword = self._once("industry", job_info.strip(), extract_industry_keyword)
+        market_data = self._once("market", industry_keyword, search_market_data)
+        return industry_keyword, market_data
+
+
+def prepare_job(job: Dict[str, str], shared: SharedWork, checkpoint: Optional[RunCheckpoint] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    Step0(財務データ・業界データ取得、推定値フォールバックを含む)を実行
+
+    Args:
+        job: {"id", "company_name", "job_info"}
+        shared: 共通処理のメモ化
+        checkpoint: 段階別チェックポイント(保存済みの段階は実行しない)
+
+    Returns:
+        (結果レコード, 業界データ)
+    """
+    company_name, job_info = job["company_name"], job["job_info"]
+    step0 = run_step0(
+        company_name, job_info, fetch_financials=shared.financials, fetch_market=shared.market, checkpoint=checkpoint
+    )
+    record = {
+        "id": job["id"],
+        "company_name": company_name,
+        "job_info": job_info,
+        "financials": step0["financials"],
+        "used_estimation": step0["used_estimation"],
+        "industry_keyword": step0["industry_keyword"],
+    }
+    return record, step0["market_data"]
+
+
+def _failed(job: Dict[str, str], e: Exception, record: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    logger.exception("[Batch] job failed: id=%s company=%s", job["id"], job["company_name"])
+    record = record or {"id": job["id"], "company_name": job["company_name"], "job_info": job["job_info"]}
+    record.update({"status": "error", "error": type(e).__name__ + ": " + str(e)[:500]})
+    return record
+
+
+def _finish(record: Dict[str, Any], started: float) -> Dict[str, Any]:
+    record["elapsed"] = round(time.perf_counter() - started, 1)
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+def run_job(
+    job: Dict[str, str],
+    shared: SharedWork,
+    prompt_step1: str,
+    prompt_step2: str,
+    pipelined: bool = False,
+    resume: bool = True,
+) -> Dict[str, Any]:
+    """
+    1件分の分析(Step0 → Step1 → Step2)を実行
+
+    Args:
+        job: {"id", "company_name", "job_info"}
+        shared: 共通処理のメモ化
+        prompt_step1: Step1プロンプト(変更禁止)
+        prompt_step2: Step2プロンプト(変更禁止)
+        pipelined: Step1の章ごとにStep2レビューを並列実行するか
+        resume: 前回の途中結果(段階別チェックポイント)から再開するか
+
+    Returns:
+        結果レコード(status は "done" / "error")
+    """
+    company_name, job_info = job["company_name"], job["job_info"]
+    started = time.perf_counter()
+    record = None
+    try:
+        with request_priority(PRIORITY_BACKGROUND), trace_run("batch_job", company=company_name, job_id=job["id"]) as run:
+            checkpoint = open_run(company_name, job_info, resume=resume)
+            record, market_data = prepare_job(job, shared, checkpoint)
+            financials = record["financials"]
+            draft_report, final_report = checkpoint.get("draft_report"), None
+            if draft_report is None and pipelined:
+                draft_report, final_report = generate_step2_report_pipelined(
+                    stream_step1_report(company_name, job_info, financials, market_data, prompt_step1),
+                    prompt_step2,
+                )
+            elif draft_report is None:
+                draft_report = generate_step1_report(company_name, job_info, financials, market_data, prompt_step1)
+            # 画面版と同じガード: 極端に短い場合はStep2へ送らない
+            if len(draft_report or "") < 300:
+                raise RuntimeError("Step1の出力が想定より短い/空です(" + str(len(draft_report or "")) + "文字)")
+            checkpoint.save(draft_report=draft_report)
+            if final_report is None:
+                final_report = generate_step2_report(draft_report, prompt_step2)
+            checkpoint.save(final_report=final_report)
+
+        record.update({
+            "status": "done", "draft_report": draft_report, "final_report": final_report, "trace": run.summary(),
+        })
+    except Exception as e:
+        record = _failed(job, e, record)
+    return _finish(record, started)
+
+
+def run_jobs_openai_batch(
+    jobs: List[Dict[str, str]],
+    shared: SharedWork,
+    prompt_step1: str,
+    prompt_step2: str,
+    max_workers: int,
+    resume: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Step0は並列実行し、Step1/Step2はBatch APIでまとめて生成(夜間の大量実行向け)
+
+    Yields:
+        結果レコード(Step0で失敗したジョブは即座に、それ以外はStep2バッチ完了後に返す)
+    ※ Step0は段階別チェックポイントから再開する。Step1/Step2は生成結果キャッシュにあるものは送信しない
+    """
+    started = time.perf_counter()
+    prepared: Dict[str, Tuple[Dict[str, Any], str]] = {}
+    checkpoints: Dict[str, RunCheckpoint] = {}
+
+    def prepare(job: Dict[str, str]):
+        checkpoints[job["id"]] = open_run(job["company_name"], job["job_info"], resume=resume)
+        with request_priority(PRIORITY_BACKGROUND):
+            return prepare_job(job, shared, checkpoints[job["id"]])
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(contextvars.copy_context().run, prepare, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                prepared[job["id"]] = future.result()
+            except Exception as e:
+                yield _finish(_failed(job, e), started)
+
+    items = [
+        {
+            "id": job_id,
+            "company_name": record["company_name"],
+            "job_info": record["job_info"],
+            "financials": record["financials"],
+            "market_data": market_data,
+        }
+        for job_id, (record, market_data) in prepared.items()
+    ]
+    if not items:
+        return
+    reports = generate_reports_batch(items, prompt_step1, prompt_step2)
+    for job_id, (record, _) in prepared.items():
+        report = reports.get(job_id) or {"draft_report": None, "final_report": None, "error": "バッチ結果なし"}
+        record["draft_report"] = report["draft_report"]
+        if len(report["draft_report"] or "") >= 300:
+            checkpoints[job_id].save(draft_report=report["draft_report"])
+        if report["error"] or not report["final_report"]:
+            record.update({"status": "error", "error": report["error"] or "Step2の出力が空です"})
+        else:
+            checkpoints[job_id].save(final_report=report["final_report"])
+            record.update({"status": "done", "final_report": report["final_report"]})
+        yield _finish(record, started)
+
+
+def load_completed_ids(output_dir: str) -> Set[str]:
+    """results.jsonl から完了済み(status=done)のジョブIDを取得"""
+    path = os.path.join(output_dir, RESULTS_FILENAME)
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中断時に書きかけの行は無視(そのジョブは再実行される)
+                continue
+            if record.get("status") == "done":
+                done.add(record.get("id"))
+    return done
+
+
+def run_batch(
+    jobs: Iterable[Dict[str, str]],
+    output_dir: str,
+    max_workers: Optional[int] = None,
+    resume: bool = True,
+    pipelined: bool = False,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    openai_batch: bool = False,
+) -> Dict[str, Any]:
+    """
+    ジョブ一覧をまとめて実行し、結果を output_dir に保存
+
+    Args:
+        jobs: load_jobs() の戻り値と同じ形式のジョブ一覧
+        output_dir: 出力先(results.jsonl と reports/<id>.md を作成)
+        max_workers: 同時実行ジョブ数(省略時は環境変数 BATCH_MAX_WORKERS)
+        resume: Trueなら results.jsonl の完了済みジョブをスキップし、失敗したジョブは保存済みの段階から再開
+        pipelined: Step2をパイプライン版で実行するか
+        on_result: ジョブ完了ごとに結果レコードを受け取るコールバック
+        openai_batch: TrueならStep1/Step2をOpenAI Batch APIでまとめて生成(完了まで数時間かかる場合あり)
+
+    Returns:
+        {"total", "skipped", "done", "error", "elapsed", "shared_hits", "shared_misses"}
+    """
+    from .prompt_loader import PROMPT_STEP1, PROMPT_STEP2
+
+    jobs = list(jobs)
+    os.makedirs(os.path.join(output_dir, REPORTS_DIRNAME), exist_ok=True)
+    completed = load_completed_ids(output_dir) if resume else set()
+    pending = [job for job in jobs if job["id"] not in completed]
+    logger.info("[Batch] start: total=%d, skipped=%d, workers=%d", len(jobs), len(jobs) - len(pending), max_workers or BATCH_MAX_WORKERS)
+
+    shared = SharedWork()
+    summary = {"total": len(jobs), "skipped": len(jobs) - len(pending), "done": 0, "error": 0}
+    started = time.perf_counter()
+    results_path = os.path.join(output_dir, RESULTS_FILENAME)
+
+    workers = max_workers or BATCH_MAX_WORKERS
+
+    def completed_records() -> Iterator[Dict[str, Any]]:
+        if openai_batch:
+            yield from run_jobs_openai_batch(pending, shared, PROMPT_STEP1, PROMPT_STEP2, workers, resume)
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, run_job, job, shared, PROMPT_STEP1, PROMPT_STEP2, pipelined, resume)
+                for job in pending
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    store = get_report_store()
+    with open(results_path, "a", encoding="utf-8") as results_file:
+        for record in completed_records():
+            if record["status"] == "done":
+                report_path = os.path.join(output_dir, REPORTS_DIRNAME, record["id"] + ".md")
+                with open(report_path, "w", encoding="utf-8") as f:
+                    f.write(record["final_report"])
+                # 画面の「過去の分析」から検索・再利用できるよう保存
+                store.save(
+                    record["company_name"], record["job_info"], record["final_report"],
+                    step0=record, trace=record.get("trace"), elapsed=record.get("elapsed"), model=OPENAI_MODEL,
+                )
+            # 1件ごとにディスクへ書き出し(中断しても完了分は失われない)
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results_file.flush()
+            os.fsync(results_file.fileno())
+            summary[record["status"]] += 1
+            logger.info(
+                "[Batch] %s: id=%s company=%s (%.1fs) [%d/%d]",
+                record["status"], record["id"], record["company_name"], record["elapsed"],
+                summary["done"] + summary["error"], len(pending)
+            )
+            if on_result:
+                on_result(record)
+
+    summary["elapsed"] = round(time.perf_counter() - started, 1)
+    summary["shared_hits"] = shared.hits
+    summary["shared_misses"] = shared.misses
+    logger.info("[Batch] finished: %s", summary)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLIエントリポイント"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="企業分析レポートのバッチ生成")
+    parser.add_argument("input", help="入力ファイル(CSV または JSONL)")
+    parser.add_argument("--out", default="batch_output", help="出力ディレクトリ")
+    parser.add_argument("--workers", type=int, default=None, help="同時実行ジョブ数")
+    parser.add_argument("--no-resume", action="store_true", help="完了済みジョブも再実行する")
+    parser.add_argument("--pipelined", action="store_true", help="Step2をパイプライン版で実行する")
+    parser.add_argument("--openai-batch", action="store_true", help="Step1/Step2をOpenAI Batch APIでまとめて生成する")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.input)
+    summary = run_batch(
+        jobs, args.out, max_workers=args.workers, resume=not args.no_resume, pipelined=args.pipelined,
+        openai_batch=args.openai_batch,
+        on_result=lambda r: print("[" + r["status"] + "] " + r["company_name"] + " (" + str(r["elapsed"]) + "秒)"),
+    )
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0 if summary["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
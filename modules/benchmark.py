@@ -0,0 +1,318 @@
+"""
+記録済みの外部応答を使ったオフラインベンチマーク
+
+- record: 実際のサービスに接続して1回実行し、SerpAPI・PDF・OpenAIの応答とシナリオを REPLAY_DIR に保存
+- run:    ネットワークに接続せず記録を再生し、段階ごとの所要時間・実行中のピークRSS(別スレッドで定期取得)・メモリ割り当てを計測
+- 計測対象: get_financials_from_ir / search_market_data / extract_text_from_pdf / export_to_json・word・pdf
+- 計測時は各種キャッシュ(SerpAPI・PDF・生成結果・チェックポイント)を無効化し、毎回の処理量を揃える
+
+使い方:
+    # 記録(ネットワーク・APIキーが必要)
+    python -m modules.benchmark record --company 三菱電機 --job-info-file job.txt
+    # 計測(オフライン)
+    python -m modules.benchmark run --repeat 5 --json bench.json
+    # 前回結果との比較
+    python -m modules.benchmark run --compare bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+SCENARIO_FILENAME = "scenario.json"
+# 段階実行中にRSSを読む間隔(秒)
+RSS_SAMPLE_INTERVAL = float(os.getenv("BENCH_RSS_INTERVAL", "0.005"))
+
+# 記録済みレポートがない場合のエクスポート計測用サンプル(見出し・箇条書き・表を含む)
+_SAMPLE_SECTION = """## Step{n}: 事業概要と採用市場
+
+### 事業の特徴
+- 主力事業の売上構成と成長率
+- **競合優位性**: 技術力と顧客基盤
+
+| カテゴリ | 項目 | 内容 | 根拠 | 備考 |
+|---|---|---|---|---|
+| 財務 | 売上高 | 5兆円規模 | 決算短信 | 連結 |
+| 人材 | 採用人数 | 年間1,000名 | 採用サイト | 新卒含む |
+
+本文テキストのサンプルです。採用戦略の検討に必要な情報を整理しています。
+"""
+
+
+def _set_offline_env(mode: str) -> None:
+    """計測条件を揃えるための環境変数(モジュールのimport前に設定)"""
+    os.environ["REPLAY_MODE"] = mode
+    for name in ("SERPAPI_CACHE_DISABLE", "PDF_CACHE_DISABLE", "OPENAI_CACHE_DISABLE", "RUN_CHECKPOINT_DISABLE"):
+        os.environ[name] = "1"
+    if mode == "replay":
+        # 再生時は実際のキーは不要(キー未設定による早期returnを避けるためのダミー)
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+        os.environ.setdefault("SERPAPI_KEY", "replay")
+        os.environ.setdefault("TRACE_DISABLE", "1")
+
+
+def _scenario_path() -> str:
+    from .replay import replay_dir
+    return os.path.join(replay_dir(), SCENARIO_FILENAME)
+
+
+def load_scenario() -> Dict[str, Any]:
+    """記録時に保存したシナリオ(会社名・業界キーワード・レポート)を読み込む"""
+    path = _scenario_path()
+    if not os.path.exists(path):
+        raise FileNotFoundError("シナリオがありません。先に record を実行してください: " + path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record(companies: List[str], job_info: str, with_report: bool = True) -> Dict[str, Any]:
+    """
+    実際のサービスに接続して各段階を1回実行し、応答とシナリオを保存
+
+    Args:
+        companies: 会社名のリスト
+        job_info: 求人情報(業界キーワード判定・レポート生成に使用)
+        with_report: Step1/Step2まで実行してエクスポート計測用のレポートも記録するか
+
+    Returns:
+        保存したシナリオ
+    """
+    from .ir_extractor import get_financials_from_ir
+    from .openai_api import generate_step1_report, generate_step2_report
+    from .prompt_loader import PROMPT_STEP1, PROMPT_STEP2
+    from .serp_api import extract_industry_keyword, search_market_data
+
+    industry_keyword = extract_industry_keyword(job_info)
+    market_data = search_market_data(industry_keyword)
+    financials = {company: get_financials_from_ir(company) for company in companies}
+
+    report = None
+    if with_report and companies:
+        draft = generate_step1_report(companies[0], job_info, financials[companies[0]], market_data, PROMPT_STEP1)
+        report = generate_step2_report(draft, PROMPT_STEP2)
+
+    scenario = {
+        "companies": companies,
+        "job_info": job_info,
+        "industry_keywords": [industry_keyword],
+        "report_company": companies[0] if companies else "",
+        "report": report,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    path = _scenario_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(scenario, f, ensure_ascii=False, indent=2)
+    return scenario
+
+
+def _current_rss_mb() -> Optional[float]:
+    """現在のRSS(MB)。/proc のない環境(macOS・Windows)ではNone"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _RssSampler:
+    """
+    計測中のRSSを別スレッドで一定間隔ごとに読み、段階ごとのピークを求める
+
+    ru_maxrss はプロセス開始以来の最大値で下がらないため、段階別の比較には使えない。
+    間隔より短いピークは取りこぼす可能性がある。
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.baseline: Optional[float] = None
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        rss = _current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "_RssSampler":
+        self.baseline = _current_rss_mb()
+        self.peak = self.baseline
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    1段階を計測(時間計測と割り当て計測は別に行い、tracemallocのオーバーヘッドを時間に含めない)
+
+    Args:
+        name: 段階名
+        func: 計測対象(引数なし)
+        repeat: 時間計測の繰り返し回数
+
+    Returns:
+        {"stage", "status", "runs", "median_ms", "min_ms", "max_ms", "peak_rss_mb", "rss_growth_mb", "alloc_peak_kb", "alloc_blocks"}
+        ※ peak_rss_mb はこの段階の実行中に観測したRSSの最大値、rss_growth_mb は段階開始時からの増加分
+    """
+    status = "ok"
+    timings = []
+    gc.collect()
+    with _RssSampler() as rss:
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                status = "error: " + type(e).__name__ + ": " + str(e)[:100]
+                break
+            timings.append((time.perf_counter() - started) * 1000.0)
+            if isinstance(result, dict) and "error" in result:
+                status = "error: " + str(result["error"])[:100]
+
+    alloc_peak_kb = alloc_blocks = None
+    if timings:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            func()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            alloc_peak_kb = round(peak / 1024, 1)
+            alloc_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        except Exception:
+            pass
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "stage": name,
+        "status": status,
+        "runs": len(timings),
+        "median_ms": round(statistics.median(timings), 1) if timings else None,
+        "min_ms": round(min(timings), 1) if timings else None,
+        "max_ms": round(max(timings), 1) if timings else None,
+        "peak_rss_mb": round(rss.peak, 1) if rss.peak is not None else None,
+        "rss_growth_mb": round(rss.peak - rss.baseline, 1) if rss.peak is not None else None,
+        "alloc_peak_kb": alloc_peak_kb,
+        "alloc_blocks": alloc_blocks,
+    }
+
+
+def run(repeat: int = 3, stages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    記録を再生して各段階を計測
+
+    Args:
+        repeat: 各段階の繰り返し回数
+        stages: 計測する段階名の接頭辞(例: ["pdf", "export"])。Noneなら全段階
+
+    Returns:
+        段階ごとの計測結果
+    """
+    from .export import export_to_json, export_to_pdf, export_to_word
+    from .ir_extractor import extract_text_from_pdf, get_financials_from_ir
+    from .replay import load_pdf_fixtures
+    from .serp_api import search_market_data
+
+    scenario = load_scenario()
+    report = scenario.get("report") or "\n".join(_SAMPLE_SECTION.format(n=n) for n in range(1, 9))
+    report_company = scenario.get("report_company") or "サンプル株式会社"
+
+    cases: List[tuple] = []
+    for company in scenario.get("companies", []):
+        cases.append(("ir.get_financials_from_ir[" + company + "]", lambda c=company: get_financials_from_ir(c)))
+    for keyword in scenario.get("industry_keywords", []):
+        cases.append(("serp.search_market_data[" + keyword + "]", lambda k=keyword: search_market_data(k)))
+    for name, content in load_pdf_fixtures().items():
+        cases.append(("pdf.extract_text_from_pdf[" + name[:12] + "]", lambda b=content: extract_text_from_pdf(b)))
+    cases.append(("export.json", lambda: export_to_json(report_company, report)))
+    cases.append(("export.word", lambda: export_to_word(report_company, report)))
+    cases.append(("export.pdf", lambda: export_to_pdf(report_company, report)))
+
+    results = []
+    for name, func in cases:
+        if stages and not any(name.startswith(prefix) for prefix in stages):
+            continue
+        results.append(measure(name, func, repeat))
+    return results
+
+
+def format_results(results: List[Dict[str, Any]], baseline: Optional[List[Dict[str, Any]]] = None) -> str:
+    """計測結果を表形式の文字列に整形(baseline 指定時は中央値の増減率を併記)"""
+    base = {r["stage"]: r for r in baseline or []}
+    header = ["stage", "median_ms", "min_ms", "max_ms", "peak_rss_mb", "rss_growth_mb", "alloc_peak_kb", "alloc_blocks", "status"]
+    if baseline:
+        header.insert(2, "vs_base")
+    rows = [header]
+    for r in results:
+        row = [str(r.get(h)) for h in header if h != "vs_base"]
+        if baseline:
+            prev = base.get(r["stage"], {}).get("median_ms")
+            diff = "-" if not prev or r["median_ms"] is None else format((r["median_ms"] - prev) / prev * 100, "+.1f") + "%"
+            row.insert(2, diff)
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)) for row in rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLIエントリポイント"""
+    parser = argparse.ArgumentParser(description="記録・再生によるオフラインベンチマーク")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="実際のサービスに接続して応答を記録")
+    rec.add_argument("--company", action="append", required=True, help="会社名(複数指定可)")
+    rec.add_argument("--job-info-file", required=True, help="求人情報のテキストファイル")
+    rec.add_argument("--skip-report", action="store_true", help="Step1/Step2の生成を記録しない")
+
+    bench = sub.add_parser("run", help="記録を再生して計測(オフライン)")
+    bench.add_argument("--repeat", type=int, default=3, help="各段階の繰り返し回数")
+    bench.add_argument("--stage", action="append", help="計測する段階名の接頭辞(例: pdf, export)")
+    bench.add_argument("--json", help="計測結果の保存先")
+    bench.add_argument("--compare", help="比較する過去の計測結果(JSON)")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        from dotenv import load_dotenv
+        load_dotenv()
+        _set_offline_env("record")
+        with open(args.job_info_file, "r", encoding="utf-8") as f:
+            job_info = f.read()
+        scenario = record(args.company, job_info, with_report=not args.skip_report)
+        print("recorded: " + _scenario_path() + " (companies=" + str(len(scenario["companies"])) + ")")
+        return 0
+
+    _set_offline_env("replay")
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    results = run(repeat=args.repeat, stages=args.stage)
+    print(format_results(results, baseline))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,222 @@
+"""
+SQLiteベースの永続キャッシュ (TTL + LRU)
+
+- 値はJSONで保存し、名前空間(クエリ種別など)ごとにTTLを指定
+- 件数・合計サイズの上限を超えたら最終アクセスが古い順に削除(LRU)
+- ヒット/ミス数を名前空間ごとに集計
+- 読み取り専用環境などでDBを開けない場合はキャッシュ無効として動作(例外を投げない)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# キャッシュ格納先(環境変数 APP_CACHE_DIR で変更可能)
+CACHE_DIR = os.getenv(
+    "APP_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache"),
+)
+
+_caches: Dict[str, "SQLiteCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def make_cache_key(payload: Any) -> str:
+    """
+    任意のJSON化可能な値から安定したキャッシュキー(sha256)を作成
+
+    Args:
+        payload: dict/list/str など
+
+    Returns:
+        16進ハッシュ文字列
+    """
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """TTL付き・サイズ上限付きのキーバリューキャッシュ"""
+
+    def __init__(self, path: str, max_entries: int = 5000, max_bytes: int = 200_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            cache_dir = os.path.dirname(path)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+            conn.commit()
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            # Streamlit Cloud等の読み取り専用環境ではキャッシュなしで続行
+            logger.warning("[Cache] disabled (%s): %s", path, str(e)[:100])
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _count(self, namespace: str, field: str) -> None:
+        ns_stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        ns_stats[field] += 1
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        キャッシュ取得(期限切れ・未登録はNone)
+
+        Args:
+            namespace: 名前空間
+            key: キャッシュキー
+
+        Returns:
+            保存した値 or None
+        """
+        with self._lock:
+            if self._conn is None:
+                self._count(namespace, "misses")
+                return None
+            now = time.time()
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                if row is None:
+                    self._count(namespace, "misses")
+                    return None
+                value, expires_at = row
+                if expires_at is not None and expires_at < now:
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                    )
+                    self._conn.commit()
+                    self._count(namespace, "misses")
+                    return None
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+                self._conn.commit()
+                self._count(namespace, "hits")
+                return json.loads(value)
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("[Cache] get failed: %s", str(e)[:100])
+                self._count(namespace, "misses")
+                return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        キャッシュ保存(上限超過時はLRUで削除)
+
+        Args:
+            namespace: 名前空間
+            key: キャッシュキー
+            value: JSON化可能な値
+            ttl: 有効秒数(Noneなら無期限、0以下なら保存せず既存の値も削除)
+        """
+        with self._lock:
+            if self._conn is None:
+                return
+            if ttl is not None and ttl <= 0:
+                # 即時に期限切れとなる値は保存しない(以前の値も返さない)
+                try:
+                    self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("[Cache] set failed: %s", str(e)[:100])
+                return
+            now = time.time()
+            raw = json.dumps(value, ensure_ascii=False)
+            expires_at = now + ttl if ttl is not None else None
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries"
+                    " (namespace, key, value, size, created_at, expires_at, last_access)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, key, raw, len(raw.encode("utf-8")), now, expires_at, now),
+                )
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("[Cache] set failed: %s", str(e)[:100])
+
+    def _evict(self) -> None:
+        """期限切れを削除し、件数・サイズ上限を超えた分を最終アクセス順に削除"""
+        self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        )
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        victims = []
+        for namespace, key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((namespace, key))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+        logger.info("[Cache] evicted %d entries (%s)", len(victims), os.path.basename(self.path))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """名前空間ごとのヒット/ミス数(プロセス内集計)"""
+        with self._lock:
+            return {ns: dict(v) for ns, v in self._stats.items()}
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """キャッシュ削除(namespace指定時はその名前空間のみ)"""
+        with self._lock:
+            if self._conn is None:
+                return
+            if namespace is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+
+
+def get_cache(name: str, max_entries: int = 5000, max_bytes: int = 200_000_000) -> SQLiteCache:
+    """
+    名前付きキャッシュを取得(プロセス内で共有)
+
+    Args:
+        name: DBファイル名(拡張子なし)
+        max_entries: 最大件数
+        max_bytes: 最大合計サイズ(バイト)
+
+    Returns:
+        SQLiteCache
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = SQLiteCache(os.path.join(CACHE_DIR, name + ".sqlite3"), max_entries, max_bytes)
+            _caches[name] = cache
+        return cache
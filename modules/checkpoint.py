@@ -0,0 +1,90 @@
+"""
+分析パイプラインの段階別チェックポイント
+
+- 各段階の出力(財務データ・業界キーワード・業界データ・Step1草稿・Step2完成版)を実行ID単位で保存
+- 途中で失敗した実行は、同じ入力で再実行すると最初の未完了段階から再開する
+  (例: Step2失敗後の再実行はStep2のLLM呼び出し1回のみ。IR検索・業界検索・Step1は再実行しない)
+- 完了済み(Step2まで保存済み)の実行を同じ入力で開始した場合は新しい実行として最初から行う
+- 保存先は cache_store のSQLiteキャッシュ(`RUN_CHECKPOINT_DISABLE=1` で無効)
+"""
+import os
+from typing import Any, Dict, Optional
+
+from .cache_store import get_cache, make_cache_key
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 途中経過の保持期間(秒)
+RUN_CHECKPOINT_TTL = int(os.getenv("RUN_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+# 段階の実行順
+STAGES = ("financials", "used_estimation", "industry_keyword", "market_data", "draft_report", "final_report")
+# 画面表示用の段階名
+STAGE_LABELS = {
+    "financials": "財務データ取得",
+    "used_estimation": "財務データ取得",
+    "industry_keyword": "業界データ取得",
+    "market_data": "業界データ取得",
+    "draft_report": "Step 1",
+    "final_report": "Step 2",
+}
+
+
+def is_enabled() -> bool:
+    """`RUN_CHECKPOINT_DISABLE=1` でチェックポイント無効"""
+    return os.getenv("RUN_CHECKPOINT_DISABLE") != "1"
+
+
+def make_run_id(company_name: str, job_info: str) -> str:
+    """(会社名, 求人情報) から実行IDを作成(同じ入力の再実行で途中経過を見つけるため)"""
+    return make_cache_key(["run", company_name.strip(), job_info.strip()])[:24]
+
+
+class RunCheckpoint:
+    """1回の分析実行の段階別出力"""
+
+    def __init__(self, run_id: str, stages: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.stages: Dict[str, Any] = dict(stages or {})
+        # 開始時点で保存済みだった段階(再開表示用)
+        self.resumed_stages = [s for s in STAGES if s in self.stages]
+
+    def has(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        return self.stages.get(stage, default)
+
+    def save(self, **stages: Any) -> None:
+        """段階の出力を保存(呼び出しごとに永続化)"""
+        self.stages.update(stages)
+        if is_enabled():
+            get_cache("runs").set("run", self.run_id, self.stages, ttl=RUN_CHECKPOINT_TTL)
+        logger.info("[Checkpoint] saved %s (run=%s)", ",".join(stages), self.run_id)
+
+    def first_missing(self) -> Optional[str]:
+        """最初の未完了段階(全段階完了ならNone)"""
+        return next((s for s in STAGES if s not in self.stages), None)
+
+
+def open_run(company_name: str, job_info: str, resume: bool = True, run_id: Optional[str] = None) -> RunCheckpoint:
+    """
+    実行を開始(未完了の前回実行があれば、その途中経過から再開)
+
+    Args:
+        company_name: 会社名
+        job_info: 求人情報
+        resume: Falseなら保存済みの途中経過を使わない
+        run_id: 実行ID(省略時は入力から作成)
+
+    Returns:
+        RunCheckpoint
+    """
+    run_id = run_id or make_run_id(company_name, job_info)
+    stages = get_cache("runs").get("run", run_id) if resume and is_enabled() else None
+    if stages and "final_report" not in stages:
+        checkpoint = RunCheckpoint(run_id, stages)
+        logger.info("[Checkpoint] resume run=%s from %s", run_id, checkpoint.first_missing())
+        return checkpoint
+    return RunCheckpoint(run_id)
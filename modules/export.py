@@ -5,32 +5,42 @@
  - PDF: fpdf(旧)からfpdf2のUnicode対応を前提とした実装へ拡張
  - 日本語フォント(TTF)が存在する場合は全文字を保持
  - フォント未配置時はASCIIフォールバックし、Streamlit側で警告表示できるようメッセージ返却を想定
+ - Word/PDF/JSON/HTML はいずれも modules/markdown_ast.py の解析結果(レポートごとに1回)から生成
 """
+import hashlib
+import html
 import json
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
+from io import BytesIO
 from docx import Document
 from fpdf import FPDF
-import re
-from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from .font_registry import JAPANESE_FONT_CANDIDATES, add_japanese_font, find_japanese_font
+from .markdown_ast import inline_text, parse_report
+from .tracing import traced
 
-JAPANESE_FONT_CANDIDATES = [
-    # プロジェクト内配置想定
-    Path(__file__).parent.parent / "fonts" / "NotoSansJP-Regular.ttf",
-    Path(__file__).parent.parent / "fonts" / "IPAexGothic.ttf",
-    # ユーザが手動追加するかもしれない場所の例 (macOS Home ディレクトリ配下など)
-    Path.home() / "Library" / "Fonts" / "NotoSansJP-Regular.ttf",
-    Path.home() / "Library" / "Fonts" / "IPAexGothic.ttf",
-]
+# 生成済みエクスポートの保持件数(プロセス内・LRU)
+EXPORT_CACHE_MAX = int(os.getenv("EXPORT_CACHE_MAX", "32"))
 
+# 形式ごとの MIME タイプと拡張子
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "word": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+    "pdf": ("application/pdf", "pdf"),
+    "html": ("text/html", "html"),
+}
 
-def _find_japanese_font() -> Path | None:
-    for p in JAPANESE_FONT_CANDIDATES:
-        if p.is_file():
-            return p
-    return None
+_export_cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+_export_cache_lock = threading.Lock()
 
 
+@traced("export.json")
 def export_to_json(
     company_name: str,
     final_report: str
@@ -48,12 +58,49 @@ def export_to_json(
     data = {
         "company_name": company_name,
         "generated_at": datetime.now().isoformat(),
-        "report": final_report
+        "report": final_report,
+        # 見出し・段落・表などの構造(形式は modules/markdown_ast.py を参照)
+        "blocks": list(parse_report(final_report))
     }
     
     return json.dumps(data, ensure_ascii=False, indent=2)
 
 
+def _add_word_runs(paragraph, inlines, bold: bool = False):
+    """段落に太字情報付きのランを追加"""
+    for run in inlines:
+        paragraph.add_run(run["text"]).bold = True if (bold or run["bold"]) else None
+
+
+def _add_word_block(doc, block):
+    """構文解析済みの1ブロックをWord文書に追加"""
+    kind = block["type"]
+    if kind == "heading":
+        _add_word_runs(doc.add_heading(level=min(block["level"], 9)), block["inlines"])
+    elif kind == "paragraph":
+        _add_word_runs(doc.add_paragraph(), block["inlines"])
+    elif kind == "list":
+        style = "List Number" if block["ordered"] else "List Bullet"
+        for item in block["items"]:
+            # 既定テンプレートの入れ子スタイルは3段階まで
+            level = min(item["level"], 2)
+            _add_word_runs(doc.add_paragraph(style=style + (" " + str(level + 1) if level else "")), item["inlines"])
+    elif kind == "table":
+        rows = ([block["header"]] if block["header"] else []) + block["rows"]
+        if not rows or not rows[0]:
+            return
+        table = doc.add_table(rows=len(rows), cols=len(rows[0]))
+        table.style = 'Table Grid'
+        for r, row in enumerate(rows):
+            cells = table.rows[r].cells
+            for i, inlines in enumerate(row):
+                # ヘッダー行は太字
+                _add_word_runs(cells[i].paragraphs[0], inlines, bold=bool(block["header"]) and r == 0)
+    elif kind == "code":
+        doc.add_paragraph(block["text"])
+
+
+@traced("export.word")
 def export_to_word(company_name: str, content: str):
     """
     分析結果をWord文書として出力
@@ -72,69 +119,61 @@ def export_to_word(company_name: str, content: str):
     date_para = doc.add_paragraph(f'作成日: {datetime.now().strftime("%Y年%m月%d日")}')
     date_para.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
     
-    # コンテンツを行ごとに処理
-    lines = content.split('\n')
-    in_table = False
-    table = None
-    
-    for line in lines:
-        line = line.strip()
-        
-        # 表の開始を検出（統合アウトプット表）
-        if line.startswith('| カテゴリ') and '分析項目' in line:
-            in_table = True
-            # 5列のテーブルを作成
-            table = doc.add_table(rows=1, cols=5)
-            table.style = 'Table Grid'
-            
-            # ヘッダー行を設定
-            header_cells = table.rows[0].cells
-            headers = ['カテゴリ', '分析項目', 'ファクト/推論', '採用への示唆', '確認要否']
-            for i, header in enumerate(headers):
-                header_cells[i].text = header
-                # ヘッダーを太字に
-                for paragraph in header_cells[i].paragraphs:
-                    for run in paragraph.runs:
-                        run.font.bold = True
-            continue
-            
-        # 表の区切り行をスキップ
-        elif line.startswith('| :---') or line.startswith('|:---'):
-            continue
-            
-        # 表のデータ行を処理
-        elif in_table and line.startswith('|') and line.endswith('|'):
-            # データを分割
-            cells_data = [cell.strip() for cell in line.split('|')[1:-1]]
-            
-            if len(cells_data) == 5:  # 5列のデータがある場合
-                # 新しい行を追加
-                row = table.add_row()
-                for i, cell_data in enumerate(cells_data):
-                    # Markdownの太字記号を除去
-                    clean_data = cell_data.replace('**', '')
-                    row.cells[i].text = clean_data
-            continue
-            
-        # 表の終了を検出
-        elif in_table and (line == '' or line.startswith('#')):
-            in_table = False
-            table = None
-            
-        # 通常のテキスト処理（表以外）
-        if not in_table:
-            if line.startswith('# '):
-                doc.add_heading(line[2:], level=1)
-            elif line.startswith('## '):
-                doc.add_heading(line[3:], level=2)
-            elif line.startswith('### '):
-                doc.add_heading(line[4:], level=3)
-            elif line:
-                doc.add_paragraph(line)
+    for block in parse_report(content):
+        _add_word_block(doc, block)
     
     return doc
 
 
+def _pdf_multi_cell(pdf, height: float, text: str):
+    # fpdf2 の multi_cell は右端で終わるため、毎回左余白から書き始める
+    pdf.set_x(pdf.l_margin)
+    try:
+        pdf.multi_cell(0, height, txt=text)
+    except Exception:
+        # 念のためフォールバック
+        pdf.multi_cell(0, height, txt=''.join(ch if ord(ch) < 128 else '?' for ch in text))
+
+
+def _add_pdf_block(pdf, block, safe):
+    """構文解析済みの1ブロックをPDFに追加(PDFは太字を区別しない)"""
+    kind = block["type"]
+    if kind == "heading":
+        size_map = {1: 14, 2: 12, 3: 11}
+        pdf.ln(2)
+        pdf.set_font(pdf.font_family, size=size_map.get(block["level"], 11))
+        _pdf_multi_cell(pdf, 7, safe(inline_text(block["inlines"])))
+        pdf.set_font(pdf.font_family, size=10)
+        return
+    if kind == "paragraph":
+        _pdf_multi_cell(pdf, 5, safe(inline_text(block["inlines"])))
+    elif kind == "list":
+        for n, item in enumerate(block["items"], 1):
+            marker = str(n) + ". " if block["ordered"] else "- "
+            _pdf_multi_cell(pdf, 5, "    " * item["level"] + marker + safe(inline_text(item["inlines"])))
+    elif kind == "table":
+        rows = ([block["header"]] if block["header"] else []) + block["rows"]
+        texts = [[safe(inline_text(cell)) for cell in row] for row in rows]
+        if not texts or not texts[0]:
+            return
+        pdf.set_font(pdf.font_family, size=8)
+        try:
+            # 日本語フォントは太字を登録していないため、ヘッダー行も通常の行として描画
+            with pdf.table(first_row_as_headings=False) as table:
+                for row in texts:
+                    table_row = table.row()
+                    for text in row:
+                        table_row.cell(text)
+        except Exception:
+            for row in texts:
+                _pdf_multi_cell(pdf, 4, " | ".join(row))
+        pdf.set_font(pdf.font_family, size=10)
+    elif kind == "code":
+        _pdf_multi_cell(pdf, 5, safe(block["text"]))
+    pdf.ln(2)
+
+
+@traced("export.pdf")
 def export_to_pdf(
     company_name: str,
     final_report: str
@@ -163,18 +202,17 @@ def export_to_pdf(
     pdf.set_auto_page_break(auto=True, margin=12)
     pdf.add_page()
 
-    font_path = _find_japanese_font()
+    # 日本語フォント(解析済みのフォント情報を共有、埋め込み時に使用文字へ絞り込み)
     japanese_enabled = False
-    if font_path:
-        try:
-            # 名称 "JP" で追加
-            pdf.add_font("JP", "", str(font_path), uni=True)
+    try:
+        # 名称 "JP" で追加
+        if add_japanese_font(pdf, "JP"):
             pdf.set_font("JP", size=14)
             japanese_enabled = True
-        except Exception:
-            # フォント追加失敗時はフォールバック
+        else:
             pdf.set_font("Arial", size=14)
-    else:
+    except Exception:
+        # フォント追加失敗時はフォールバック
         pdf.set_font("Arial", size=14)
 
     # タイトル
@@ -194,47 +232,12 @@ def export_to_pdf(
     # 本文フォントを少し小さく
     pdf.set_font(pdf.font_family, size=10)
 
-    for raw_line in final_report.split("\n"):
-        line = raw_line.rstrip()
-        if not line:
-            pdf.ln(4)
-            continue
-
-        # 見出しレベル検出 (Markdown記法)
-        heading_level = 0
-        if line.startswith("### "):
-            heading_level = 3
-            line = line[4:].strip()
-        elif line.startswith("## "):
-            heading_level = 2
-            line = line[3:].strip()
-        elif line.startswith("# "):
-            heading_level = 1
-            line = line[2:].strip()
-
-        if heading_level:
-            size_map = {1: 14, 2: 12, 3: 11}
-            pdf.set_font(pdf.font_family, size=size_map.get(heading_level, 12))
-            pdf.multi_cell(0, 7, txt=line)
-            pdf.set_font(pdf.font_family, size=10)
-            continue
-
-        # テーブル行やその他複雑記法は簡易的にスキップ/整形
-        if line.startswith("|") and line.endswith("|"):
-            continue
-
-        if not japanese_enabled:
-            # 日本語未対応フォントの場合はASCII以外を '?' に置換
-            safe_line = ''.join(ch if ord(ch) < 128 else '?' for ch in line)
-        else:
-            safe_line = line
+    def safe(text: str) -> str:
+        # 日本語未対応フォントの場合はASCII以外を '?' に置換
+        return text if japanese_enabled else ''.join(ch if ord(ch) < 128 else '?' for ch in text)
 
-        try:
-            pdf.multi_cell(0, 5, txt=safe_line)
-        except Exception:
-            # 念のためフォールバック
-            fallback = ''.join(ch if ord(ch) < 128 else '?' for ch in safe_line)
-            pdf.multi_cell(0, 5, txt=fallback)
+    for block in parse_report(final_report):
+        _add_pdf_block(pdf, block, safe)
 
     if not japanese_enabled:
         pdf.ln(6)
@@ -255,3 +258,292 @@ def export_to_pdf(
         pdf_fallback.cell(0, 10, txt="Report Generation Error", ln=True)
         pdf_fallback.multi_cell(0, 6, txt="Japanese font is required. Please install a TrueType font in fonts/ directory.")
         return pdf_fallback.output()
+
+
+def _html_inlines(inlines) -> str:
+    return "".join(
+        "<strong>" + html.escape(run["text"]) + "</strong>" if run["bold"] else html.escape(run["text"])
+        for run in inlines
+    )
+
+
+def _html_block(block) -> str:
+    """構文解析済みの1ブロックをHTMLに変換"""
+    kind = block["type"]
+    if kind == "heading":
+        tag = "h" + str(min(block["level"] + 1, 6))
+        return "<" + tag + ">" + _html_inlines(block["inlines"]) + "</" + tag + ">"
+    if kind == "paragraph":
+        return "<p>" + _html_inlines(block["inlines"]) + "</p>"
+    if kind == "list":
+        tag = "ol" if block["ordered"] else "ul"
+        parts, depth = [], -1
+        for item in block["items"]:
+            # 入れ子は1段ずつ深くする(飛び級のインデントは1段として扱う)
+            level = min(item["level"], depth + 1)
+            if level > depth:
+                parts.append("<" + tag + ">")
+                depth = level
+            else:
+                parts.append("</li>")
+                while depth > level:
+                    parts.append("</" + tag + "></li>")
+                    depth -= 1
+            parts.append("<li>" + _html_inlines(item["inlines"]))
+        parts.append("</li>" + ("</" + tag + "></li>") * depth + "</" + tag + ">")
+        return "".join(parts)
+    if kind == "table":
+        parts = ["<table>"]
+        if block["header"]:
+            parts.append("<thead><tr>" + "".join("<th>" + _html_inlines(c) + "</th>" for c in block["header"]) + "</tr></thead>")
+        parts.append("<tbody>")
+        for row in block["rows"]:
+            parts.append("<tr>" + "".join("<td>" + _html_inlines(c) + "</td>" for c in row) + "</tr>")
+        parts.append("</tbody></table>")
+        return "".join(parts)
+    if kind == "rule":
+        return "<hr>"
+    if kind == "code":
+        return "<pre>" + html.escape(block["text"]) + "</pre>"
+    return ""
+
+
+@traced("export.html")
+def export_to_html(
+    company_name: str,
+    final_report: str
+) -> str:
+    """
+    HTML形式でエクスポート(単体で開けるファイル)
+
+    Args:
+        company_name: 会社名
+        final_report: 完全版レポート
+
+    Returns:
+        HTML文字列
+    """
+    title = html.escape(f"{company_name} 企業分析レポート")
+    body = "\n".join(_html_block(block) for block in parse_report(final_report))
+    return (
+        "<!DOCTYPE html>\n<html lang=\"ja\">\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<title>{title}</title>\n"
+        "<style>body{font-family:sans-serif;max-width:960px;margin:2em auto;line-height:1.6}"
+        "table{border-collapse:collapse;margin:1em 0}th,td{border:1px solid #999;padding:4px 8px;vertical-align:top}"
+        "th{background:#eee}</style>\n</head>\n<body>\n"
+        f"<h1>{title}</h1>\n<p>作成日: {datetime.now().strftime('%Y年%m月%d日')}</p>\n"
+        f"{body}\n</body>\n</html>\n"
+    )
+
+
+def _export_cache_key(company_name: str, final_report: str, fmt: str) -> Tuple[str, str, str]:
+    return (company_name, hashlib.sha256(final_report.encode("utf-8")).hexdigest(), fmt)
+
+
+def get_cached_export(company_name: str, final_report: str, fmt: str) -> Optional[bytes]:
+    """
+    生成済みのエクスポートを取得(未生成ならNone。生成は行わない)
+
+    Args:
+        company_name: 会社名
+        final_report: 完全版レポート
+        fmt: "json" / "word" / "pdf" / "html"
+
+    Returns:
+        ファイルのバイト列 または None
+    """
+    key = _export_cache_key(company_name, final_report, fmt)
+    with _export_cache_lock:
+        data = _export_cache.get(key)
+        if data is not None:
+            _export_cache.move_to_end(key)
+        return data
+
+
+def _render(company_name: str, final_report: str, fmt: str) -> bytes:
+    """指定形式のバイト列を生成(キャッシュなし)"""
+    if fmt == "json":
+        return export_to_json(company_name, final_report).encode("utf-8")
+    if fmt == "html":
+        return export_to_html(company_name, final_report).encode("utf-8")
+    if fmt == "word":
+        bio = BytesIO()
+        export_to_word(company_name, final_report).save(bio)
+        return bio.getvalue()
+    return bytes(export_to_pdf(company_name, final_report))
+
+
+def export_bytes(company_name: str, final_report: str, fmt: str) -> bytes:
+    """
+    レポートを指定形式のバイト列に変換(同じ会社名・レポート・形式は1回だけ生成して再利用)
+
+    Streamlitの再実行ごとに Document の構築や JSON の直列化をやり直さないためのキャッシュ。
+    生成日時は初回生成時のものになる。
+
+    Args:
+        company_name: 会社名
+        final_report: 完全版レポート
+        fmt: "json" / "word" / "pdf" / "html"
+
+    Returns:
+        ファイルのバイト列
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("未対応の形式です: " + fmt)
+    data = get_cached_export(company_name, final_report, fmt)
+    if data is not None:
+        return data
+
+    data = _render(company_name, final_report, fmt)
+    key = _export_cache_key(company_name, final_report, fmt)
+    with _export_cache_lock:
+        _export_cache[key] = data
+        _export_cache.move_to_end(key)
+        while len(_export_cache) > EXPORT_CACHE_MAX:
+            _export_cache.popitem(last=False)
+    return data
+
+
+class _ChunkSink:
+    """ZipFile の出力先。書き込まれたバイト列を溜め、drain() で取り出す(シーク不可のストリームとして扱われる)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+
+def _bundle_name(report: Dict[str, Any], index: int) -> str:
+    """ZIP内のファイル名(拡張子なし)。ID(なければ連番)+会社名"""
+    key = str(report.get("id") or format(index, "04d"))
+    company = re.sub(r'[\\/:*?"<>|\s]+', "_", str(report.get("company_name") or "")).strip("_")[:40]
+    return key + ("_" + company if company else "")
+
+
+def iter_reports_zip(
+    reports: Iterable[Dict[str, Any]],
+    include_pdf: bool = False
+) -> Iterator[bytes]:
+    """
+    複数レポートをZIPにまとめてチャンク単位で返す(全件をメモリに載せない)
+
+    レポートごとに JSON・Word(任意でPDF)を作成してすぐZIPへ書き込み、そのレポート分のチャンクを返す。
+    最後に全レポートの一覧(manifest.json)を追加する。作成に失敗したレポートはmanifestにエラーを記録して続行する。
+
+    Args:
+        reports: {"company_name", "final_report", "id"(任意), ...} のイテレーター(JSONLの逐次読み込みなど)
+        include_pdf: PDFも含めるか
+
+    Yields:
+        ZIPファイルのバイト列(順に連結すると1つのZIPになる)
+    """
+    formats = ["json", "word"] + (["pdf"] if include_pdf else [])
+    sink = _ChunkSink()
+    manifest: List[Dict[str, Any]] = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for index, report in enumerate(reports, 1):
+            company_name = report.get("company_name") or ""
+            final_report = report.get("final_report") or ""
+            name = _bundle_name(report, index)
+            entry = {
+                "id": report.get("id"),
+                "company_name": company_name,
+                "report_sha256": hashlib.sha256(final_report.encode("utf-8")).hexdigest(),
+                "files": [],
+            }
+            try:
+                if not final_report:
+                    raise ValueError("レポートが空です")
+                for fmt in formats:
+                    filename = name + "." + EXPORT_FORMATS[fmt][1]
+                    zf.writestr(filename, _render(company_name, final_report, fmt))
+                    entry["files"].append(filename)
+            except Exception as e:
+                entry["error"] = type(e).__name__ + ": " + str(e)[:200]
+            manifest.append(entry)
+            yield from sink.drain()
+        zf.writestr("manifest.json", json.dumps({
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "count": len(manifest),
+            "errors": sum(1 for entry in manifest if "error" in entry),
+            "formats": formats,
+            "reports": manifest,
+        }, ensure_ascii=False, indent=2))
+    yield from sink.drain()
+
+
+@traced("export.bundle")
+def export_reports_zip(
+    reports: Iterable[Dict[str, Any]],
+    dest: Union[str, BinaryIO],
+    include_pdf: bool = False
+) -> None:
+    """
+    複数レポートのZIPをファイルへ書き出す
+
+    Args:
+        reports: iter_reports_zip と同じ
+        dest: 出力先のパスまたはバイナリファイルオブジェクト
+        include_pdf: PDFも含めるか
+    """
+    f = open(dest, "wb") if isinstance(dest, str) else dest
+    try:
+        for chunk in iter_reports_zip(reports, include_pdf):
+            f.write(chunk)
+    finally:
+        if f is not dest:
+            f.close()
+
+
+def iter_report_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    バッチ結果(results.jsonl)から完了済みレポートを1件ずつ読み込む
+
+    Args:
+        path: results.jsonl のパス
+
+    Yields:
+        status が done の記録
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "done" and record.get("final_report"):
+                yield record
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLIエントリポイント(バッチ結果をZIPにまとめる)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="バッチ結果のレポートをZIPにまとめてエクスポート")
+    parser.add_argument("results", help="modules.batch の results.jsonl")
+    parser.add_argument("--out", default="reports.zip", help="出力ZIPのパス")
+    parser.add_argument("--pdf", action="store_true", help="PDFも含める(日本語フォントが必要)")
+    args = parser.parse_args(argv)
+
+    export_reports_zip(iter_report_records(args.results), args.out, include_pdf=args.pdf)
+    with zipfile.ZipFile(args.out) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+    print("exported: " + args.out + " (reports=" + str(manifest["count"]) + ", errors=" + str(manifest["errors"]) + ")")
+    return 0 if manifest["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+"""
+IR資料(決算短信・決算説明資料)の表から主要財務数値をルールベースで抽出
+
+- pdfplumberの表抽出 + 本文の正規表現で 売上高/営業利益率/自己資本比率 等を探す
+- 単位(百万円/億円/千円/兆円)を億円に正規化、△/▲/括弧はマイナスとして扱う
+- 戻り値は extract_financials_with_llm と同じキー・表記(「〜億円」「〜パーセント」)
+- 抽出根拠(ページ・表・セル位置)は財務データとは別のリストで返す(プロンプト・画面には含めない)
+- 当期の列・行を特定できない表からは値を採らない(前期や増減率の列を当期値と誤認しないため)
+"""
+import re
+import unicodedata
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# LLM呼び出しを省略するために必要な項目(Step1の補足情報で使用する3項目)
+CORE_FIELDS = ["売上高", "営業利益率", "自己資本比率"]
+
+# 項目ごとの表ラベル表記(正規化後の完全一致で照合)
+FIELD_LABELS = {
+    "売上高": ["売上高", "売上収益", "営業収益", "netsales", "revenue", "revenues"],
+    "営業利益": ["営業利益", "operatingincome", "operatingprofit"],
+    "営業利益率": ["営業利益率", "売上高営業利益率", "operatingmargin"],
+    "自己資本比率": ["自己資本比率", "親会社所有者帰属持分比率", "equityratio"],
+    "ROE": ["roe", "自己資本利益率", "自己資本当期純利益率"],
+    "営業キャッシュフロー": [
+        "営業活動によるキャッシュ・フロー", "営業活動によるキャッシュフロー", "営業cf", "営業キャッシュフロー",
+    ],
+}
+
+# 比率として扱う項目(値は0〜100前後のパーセント)
+PERCENT_FIELDS = {"営業利益率", "自己資本比率", "ROE"}
+
+# 億円換算の倍率
+UNIT_TO_OKU = {"兆円": 10000.0, "億円": 1.0, "百万円": 0.01, "千円": 0.00001}
+
+# 本文から比率を拾う正規表現(例: 「自己資本比率は45.2%」)
+TEXT_PATTERNS = {
+    "自己資本比率": re.compile(r"自己資本比率[^\d△▲\-\n]{0,12}([△▲\-]?\d+(?:\.\d+)?)\s*[%％]"),
+    "ROE": re.compile(r"(?:ROE|自己資本利益率)[^\d△▲\-\n]{0,12}([△▲\-]?\d+(?:\.\d+)?)\s*[%％]"),
+    "営業利益率": re.compile(r"営業利益率[^\d△▲\-\n]{0,12}([△▲\-]?\d+(?:\.\d+)?)\s*[%％]"),
+}
+
+_BRACKETS = re.compile(r"[（(\[【〔].*?[）)\]】〕]")
+_YEAR = re.compile(r"(20\d{2})\s*年")
+_UNIT_DECL = re.compile(r"単位\s*[:：]?\s*(兆円|億円|百万円|千円)")
+
+
+def _normalize(cell: Optional[str]) -> str:
+    """セル文字列の正規化(全角→半角、改行・空白除去)"""
+    if not cell:
+        return ""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(cell)))
+
+
+def match_field(cell: Optional[str]) -> Optional[str]:
+    """
+    セルが財務項目のラベルかどうか判定
+
+    Returns:
+        項目名 or None
+    """
+    label = _normalize(cell)
+    if not label:
+        return None
+    label = _BRACKETS.sub("", label).rstrip("※*0123456789").lower()
+    for field, labels in FIELD_LABELS.items():
+        if label in labels:
+            return field
+    return None
+
+
+def parse_number(cell: Optional[str]) -> Optional[float]:
+    """
+    セルの数値を解釈(カンマ・単位・%除去、△/▲/-/括弧はマイナス)
+
+    Returns:
+        数値 or None
+    """
+    value = _normalize(str(cell).split("\n")[0] if cell else "")
+    if not value:
+        return None
+    negative = False
+    if value[0] in "△▲-−":
+        negative = True
+        value = value[1:]
+    if value.startswith("(") and value.endswith(")"):
+        negative = True
+        value = value[1:-1]
+    value = value.replace(",", "")
+    for suffix in ("%", "円", "兆", "億", "百万", "千"):
+        value = value.replace(suffix, "")
+    if not re.fullmatch(r"\d+(?:\.\d+)?", value):
+        return None
+    number = float(value)
+    return -number if negative else number
+
+
+def detect_unit(texts: List[str]) -> Optional[str]:
+    """表ヘッダーやページ本文から金額の単位を推定"""
+    joined = _normalize("\n".join(t for t in texts if t))
+    declared = _UNIT_DECL.search(joined)
+    if declared:
+        return declared.group(1)
+    for unit in ("百万円", "億円", "兆円", "千円"):
+        if unit in joined:
+            return unit
+    return None
+
+
+def _current_period_column(table: List[List[Optional[str]]]) -> Optional[int]:
+    """ヘッダー行から当期の列を推定(最新年度 or 「当期」表記)"""
+    best_col, best_year = None, -1
+    for row in table[:2]:
+        for j, cell in enumerate(row):
+            text = _normalize(cell)
+            if "当期" in text or "当連結" in text:
+                return j
+            years = [int(y) for y in _YEAR.findall(text)]
+            if years and max(years) > best_year:
+                best_col, best_year = j, max(years)
+    return best_col
+
+
+def _current_period_row(table: List[List[Optional[str]]], start: int) -> Optional[int]:
+    """ヘッダー行より下で当期の行を推定(最新年度 or 「当期」表記、特定できなければNone)"""
+    best_row, best_year = None, -1
+    for i in range(start, len(table)):
+        label = _normalize(next((c for c in table[i] if c), ""))
+        if "当期" in label or "当連結" in label:
+            return i
+        years = [int(y) for y in _YEAR.findall(label)]
+        if years and max(years) > best_year:
+            best_row, best_year = i, max(years)
+    return best_row
+
+
+def _plausible(field: str, value: float) -> bool:
+    if field in PERCENT_FIELDS:
+        return -100.0 < value <= 100.0
+    if field == "売上高":
+        return value > 0
+    return True
+
+
+def extract_from_table(table: List[List[Optional[str]]], page_unit: Optional[str]) -> Dict[str, Tuple[float, str, int, int]]:
+    """
+    1つの表から財務項目を抽出
+
+    Args:
+        table: pdfplumberの extract_tables() の1要素(行×セル)
+        page_unit: ページ本文から推定した単位
+
+    Returns:
+        {項目名: (値, 単位, 行番号, 列番号)} ※値は表記上の数値(単位換算前)
+    """
+    found: Dict[str, Tuple[float, str, int, int]] = {}
+    if not table or len(table) < 2:
+        return found
+    unit = detect_unit([c for row in table[:2] for c in row if c]) or page_unit
+
+    # パターン1: 行ラベル型(「売上高 | 前期 | 当期」)
+    period_col = _current_period_column(table)
+    for i, row in enumerate(table):
+        for j, cell in enumerate(row):
+            field = match_field(cell)
+            if not field:
+                continue
+            cell_unit = detect_unit([cell]) or unit
+            candidates = [(k, parse_number(row[k])) for k in range(j + 1, len(row))]
+            candidates = [(k, v) for k, v in candidates if v is not None and _plausible(field, v)]
+            # 当期の列が特定できない場合・当期の列に値がない場合は採らない(LLM抽出に任せる)
+            chosen = next((c for c in candidates if c[0] == period_col), None)
+            if chosen and field not in found:
+                found[field] = (chosen[1], cell_unit, i, chosen[0])
+            break
+
+    # パターン2: 列ヘッダー型(決算短信サマリー「| 売上高 | 営業利益 |」+ 期別の行)
+    for h in range(min(3, len(table) - 1)):
+        header_fields = [(j, match_field(cell)) for j, cell in enumerate(table[h])]
+        header_fields = [(j, f) for j, f in header_fields if f and f not in found]
+        if not header_fields:
+            continue
+        row_idx = _current_period_row(table, h + 1)
+        if row_idx is None:
+            # 当期の行が特定できない場合は採らない
+            continue
+        for j, field in header_fields:
+            if j >= len(table[row_idx]):
+                continue
+            value = parse_number(table[row_idx][j])
+            if value is not None and _plausible(field, value):
+                cell_unit = detect_unit([table[h][j]]) or unit
+                found[field] = (value, cell_unit, row_idx, j)
+    return found
+
+
+def format_oku(value_oku: float) -> str:
+    """億円表記に整形"""
+    if abs(value_oku) >= 100:
+        return format(value_oku, ",.0f") + "億円"
+    return format(value_oku, ",.1f") + "億円"
+
+
+def format_percent(value: float) -> str:
+    """パーセント表記に整形(Streamlit表示対策で%は使わない)"""
+    return format(value, ".1f") + "パーセント"
+
+
+def extract_financials_from_pdf(
+    pdf_file: BinaryIO, page_indices: List[int], page_texts: List[str]
+) -> Tuple[Dict[str, str], List[str]]:
+    """
+    指定ページの表・本文から主要財務数値を抽出
+
+    Args:
+        pdf_file: PDFのファイルオブジェクト
+        page_indices: 探索するページ番号(0始まり、関連度順)
+        page_texts: ページ順のテキスト(単位推定・本文照合用)
+
+    Returns:
+        (財務データ, 抽出根拠)
+        例: ({"売上高": "12,345億円", ...}, ["売上高: p.3 表1 (2行3列, 百万円)", ...])
+        ※見つかった項目のみ。何も見つからなければ ({}, [])
+    """
+    import pdfplumber
+
+    raw: Dict[str, Tuple[float, str, int, int, int, int]] = {}
+    pdf_file.seek(0)
+    with pdfplumber.open(pdf_file) as pdf:
+        for page_index in page_indices:
+            if page_index >= len(pdf.pages):
+                continue
+            page_text = page_texts[page_index] if page_index < len(page_texts) else ""
+            page_unit = detect_unit([page_text])
+            try:
+                tables = pdf.pages[page_index].extract_tables()
+            except Exception as e:
+                print(f"[Financial Tables] 表抽出エラー p.{page_index + 1}: {str(e)[:100]}")
+                continue
+            for t, table in enumerate(tables):
+                for field, (value, unit, i, j) in extract_from_table(table, page_unit).items():
+                    if field not in raw:
+                        raw[field] = (value, unit, page_index, t, i, j)
+            if all(f in raw for f in ("売上高", "営業利益", "自己資本比率")):
+                break
+    pdf_file.seek(0)
+
+    result: Dict[str, str] = {}
+    provenance: List[str] = []
+
+    def source(field: str) -> str:
+        value, unit, page_index, t, i, j = raw[field]
+        return "p." + str(page_index + 1) + " 表" + str(t + 1) + " (" + str(i + 1) + "行" + str(j + 1) + "列, " + str(unit or "単位不明") + ")"
+
+    # 金額項目: 単位が判明したもののみ億円換算
+    for field in ("売上高", "営業キャッシュフロー"):
+        if field in raw and raw[field][1] in UNIT_TO_OKU:
+            result[field] = format_oku(raw[field][0] * UNIT_TO_OKU[raw[field][1]])
+            provenance.append(field + ": " + source(field))
+
+    # 比率項目
+    for field in ("営業利益率", "自己資本比率", "ROE"):
+        if field in raw:
+            result[field] = format_percent(raw[field][0])
+            provenance.append(field + ": " + source(field))
+
+    # 営業利益率: 表に直接なければ 営業利益 ÷ 売上高 で算出(同一単位系のときのみ)
+    if "営業利益率" not in result and "売上高" in raw and "営業利益" in raw:
+        revenue, revenue_unit = raw["売上高"][0], raw["売上高"][1]
+        profit, profit_unit = raw["営業利益"][0], raw["営業利益"][1]
+        if revenue > 0 and revenue_unit and revenue_unit == profit_unit:
+            result["営業利益率"] = format_percent(profit / revenue * 100) + "（営業利益÷売上高で算出）"
+            provenance.append("営業利益率: 算出 (営業利益 " + source("営業利益") + " / 売上高 " + source("売上高") + ")")
+
+    # 本文からの補完(表で見つからなかった比率)
+    for field, pattern in TEXT_PATTERNS.items():
+        if field in result:
+            continue
+        for page_index in page_indices:
+            if page_index >= len(page_texts):
+                continue
+            m = pattern.search(unicodedata.normalize("NFKC", page_texts[page_index] or ""))
+            if m:
+                value = parse_number(m.group(1))
+                if value is not None and _plausible(field, value):
+                    result[field] = format_percent(value)
+                    provenance.append(field + ": p." + str(page_index + 1) + " 本文")
+                    break
+
+    return result, provenance
@@ -0,0 +1,136 @@
+"""
+PDF出力用の日本語フォント管理(プロセス内で共有)
+
+- フォントの探索はプロセスで1回だけ行う
+- fpdf2 の add_font はフォント全体の文字表(字幅・グリフID)を毎回作り直すため、
+  数MBの日本語フォントではエクスポートの処理時間の大半を占める。
+  この解析結果をプロセスで1回だけ作り、各PDFにはその複製を登録する
+- フォントファイルは元のものをそのまま渡し、PDFへの埋め込み時に fpdf2 が実際に使った字形だけに絞り込む
+- 複製は fpdf2 の TTFFont の内部構造に依存するため、失敗した場合や `PDF_FONT_SHARE_DISABLE=1` のときは通常の add_font を使う
+"""
+import copy
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+JAPANESE_FONT_CANDIDATES = [
+    # プロジェクト内配置想定
+    Path(__file__).parent.parent / "fonts" / "NotoSansJP-Regular.ttf",
+    Path(__file__).parent.parent / "fonts" / "IPAexGothic.ttf",
+    # ユーザが手動追加するかもしれない場所の例 (macOS Home ディレクトリ配下など)
+    Path.home() / "Library" / "Fonts" / "NotoSansJP-Regular.ttf",
+    Path.home() / "Library" / "Fonts" / "IPAexGothic.ttf",
+]
+
+
+class _FontRegistry:
+    """日本語フォントと解析済みフォント情報の管理"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._source: Optional[Path] = None
+        self._template = None
+        self._share_failed = False
+
+    def source(self) -> Optional[Path]:
+        """候補から最初に見つかったフォント(探索は初回のみ)"""
+        with self._lock:
+            if not self._resolved:
+                self._source = next((p for p in JAPANESE_FONT_CANDIDATES if p.is_file()), None)
+                self._resolved = True
+                if self._source:
+                    logger.info("[Font] using %s", self._source)
+            return self._source
+
+    def add_to(self, pdf, family: str) -> bool:
+        """
+        日本語フォントを pdf に登録
+
+        Args:
+            pdf: FPDF インスタンス
+            family: 登録するフォント名
+
+        Returns:
+            登録した場合True(日本語フォントがなければFalse)
+        """
+        source = self.source()
+        if source is None:
+            return False
+        if os.getenv("PDF_FONT_SHARE_DISABLE") != "1" and not self._share_failed:
+            try:
+                fontkey = family.lower()
+                pdf.fonts[fontkey] = self._clone(self._get_template(source), pdf, fontkey)
+                return True
+            except Exception as e:
+                # 以降は通常の add_font を使う
+                self._share_failed = True
+                logger.warning("[Font] shared font disabled: %s", str(e)[:200])
+        pdf.add_font(family, "", str(source))
+        return True
+
+    def _get_template(self, source: Path):
+        """解析済みのフォント(初回のみ解析)"""
+        with self._lock:
+            if self._template is None:
+                from fpdf import FPDF
+
+                started = time.perf_counter()
+                holder = FPDF()
+                holder.add_font("template", "", str(source))
+                template = holder.fonts["template"]
+                # 字形の読み込み元は PDF ごとに開き直す
+                template.ttfont.close()
+                self._template = template
+                logger.info(
+                    "[Font] parsed %s: %d chars in %.2fs",
+                    source.name, len(template.glyph_ids), time.perf_counter() - started,
+                )
+            return self._template
+
+    @staticmethod
+    def _clone(template, pdf, fontkey: str):
+        """template を pdf 用に複製(字幅・グリフIDの表は共有し、PDFごとに変わる状態だけ作り直す)"""
+        from fontTools import ttLib
+        from fpdf.fonts import SubsetMap
+
+        font = copy.copy(template)
+        font.i = len(pdf.fonts) + 1
+        font.fontkey = fontkey
+        # 出力時の字形の絞り込みは ttfont を書き換えるため、PDFごとに開く(lazy のため読み込みは出力時)
+        font.ttfont = ttLib.TTFont(template.ttffile, recalcTimestamp=False, fontNumber=0, lazy=True)
+        font.missing_glyphs = []
+        # add_font と同じ予約文字
+        reserved = "\x00 \r\n"
+        if pdf.str_alias_nb_pages:
+            reserved += "0123456789" + pdf.str_alias_nb_pages
+        font.subset = SubsetMap(font, [ord(ch) for ch in reserved])
+        return font
+
+
+_registry = _FontRegistry()
+
+
+def find_japanese_font() -> Optional[Path]:
+    """日本語フォントのパス(未配置ならNone)"""
+    return _registry.source()
+
+
+def add_japanese_font(pdf, family: str = "JP") -> bool:
+    """
+    日本語フォントを pdf に登録(解析済みのフォント情報をプロセス内で共有)
+
+    Args:
+        pdf: FPDF インスタンス
+        family: 登録するフォント名
+
+    Returns:
+        登録した場合True(日本語フォントがなければFalse)
+    """
+    return _registry.add_to(pdf, family)
@@ -4,10 +4,80 @@ IR資料から財務データを抽出
 import requests
 import io
 import pdfplumber
-from openai import OpenAI
 import os
 import json
-from typing import Dict
+import multiprocessing
+import re
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Optional, Union
+
+from modules import pdf_cache, replay
+from modules.financial_tables import CORE_FIELDS, extract_financials_from_pdf
+from modules.openai_client import get_openai_client
+from modules.llm_scheduler import PRIORITY_BACKGROUND, estimate_tokens, scheduled_call
+from modules.tracing import span
+
+# ダウンロードするPDFの上限サイズ(バイト)と、メモリ上に保持する上限(超過分は一時ファイルへ)
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_SPOOL_MAX_MEMORY = int(os.getenv("PDF_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+
+# テキスト抽出するページ数の上限と、プロセス並列に切り替えるページ数のしきい値
+PDF_TEXT_MAX_PAGES = int(os.getenv("PDF_TEXT_MAX_PAGES", "15"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+# 関連ページ選択: 走査する最大ページ数と、LLMへ渡す文字数の予算
+PDF_SCAN_MAX_PAGES = int(os.getenv("PDF_SCAN_MAX_PAGES", "120"))
+LLM_TEXT_BUDGET = int(os.getenv("LLM_TEXT_BUDGET", "6000"))
+# 事業セグメント二次抽出でLLMへ渡す文字数の予算
+SEGMENT_TEXT_BUDGET = int(os.getenv("SEGMENT_TEXT_BUDGET", "12000"))
+# ルールベース財務抽出で表を探索するページ数(関連度上位から)
+RULE_EXTRACTION_MAX_PAGES = int(os.getenv("RULE_EXTRACTION_MAX_PAGES", "6"))
+# extract_financials_with_llm の抽出指示: 段階ごとの (項目, 探索指示, 出力JSONの記載例)
+_FINANCIAL_PROMPT_STAGES = [
+    ("第1段階: 必須財務情報(この段階で必ず発見してください)", [
+        ("売上高", "「売上高」「総売上」「Revenue」などのキーワードを探し、最新期の連結売上高を億円単位で記載", "具体的な金額（億円）"),
+        ("営業利益率", "「営業利益」と「売上高」から計算、または直接「営業利益率」記載を探す", "具体的なパーセント"),
+        ("自己資本比率", "「自己資本比率」「Equity Ratio」を探し、パーセント表記で記載", "具体的なパーセント"),
+    ]),
+    ("第2段階: 追加財務指標", [
+        ("ROE", "「ROE」「自己資本利益率」「Return on Equity」を探す", "具体的なパーセント"),
+        ("営業キャッシュフロー", "「営業活動によるキャッシュフロー」「営業CF」を探す", "具体的な金額"),
+    ]),
+    ("第3段階: 事業構造分析", [
+        ("主力事業セグメント", "セグメント別売上や事業別業績表を探し、売上構成比とともに記載", "事業名と構成比"),
+        ("地域別売上構成", "「地域別」「国内外」「海外売上比率」などを探す", "地域別の詳細"),
+        ("新規事業領域", "「新規事業」「新分野」「新サービス」の記載を探す", "新規分野の具体名"),
+    ]),
+    ("第4段階: 戦略・計画情報", [
+        ("中期経営計画", "「中期計画」「中期経営計画」「3年計画」「5年計画」の目標数値", "計画内容と目標"),
+        ("成長戦略", "「戦略」「重点施策」「成長ドライバー」を探す", "戦略の要点"),
+        ("投資計画", "「設備投資」「投資予定」「CAPEX」の金額や計画", "投資額と内容"),
+        ("DX取り組み", "「DX」「デジタル化」「IT投資」「システム刷新」などの記載", "デジタル化の内容"),
+    ]),
+    ("第5段階: 競争分析", [
+        ("市場シェア", "「シェア」「市場地位」「業界順位」などの数値", "シェア率と順位"),
+        ("強み", "「競争優位」「強み」「差別化」「特徴」などの記載", "競争優位性"),
+    ]),
+]
+# extract_financials_with_llm の出力JSONと同じ項目(表から確定した場合も同じ形で返す)
+FINANCIAL_SCHEMA = [field for _, items in _FINANCIAL_PROMPT_STAGES for field, _, _ in items]
+
+# ページの関連度スコアに使う財務キーワード(抽出プロンプトの探索キーワードに対応)と重み
+FINANCIAL_PAGE_KEYWORDS = {
+    "売上高": 3, "売上収益": 3, "営業収益": 2, "営業利益": 3, "経常利益": 1, "当期純利益": 1,
+    "自己資本比率": 3, "ROE": 2, "自己資本利益率": 2, "営業活動によるキャッシュ": 2, "キャッシュ・フロー": 1,
+    "セグメント": 2, "事業別": 1, "地域別": 1, "海外売上": 1, "中期経営計画": 1, "設備投資": 1,
+    "連結": 1, "百万円": 1, "億円": 1, "前期比": 1, "Revenue": 2, "Operating": 1, "Equity Ratio": 2,
+}
+
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_pdf_process_pool_lock = threading.Lock()
 
 
 def classify_company_type(company_name: str) -> str:
@@ -235,26 +305,31 @@ def get_financials_from_ir(company_name: str) -> Dict[str, str]:
         
         pdf_url = search_ir_pdf_url(company_name)
         ir_failed = False
+        local_financials: Dict[str, str] = {}
         
         if not pdf_url:
             print(f"[IR Extractor] IR資料なし: '{company_name}'")
             ir_failed = True
         else:
             try:
-                # PDF取得
-                pdf_content = download_pdf(pdf_url)
-                
-                # テキスト抽出
-                text = extract_text_from_pdf(pdf_content)
-                
-                if not text or len(text) < 100:
-                    print(f"[IR Extractor] PDFテキスト抽出失敗: '{company_name}'")
-                    ir_failed = True
-                else:
-                    # 厳密な企業名照合
-                    if not strict_company_verification(text, company_name):
-                        print(f"[IR Extractor] 企業照合失敗: '{company_name}' ≠ PDF内容")
+                # PDF取得 → 全ページのテキスト抽出(ファイルオブジェクトのまま渡し、全体のコピーを持たない)
+                with fetch_pdf(pdf_url) as pdf_file:
+                    page_texts = extract_pages_from_pdf(pdf_file, PDF_SCAN_MAX_PAGES)
+                    text = "".join(page_text + "\n\n" for page_text in page_texts if page_text)
+                    # LLMへは財務キーワード密度の高いページのみを文字数予算内で渡す
+                    focused_text = select_relevant_text(page_texts, LLM_TEXT_BUDGET)
+                    
+                    if not text or len(text) < 100:
+                        print(f"[IR Extractor] PDFテキスト抽出失敗: '{company_name}'")
                         ir_failed = True
+                    else:
+                        # 厳密な企業名照合
+                        if not strict_company_verification(text, company_name):
+                            print(f"[IR Extractor] 企業照合失敗: '{company_name}' ≠ PDF内容")
+                            ir_failed = True
+                        elif os.getenv("IR_RULE_EXTRACTION", "1") == "1":
+                            # 表・本文からルールベースで主要財務数値を抽出
+                            local_financials = extract_financials_locally(pdf_file, page_texts)
             except Exception as e:
                 print(f"[IR Extractor] PDF処理エラー: {str(e)[:100]}")
                 ir_failed = True
@@ -282,25 +357,42 @@ def get_financials_from_ir(company_name: str) -> Dict[str, str]:
                 return {"error": "IR資料もウェブ情報も見つかりませんでした"}
         
         # IR処理成功時の従来フロー（照合成功）
-        # LLMで財務データ抽出(APIキーがない場合はスキップ)
         api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return {
-                "error": "OpenAI APIキーが未設定のため、財務抽出はスキップしました"
+        # 表から見つからなかった項目だけをLLMで抽出する
+        missing_fields = [field for field in FINANCIAL_SCHEMA if field not in local_financials]
+        if not missing_fields:
+            print("[IR Extractor] 表から全項目を確定、LLM抽出をスキップ")
+            financials = {field: local_financials[field] for field in FINANCIAL_SCHEMA}
+        elif not api_key:
+            # LLMで財務データ抽出(APIキーがない場合はスキップ)
+            if any(field not in local_financials for field in CORE_FIELDS):
+                return {
+                    "error": "OpenAI APIキーが未設定のため、財務抽出はスキップしました"
+                }
+            print("[IR Extractor] APIキー未設定のため、表から確定した項目のみ使用")
+            financials = {field: local_financials.get(field, "不明") for field in FINANCIAL_SCHEMA}
+        else:
+            # Step1: 基本財務データ抽出 (引数にcompany_nameを追加)
+            print("[IR Extractor] LLM抽出対象: " + ", ".join(missing_fields))
+            llm_financials = extract_financials_with_llm(
+                focused_text, company_name, known_fields=local_financials, fields=missing_fields
+            )
+            
+            # 【追加修正】社名不一致などでエラーが返ってきた場合はここで終了（詳細化をスキップ）
+            if "error" in llm_financials:
+                print(f"[IR Extractor] 処理中断: {llm_financials['error']}")
+                if company_type == "subsidiary":
+                    return {"error": llm_financials['error'], "use_estimation": True}
+                return llm_financials
+
+            # 表から確定した値を優先し、項目は FINANCIAL_SCHEMA の順に揃える
+            financials = {
+                field: local_financials.get(field, llm_financials.get(field, "不明"))
+                for field in FINANCIAL_SCHEMA
             }
-        
-        # Step1: 基本財務データ抽出 (引数にcompany_nameを追加)
-        financials = extract_financials_with_llm(text, company_name)
-        
-        # 【追加修正】社名不一致などでエラーが返ってきた場合はここで終了（詳細化をスキップ）
-        if "error" in financials:
-            print(f"[IR Extractor] 処理中断: {financials['error']}")
-            if company_type == "subsidiary":
-                return {"error": financials['error'], "use_estimation": True}
-            return financials
 
         # Step2: 事業セグメント詳細化（基本抽出で不十分な場合）
-        if financials and isinstance(financials, dict):
+        if api_key and financials and isinstance(financials, dict):
             segment_info = financials.get("主力事業セグメント", "")
             if "不明" in segment_info or len(segment_info) < 20:
                 enhanced_segments = extract_detailed_segments(text, api_key)
@@ -368,9 +460,119 @@ def get_financials_from_ir(company_name: str) -> Dict[str, str]:
         return result
 
 
+def fetch_pdf(url: str) -> BinaryIO:
+    """
+    PDFを取得し、先頭に位置付けたファイルオブジェクトを返す(呼び出し側でclose)
+    - キャッシュ: 取得から一定時間内(PDF_CACHE_FRESH_SECONDS)はネットワークアクセスなし、
+      それ以降はETag/Last-Modifiedで条件付きGETし、304ならキャッシュファイルを返す
+    - ダウンロード: ストリーミングでスプール一時ファイルへ書き込み(一定サイズ超はディスクへ退避)
+    - 上限サイズ(PDF_MAX_BYTES)超過、HTML等のContent-Type、先頭が%PDF-でない応答は即中断
+    
+    Args:
+        url: PDF URL
+    
+    Returns:
+        PDFのファイルオブジェクト
+    """
+    with span("pdf.download", url=url[:200]) as s:
+        pdf_file = replay.fetch_pdf(url, lambda: _fetch_pdf(url, s))
+        pdf_file.seek(0, os.SEEK_END)
+        s.set(bytes=pdf_file.tell())
+        pdf_file.seek(0)
+        return pdf_file
+
+
+def _fetch_pdf(url: str, trace) -> BinaryIO:
+    """fetch_pdf の本体(取得元を trace に記録)"""
+    entry = pdf_cache.lookup_url(url)
+    headers = {}
+    if entry:
+        if pdf_cache.is_fresh(entry):
+            cached = pdf_cache.open_blob(entry["sha256"])
+            if cached is not None:
+                print(f"[IR Extractor] PDFキャッシュ使用: {url}")
+                trace.set(source="cache")
+                return cached
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with requests.get(url, timeout=30, headers=headers, stream=True) as response:
+        if response.status_code == 304 and entry:
+            cached = pdf_cache.open_blob(entry["sha256"])
+            if cached is not None:
+                print(f"[IR Extractor] PDFキャッシュ再検証OK(304): {url}")
+                pdf_cache.mark_revalidated(url, entry)
+                trace.set(source="revalidated")
+                return cached
+        elif response.status_code != 304:
+            trace.set(source="download")
+            pdf_file = _stream_pdf_response(response)
+            pdf_cache.store_stream(
+                url,
+                pdf_file,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            return pdf_file
+
+    # キャッシュ本体が消えていた場合は無条件で再取得
+    with requests.get(url, timeout=30, stream=True) as response:
+        trace.set(source="download")
+        pdf_file = _stream_pdf_response(response)
+        pdf_cache.store_stream(
+            url,
+            pdf_file,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return pdf_file
+
+
+def _stream_pdf_response(response) -> BinaryIO:
+    """
+    ストリーミングレスポンスを検証しながらスプール一時ファイルへ書き込む
+    
+    Raises:
+        ValueError: PDFでない応答、またはサイズ上限超過
+    """
+    response.raise_for_status()
+
+    content_type = response.headers.get("Content-Type", "").lower()
+    if content_type.startswith("text/") or "html" in content_type or "json" in content_type:
+        raise ValueError("PDFではない応答です (Content-Type: " + content_type[:50] + ")")
+
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > PDF_MAX_BYTES:
+        raise ValueError("PDFサイズが上限を超えています (" + content_length + " bytes)")
+
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORY)
+    total = 0
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if not chunk:
+                continue
+            if total == 0 and b"%PDF-" not in chunk[:1024]:
+                # 先頭チャンクのマジックバイトで判定(HTMLのエラーページ等を早期に打ち切る)
+                raise ValueError("PDFではない応答です (先頭バイト不一致)")
+            total += len(chunk)
+            if total > PDF_MAX_BYTES:
+                raise ValueError("PDFサイズが上限を超えています (" + str(PDF_MAX_BYTES) + " bytes)")
+            pdf_file.write(chunk)
+        if total == 0:
+            raise ValueError("PDFの内容が空です")
+    except Exception:
+        pdf_file.close()
+        raise
+
+    pdf_file.seek(0)
+    return pdf_file
+
+
 def download_pdf(url: str) -> bytes:
     """
-    PDFをダウンロード
+    PDFをダウンロード(fetch_pdfのバイト列版)
     
     Args:
         url: PDF URL
@@ -378,49 +580,294 @@ def download_pdf(url: str) -> bytes:
     Returns:
         PDFバイナリデータ
     """
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    return response.content
+    with fetch_pdf(url) as pdf_file:
+        return pdf_file.read()
 
 
-def extract_text_from_pdf(pdf_content: bytes) -> str:
+def extract_text_from_pdf(pdf_content: Union[bytes, BinaryIO], max_pages: Optional[int] = None) -> str:
     """
-    PDFからテキスト抽出(最初の15ページ)
+    PDFからテキスト抽出(最初の15ページ ※ PDF_TEXT_MAX_PAGESで変更可能)
+    ※ 内容ハッシュ単位でページテキストをキャッシュし、同一PDFの再パースを省略
     
     Args:
-        pdf_content: PDFバイナリ
+        pdf_content: PDFバイナリ、またはPDFのファイルオブジェクト(fetch_pdfの戻り値)
+        max_pages: 処理する最大ページ数(Noneなら PDF_TEXT_MAX_PAGES)
     
     Returns:
         抽出テキスト
     """
+    if max_pages is None:
+        max_pages = PDF_TEXT_MAX_PAGES
+    page_texts = extract_pages_from_pdf(pdf_content, max_pages)
+
     text = ""
-    
-    with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-        # 最初の15ページだけ処理(トークン制限対策)
-        for page in pdf.pages[:15]:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n\n"
+    for page_text in page_texts:
+        if page_text:
+            text += page_text + "\n\n"
     
     return text
 
 
-def extract_financials_with_llm(text: str, company_name: str) -> Dict[str, str]:
+def extract_pages_from_pdf(pdf_content: Union[bytes, BinaryIO], max_pages: Optional[int]) -> List[str]:
+    """
+    PDFからページ単位のテキストを抽出(キャッシュ経由)
+    
+    Args:
+        pdf_content: PDFバイナリ、またはPDFのファイルオブジェクト
+        max_pages: 処理する最大ページ数(Noneなら全ページ)
+    
+    Returns:
+        ページ順のテキストのリスト(テキストのないページは空文字)
+    """
+    with span("pdf.parse", max_pages=max_pages) as s:
+        return _extract_pages_from_pdf(pdf_content, max_pages, s)
+
+
+def _extract_pages_from_pdf(pdf_content: Union[bytes, BinaryIO], max_pages: Optional[int], trace) -> List[str]:
+    """extract_pages_from_pdf の本体(キャッシュ利用・ページ数・並列処理の有無を trace に記録)"""
+    sha256 = pdf_cache.content_hash(pdf_content)
+    cached = pdf_cache.get_page_texts(sha256)
+    if cached:
+        wanted = cached["page_count"] if max_pages is None else min(max_pages, cached["page_count"])
+        if len(cached["pages"]) >= wanted:
+            trace.set(cache_hit=True, pages=wanted)
+            return cached["pages"][:wanted]
+
+    if isinstance(pdf_content, (bytes, bytearray)):
+        pdf_content = io.BytesIO(pdf_content)
+    with pdfplumber.open(pdf_content) as pdf:
+        page_count = len(pdf.pages)
+        target = page_count if max_pages is None else min(max_pages, page_count)
+        workers = _pdf_extract_workers()
+        page_texts = None
+        if workers > 1 and target >= PDF_PARALLEL_MIN_PAGES:
+            try:
+                page_texts = _extract_pages_parallel(pdf_content, target, workers)
+            except Exception as e:
+                print(f"[IR Extractor] 並列テキスト抽出失敗、逐次処理に切替: {str(e)[:100]}")
+        trace.set(cache_hit=False, pages=target, page_count=page_count, parallel=page_texts is not None)
+        if page_texts is None:
+            page_texts = [page.extract_text() or "" for page in pdf.pages[:target]]
+
+    pdf_cache.put_page_texts(sha256, page_count, page_texts)
+    return page_texts
+
+
+def extract_financials_locally(pdf_file: BinaryIO, page_texts: List[str]) -> Dict[str, str]:
+    """
+    関連度上位ページの表・本文からルールベースで財務数値を抽出(失敗時は空dict)
+    
+    Args:
+        pdf_file: PDFのファイルオブジェクト
+        page_texts: ページ順のテキスト
+    
+    Returns:
+        見つかった項目のみの財務データ(抽出根拠はログにのみ出力)
+    """
+    try:
+        page_indices = rank_financial_pages(page_texts)[:RULE_EXTRACTION_MAX_PAGES]
+        local_financials, provenance = extract_financials_from_pdf(pdf_file, page_indices, page_texts)
+        if local_financials:
+            print("[IR Extractor] ルールベース抽出: " + "; ".join(provenance))
+        return local_financials
+    except Exception as e:
+        print(f"[IR Extractor] ルールベース抽出エラー: {str(e)[:100]}")
+        return {}
+
+
+def rank_financial_pages(page_texts: List[str]) -> List[int]:
+    """
+    財務キーワードを含むページを関連度スコア順に並べる
+    
+    Returns:
+        ページ番号(0始まり)のリスト
+    """
+    scored = [(score_financial_page(page_text), i) for i, page_text in enumerate(page_texts)]
+    scored = [item for item in scored if item[0] > 0]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [i for _, i in scored]
+
+
+def score_financial_page(page_text: str) -> float:
+    """
+    ページの財務情報らしさをスコア化(財務キーワードの重み付き出現数 ÷ 文字量)
+    
+    Args:
+        page_text: 1ページ分のテキスト
+    
+    Returns:
+        スコア(0ならキーワードなし)
+    """
+    if not page_text:
+        return 0.0
+    hits = 0
+    distinct = 0
+    for keyword, weight in FINANCIAL_PAGE_KEYWORDS.items():
+        count = page_text.count(keyword)
+        if count:
+            hits += weight * min(count, 10)
+            distinct += weight
+    if not hits:
+        return 0.0
+    # 多種類のキーワードを含むページを優先し、長文ページが有利になりすぎないよう文字量で正規化
+    return (hits + 2 * distinct) * 1000 / (len(page_text) + 500)
+
+
+def select_relevant_text(page_texts: List[str], budget: int) -> str:
+    """
+    スコア上位のページを文字数予算内で選び、ページ順に連結
+    
+    Args:
+        page_texts: ページ順のテキスト
+        budget: 最大文字数
+    
+    Returns:
+        LLMへ渡すテキスト(各ページ先頭に [p.N] を付与)
+    """
+    ranked = rank_financial_pages(page_texts)
+    if not ranked:
+        # キーワードが見つからない場合は従来通り先頭から
+        return "".join(page_text + "\n\n" for page_text in page_texts if page_text)[:budget]
+
+    selected: Dict[int, str] = {}
+    remaining = budget
+    for i in ranked:
+        chunk = "[p." + str(i + 1) + "]\n" + page_texts[i] + "\n\n"
+        if len(chunk) <= remaining:
+            selected[i] = chunk
+            remaining -= len(chunk)
+        elif not selected:
+            # 最上位ページ単体で予算超過の場合は切り詰めて採用
+            selected[i] = chunk[:remaining]
+            remaining = 0
+        if remaining < 200:
+            break
+
+    print(f"[IR Extractor] 関連ページ選択: {len(selected)}/{len(page_texts)}ページ → {sorted(p + 1 for p in selected)}")
+    return "".join(selected[i] for i in sorted(selected))
+
+
+def _pdf_extract_workers() -> int:
+    """並列テキスト抽出のプロセス数(PDF_EXTRACT_WORKERS、0なら自動)"""
+    workers = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+    if workers <= 0:
+        workers = min(4, os.cpu_count() or 1)
+    return workers
+
+
+def _get_pdf_process_pool(workers: int) -> ProcessPoolExecutor:
+    """テキスト抽出用プロセスプールを取得(プロセス内で再利用)"""
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            # Streamlitはマルチスレッドのためfork安全性を考慮してspawnを使用
+            _pdf_process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_process_pool
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """ワーカープロセス側: 指定範囲のページテキストを抽出"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _extract_pages_parallel(pdf_file: BinaryIO, target: int, workers: int) -> List[str]:
+    """
+    ページ範囲をプロセスプールに分配してテキスト抽出(結果はページ順に連結)
+    ※ 各ワーカーはファイルパスからPDFを開く。パスを持たない場合は一時ファイルへ書き出す
+    """
+    pdf_path = getattr(pdf_file, "name", None)
+    temp_path = None
+    if not isinstance(pdf_path, str) or not os.path.isfile(pdf_path):
+        pdf_file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            shutil.copyfileobj(pdf_file, tmp, 1024 * 1024)
+            temp_path = tmp.name
+        pdf_file.seek(0)
+        pdf_path = temp_path
+
+    try:
+        # 負荷の偏りを抑えるためワーカー数の2倍に分割
+        chunk_size = max(1, -(-target // (workers * 2)))
+        ranges = [(start, min(start + chunk_size, target)) for start in range(0, target, chunk_size)]
+        pool = _get_pdf_process_pool(workers)
+        futures = [pool.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+        page_texts: List[str] = []
+        for future in futures:
+            page_texts.extend(future.result())
+        return page_texts
+    except BrokenProcessPool:
+        _reset_pdf_process_pool()
+        raise
+    finally:
+        if temp_path:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _reset_pdf_process_pool() -> None:
+    """異常終了したプロセスプールを破棄(次回呼び出しで再作成)"""
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is not None:
+            _pdf_process_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_process_pool = None
+
+
+def _financial_prompt_sections(fields: List[str]) -> tuple:
+    """抽出対象の項目だけで (段階別の探索指示, 出力JSON形式) を組み立てる"""
+    stages = []
+    outputs = []
+    number = 0
+    for stage, items in _FINANCIAL_PROMPT_STAGES:
+        lines = ["【" + stage + "】"]
+        for field, instruction, example in items:
+            if field in fields:
+                number += 1
+                lines.append(str(number) + ". " + field + ": " + instruction)
+                outputs.append('  "' + field + '": "' + example + '"')
+        if len(lines) > 1:
+            stages.append("\n".join(lines))
+    return "\n\n".join(stages), "{\n" + ",\n".join(outputs) + "\n}"
+
+
+def extract_financials_with_llm(
+    text: str,
+    company_name: str,
+    known_fields: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, str]:
     """
     GPT-5-miniで財務データを抽出
     
     Args:
         text: IR資料のテキスト
         company_name: 分析対象の企業名（追加）
+        known_fields: 表から抽出済みの項目(参考として伝え、抽出・出力の対象から除く)
+        fields: 抽出する項目(省略時は FINANCIAL_SCHEMA の全項目)
     
     Returns:
-        財務データ(JSON)
+        財務データ(JSON)。抽出対象の項目のみ(known_fields の項目は含まない)
     """
     # トークン制限対策: 最初の6000文字のみ
     text_sample = text[:6000]
     
     # 【追加修正】プロンプト冒頭に社名照合命令を追加
     company_type = classify_company_type(company_name)
+
+    # 表から抽出済みの項目は再抽出不要として伝え、指示・出力形式からも除く(残りの項目の探索に集中させる)
+    known_fields = {key: value for key, value in (known_fields or {}).items() if not key.startswith("_")}
+    requested = [field for field in (fields or FINANCIAL_SCHEMA) if field not in known_fields]
+    stage_text, output_format = _financial_prompt_sections(requested)
+    known_text = ""
+    if known_fields:
+        known_text = "\n【抽出済み項目(表から確定済みのため再抽出不要。出力JSONには含めない)】\n"
+        for key, value in known_fields.items():
+            known_text += "- " + key + ": " + str(value) + "\n"
     
     prompt = """分析対象企業名: """ + company_name + """
 
@@ -440,29 +887,7 @@ def extract_financials_with_llm(text: str, company_name: str) -> Dict[str, str]:
 
 IR資料から企業の重要情報を段階的に抽出してください。まず確実に見つけられる情報を重点的に探し、不明な項目は「不明」ではなく具体的な検索努力をしてください。
 
-【第1段階: 必須財務情報(この段階で必ず発見してください)】
-1. 売上高: 「売上高」「総売上」「Revenue」などのキーワードを探し、最新期の連結売上高を億円単位で記載
-2. 営業利益率: 「営業利益」と「売上高」から計算、または直接「営業利益率」記載を探す
-3. 自己資本比率: 「自己資本比率」「Equity Ratio」を探し、パーセント表記で記載
-
-【第2段階: 追加財務指標】
-4. ROE: 「ROE」「自己資本利益率」「Return on Equity」を探す
-5. 営業キャッシュフロー: 「営業活動によるキャッシュフロー」「営業CF」を探す
-
-【第3段階: 事業構造分析】
-6. 主力事業セグメント: セグメント別売上や事業別業績表を探し、売上構成比とともに記載
-7. 地域別売上構成: 「地域別」「国内外」「海外売上比率」などを探す
-8. 新規事業領域: 「新規事業」「新分野」「新サービス」の記載を探す
-
-【第4段階: 戦略・計画情報】
-9. 中期経営計画: 「中期計画」「中期経営計画」「3年計画」「5年計画」の目標数値
-10. 成長戦略: 「戦略」「重点施策」「成長ドライバー」を探す
-11. 投資計画: 「設備投資」「投資予定」「CAPEX」の金額や計画
-12. DX取り組み: 「DX」「デジタル化」「IT投資」「システム刷新」などの記載
-
-【第5段階: 競争分析】
-13. 市場シェア: 「シェア」「市場地位」「業界順位」などの数値
-14. 強み: 「競争優位」「強み」「差別化」「特徴」などの記載
+""" + stage_text + """
 
 【重要な抽出指示】
 - 「不明」は最後の手段として使用し、まず類似表現や関連データを探してください
@@ -474,35 +899,26 @@ IR資料から企業の重要情報を段階的に抽出してください。ま
 
 【分析対象文書】
 """ + text_sample + """
+""" + known_text + """
 
 【出力JSON形式】
-{
-  "売上高": "具体的な金額（億円）",
-  "営業利益率": "具体的なパーセント", 
-  "自己資本比率": "具体的なパーセント",
-  "ROE": "具体的なパーセント",
-  "営業キャッシュフロー": "具体的な金額",
-  "主力事業セグメント": "事業名と構成比",
-  "地域別売上構成": "地域別の詳細",
-  "新規事業領域": "新規分野の具体名",
-  "中期経営計画": "計画内容と目標",
-  "成長戦略": "戦略の要点",
-  "投資計画": "投資額と内容", 
-  "DX取り組み": "デジタル化の内容",
-  "市場シェア": "シェア率と順位",
-  "強み": "競争優位性"
-}"""
-    
-    # クライアントを実行時に初期化（.env読み込み後に評価）
+""" + output_format
+    
+    # 共有クライアントを取得（.env読み込み後に評価）
     api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)  # ここでキーが必須
-    response = client.chat.completions.create(
-        model="gpt-5-mini",
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        response_format={"type": "json_object"},
-        #temperature=0.1
+    client = get_openai_client(api_key)  # ここでキーが必須
+    response = scheduled_call(
+        lambda: client.chat.completions.create(
+            model="gpt-5-mini",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            #temperature=0.1
+        ),
+        priority=PRIORITY_BACKGROUND,
+        est_tokens=estimate_tokens(len(prompt), 4000),
+        tag="[IR Financials]",
     )
     
     result_text = response.choices[0].message.content
@@ -553,6 +969,67 @@ IR資料から企業の重要情報を段階的に抽出してください。ま
         }
 
 
+@lru_cache(maxsize=16)
+def _keyword_pattern(keywords: tuple) -> "re.Pattern":
+    """
+    キーワード群を1つの正規表現にまとめる(全文を1回走査するため)
+    ※ 小文字のキーワード("segment"等)は従来の line.lower() 照合に合わせて大文字小文字を区別しない
+    """
+    alternatives = []
+    for keyword in sorted(keywords, key=len, reverse=True):
+        escaped = re.escape(keyword)
+        alternatives.append("(?i:" + escaped + ")" if keyword == keyword.lower() else escaped)
+    return re.compile("|".join(alternatives))
+
+
+def build_keyword_context(text: str, keywords: List[str], window: int = 5, budget: int = 12000) -> str:
+    """
+    キーワードを含む行の前後window行を、重複しない区間に統合して抽出
+    
+    Args:
+        text: 全文テキスト
+        keywords: 探索キーワード
+        window: 前後に含める行数
+        budget: 最大文字数
+    
+    Returns:
+        抽出テキスト(区間ごとに空行区切り)
+    """
+    text_lines = text.split("\n")
+    line_starts = []
+    offset = 0
+    for line in text_lines:
+        line_starts.append(offset)
+        offset += len(line) + 1
+
+    # 全文を1回走査してヒット行を特定
+    hit_lines = sorted({
+        bisect_right(line_starts, m.start()) - 1
+        for m in _keyword_pattern(tuple(keywords)).finditer(text)
+    })
+
+    # 前後window行の区間を統合(重なり・隣接する区間は1つにまとめる)
+    intervals: List[List[int]] = []
+    for i in hit_lines:
+        start_idx = max(0, i - window)
+        end_idx = min(len(text_lines), i + window + 1)
+        if intervals and start_idx <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], end_idx)
+        else:
+            intervals.append([start_idx, end_idx])
+
+    parts: List[str] = []
+    remaining = budget
+    for start_idx, end_idx in intervals:
+        chunk = "\n".join(text_lines[start_idx:end_idx]) + "\n\n"
+        if len(chunk) > remaining:
+            parts.append(chunk[:remaining])
+            break
+        parts.append(chunk)
+        remaining -= len(chunk)
+    return "".join(parts)
+
+
 def extract_detailed_segments(text: str, api_key: str) -> str:
     """
     事業セグメント情報に特化した二次抽出
@@ -572,18 +1049,7 @@ def extract_detailed_segments(text: str, api_key: str) -> str:
     ]
     
     # キーワードを含む段落を抽出（前後の文脈も含める）
-    relevant_text = ""
-    text_lines = text.split("\n")
-    
-    for i, line in enumerate(text_lines):
-        for keyword in segment_keywords:
-            if keyword in line.lower() or keyword in line:
-                # 該当行の前後5行を含める
-                start_idx = max(0, i-5)
-                end_idx = min(len(text_lines), i+6)
-                segment_context = "\n".join(text_lines[start_idx:end_idx])
-                relevant_text += segment_context + "\n\n"
-                break
+    relevant_text = build_keyword_context(text, segment_keywords, window=5, budget=SEGMENT_TEXT_BUDGET)
     
     # 関連テキストがない場合は元のテキストの一部を使用
     if len(relevant_text) < 100:
@@ -611,12 +1077,17 @@ def extract_detailed_segments(text: str, api_key: str) -> str:
 """
     
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-5-mini",  # 5-miniを利用
-            messages=[{"role": "user", "content": prompt}],
-            #temperature=0.1,
-            # max_tokens=500
+        client = get_openai_client(api_key)
+        response = scheduled_call(
+            lambda: client.chat.completions.create(
+                model="gpt-5-mini",  # 5-miniを利用
+                messages=[{"role": "user", "content": prompt}],
+                #temperature=0.1,
+                # max_tokens=500
+            ),
+            priority=PRIORITY_BACKGROUND,
+            est_tokens=estimate_tokens(len(prompt), 4000),
+            tag="[IR Segments]",
         )
         
         result = response.choices[0].message.content.strip()
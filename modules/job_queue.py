@@ -0,0 +1,297 @@
+"""
+分析ジョブのバックグラウンド実行キュー
+
+- 分析(Step0 → Step1 → Step2)をワーカースレッドで実行し、進捗・途中経過をSQLiteのジョブ表に記録
+- Streamlitの再実行(ウィジェット操作・ブラウザ再接続)ではジョブIDから状態を読み直すだけで、処理は継続する
+- 同じ入力で実行中のジョブがあれば新規投入せず、そのジョブIDを返す(再実行による二重起動を防止)
+- プロセス再起動時、未完了(queued/running)のジョブは再投入する
+- DBを作成できない環境(読み取り専用など)ではメモリ上のDBで動作する
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .cache_store import CACHE_DIR
+from .logger import get_logger
+from .tracing import trace_run
+
+logger = get_logger(__name__)
+
+# 同時に実行する分析ジョブ数
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# 途中経過(生成中のレポート)をDBへ書き込む最小間隔(秒)
+JOB_PARTIAL_INTERVAL = float(os.getenv("JOB_PARTIAL_INTERVAL", "1.0"))
+# 完了済みジョブの保持期間(秒)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+# JSONとして保存する列
+_JSON_COLUMNS = {"step0", "trace"}
+_COLUMNS = (
+    "id", "company_name", "job_info", "status", "stage", "progress", "step0",
+    "draft_report", "partial_report", "final_report", "error", "trace", "created_at", "updated_at",
+)
+
+
+class JobStore:
+    """ジョブ表(SQLite)の読み書き(スレッドセーフ)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            # 読み取り専用環境ではプロセス内のみで保持(再起動で消える)
+            logger.warning("[Jobs] using in-memory store (%s): %s", path, str(e)[:100])
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " company_name TEXT NOT NULL,"
+            " job_info TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " stage TEXT,"
+            " progress INTEGER NOT NULL DEFAULT 0,"
+            " step0 TEXT,"
+            " draft_report TEXT,"
+            " partial_report TEXT,"
+            " final_report TEXT,"
+            " error TEXT,"
+            " trace TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        # 旧バージョンで作成した表には trace 列を追加
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "trace" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN trace TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            if job[column]:
+                job[column] = json.loads(job[column])
+        return job
+
+    def create(self, company_name: str, job_info: str) -> Tuple[str, bool]:
+        """
+        ジョブを登録(同じ入力の未完了ジョブがあればそのIDを返す)
+
+        Returns:
+            (ジョブID, 新規登録したか)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE company_name = ? AND job_info = ? AND status IN (?, ?)"
+                " ORDER BY created_at DESC LIMIT 1",
+                (company_name, job_info) + ACTIVE_STATUSES,
+            ).fetchone()
+            if row:
+                return row[0], False
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO jobs (id, company_name, job_info, status, stage, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                (job_id, company_name, job_info, STATUS_QUEUED, "待機中", now, now),
+            )
+            self._conn.commit()
+            return job_id, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブ1件を取得(存在しなければNone)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT " + ", ".join(_COLUMNS) + " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """指定列を更新(updated_at は自動更新)"""
+        values = [json.dumps(v, ensure_ascii=False) if k in _JSON_COLUMNS and v is not None else v for k, v in fields.items()]
+        assignments = ", ".join(k + " = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET " + assignments + ", updated_at = ? WHERE id = ?",
+                values + [time.time(), job_id],
+            )
+            self._conn.commit()
+
+    def active_ids(self) -> List[str]:
+        """未完了(queued/running)のジョブID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def purge(self, older_than: float) -> int:
+        """古い完了済みジョブを削除"""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                ACTIVE_STATUSES + (time.time() - older_than,),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+
+class _PartialWriter:
+    """生成中テキストを一定間隔でDBへ書き込みながら差分を後段へ流す"""
+
+    def __init__(self, store: JobStore, job_id: str, interval: float = JOB_PARTIAL_INTERVAL):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+
+    def stream(self, deltas: Iterator[str]) -> Iterator[str]:
+        parts: List[str] = []
+        last_write = 0.0
+        for delta in deltas:
+            parts.append(delta)
+            now = time.monotonic()
+            if now - last_write >= self.interval:
+                self.store.update(self.job_id, partial_report="".join(parts))
+                last_write = now
+            yield delta
+        self.store.update(self.job_id, partial_report="".join(parts))
+
+
+def run_analysis_job(store: JobStore, job_id: str) -> None:
+    """
+    1件の分析ジョブを実行し、段階ごとに進捗をジョブ表へ記録(画面版 run_analysis と同じ処理順)
+
+    Args:
+        store: ジョブ表
+        job_id: ジョブID
+    """
+    from .checkpoint import open_run
+    from .openai_api import OPENAI_MODEL, generate_step2_report_pipelined, stream_step1_report, stream_step2_report
+    from .pipeline import run_step0
+    from .report_store import get_report_store
+    from .prompt_loader import PROMPT_STEP1, PROMPT_STEP2
+
+    job = store.get(job_id)
+    if job is None:
+        return
+    company_name, job_info = job["company_name"], job["job_info"]
+    writer = _PartialWriter(store, job_id)
+    started = time.perf_counter()
+    with trace_run("analysis", company=company_name, job_id=job_id) as run:
+        try:
+            store.update(job_id, status=STATUS_RUNNING, stage="Step 0: IR検索・業界データ取得中", progress=10, error=None)
+            # 同じ入力の前回実行(このジョブの再投入を含む)が途中で失敗していれば保存済みの段階から再開
+            checkpoint = open_run(company_name, job_info)
+            step0 = run_step0(company_name, job_info, checkpoint=checkpoint)
+            store.update(job_id, stage="Step 1: 初回分析生成中", progress=50, step0={
+                "financials": step0["financials"],
+                "used_estimation": step0["used_estimation"],
+                "industry_keyword": step0["industry_keyword"],
+                "ir_elapsed": step0["ir_elapsed"],
+                "market_elapsed": step0["market_elapsed"],
+                "total_elapsed": step0["total_elapsed"],
+            })
+
+            pipelined = os.getenv("STEP2_PIPELINED") == "1" and not checkpoint.has("draft_report")
+            draft_report = checkpoint.get("draft_report")
+            if draft_report is None:
+                step1_deltas = writer.stream(stream_step1_report(
+                    company_name=company_name,
+                    job_info=job_info,
+                    financials=step0["financials"],
+                    market_data=step0["market_data"],
+                    prompt_template=PROMPT_STEP1
+                ))
+                if pipelined:
+                    draft_report, final_report = generate_step2_report_pipelined(step1_deltas, PROMPT_STEP2)
+                else:
+                    draft_report = "".join(step1_deltas)
+            store.update(job_id, draft_report=draft_report, partial_report=None)
+            logger.info("[Jobs] Step1 length: %d (job=%s, company=%s)", len(draft_report or ""), job_id, company_name)
+
+            # 画面版と同じガード: 極端に短い場合はStep2へ送らず停止
+            if len(draft_report or "") < 300:
+                raise RuntimeError("Step1の出力が想定より短い/空です。入力内容やAPIレスポンスを確認してください。")
+            checkpoint.save(draft_report=draft_report)
+
+            if not pipelined:
+                store.update(job_id, stage="Step 2: レビュー・修正中", progress=70)
+                final_report = "".join(writer.stream(stream_step2_report(
+                    draft_report=draft_report,
+                    prompt_template=PROMPT_STEP2
+                )))
+            logger.info("[Jobs] Step2 length: %d (job=%s, company=%s)", len(final_report or ""), job_id, company_name)
+            if final_report:
+                checkpoint.save(final_report=final_report)
+            trace = run.summary()
+            store.update(
+                job_id, status=STATUS_DONE, stage="分析完了", progress=100,
+                final_report=final_report, partial_report=None, trace=trace,
+            )
+            get_report_store().save(
+                company_name, job_info, final_report, step0=step0, trace=trace,
+                elapsed=time.perf_counter() - started, model=OPENAI_MODEL,
+            )
+        except Exception as e:
+            logger.exception("[Jobs] job failed: job=%s company=%s", job_id, company_name)
+            store.update(
+                job_id, status=STATUS_ERROR, stage="エラー", error=str(e)[:200], partial_report=None,
+                trace=run.summary(),
+            )
+
+
+class JobQueue:
+    """ジョブ表 + ワーカースレッドプール"""
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-job")
+        self.store.purge(JOB_RETENTION_SECONDS)
+        # 前回プロセスで未完了だったジョブを再投入
+        for job_id in self.store.active_ids():
+            logger.info("[Jobs] resubmit unfinished job: %s", job_id)
+            self._pool.submit(run_analysis_job, self.store, job_id)
+
+    def submit(self, company_name: str, job_info: str) -> str:
+        """
+        分析ジョブを投入(同じ入力が実行中ならそのジョブを返す)
+
+        Returns:
+            ジョブID
+        """
+        job_id, created = self.store.create(company_name, job_info)
+        if created:
+            logger.info("[Jobs] submitted: job=%s company=%s", job_id, company_name)
+            self._pool.submit(run_analysis_job, self.store, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """プロセス共有のジョブキューを取得(Streamlitの全セッションで共有)"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(JobStore(os.path.join(CACHE_DIR, "jobs.sqlite3")))
+        return _queue
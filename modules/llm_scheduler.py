@@ -0,0 +1,237 @@
+"""
+OpenAI呼び出しの共有スケジューラ
+
+- RPM(リクエスト数/分)・TPM(トークン数/分)のトークンバケットで送信ペースを制御
+- 429/5xx/接続エラーはジッター付き指数バックオフで再試行(Retry-Afterヘッダーを優先)
+- 優先レーン: 対話的なStep1/Step2(INTERACTIVE)の待ちがある間、背景処理(BACKGROUND)は送信を待機
+"""
+import contextvars
+import email.utils
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from .logger import get_logger
+from .tracing import span
+
+logger = get_logger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "2000000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1.0"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "60"))
+
+_default_priority = contextvars.ContextVar("llm_request_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """このコンテキスト内のOpenAI呼び出しの既定優先度を変更(バッチ処理ではBACKGROUNDを指定)"""
+    token = _default_priority.set(priority)
+    try:
+        yield
+    finally:
+        _default_priority.reset(token)
+
+
+def estimate_tokens(text_length: int, max_output_tokens: int = 0) -> int:
+    """
+    送信トークン数の概算(日本語はおおむね1文字≒1トークン弱のため文字数の半分強 + 出力上限)
+    """
+    return int(text_length * 0.6) + max_output_tokens
+
+
+class TokenBucket:
+    """1分あたりの上限を連続的に補充するトークンバケット"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount 分を消費できるまでの待ち秒数(0なら即時)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+
+class RequestScheduler:
+    """RPM/TPM制限・優先度・再試行を一元管理するスケジューラ"""
+
+    def __init__(self, rpm: int, tpm: int, max_retries: int, backoff_base: float, backoff_max: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._paused_until = 0.0
+
+    def _acquire(self, priority: int, est_tokens: int) -> None:
+        """送信枠を確保するまで待機(高優先の待ちがある間は低優先を後回し)"""
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if priority == PRIORITY_BACKGROUND and self._waiting[PRIORITY_INTERACTIVE] > 0:
+                        self._cond.wait(timeout=1.0)
+                        continue
+                    wait = max(
+                        self._paused_until - now,
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(est_tokens),
+                    )
+                    if wait <= 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(est_tokens)
+                        return
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def _pause(self, seconds: float) -> None:
+        """429受信時は全リクエストの送信を一時停止(他スレッドの連続429を防ぐ)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def adjust_tokens(self, delta: int) -> None:
+        """実際の使用トークン数との差分を反映(usage取得後に呼ぶ)"""
+        with self._cond:
+            self.tokens.consume(delta)
+
+    def call(self, func: Callable[[], Any], priority: Optional[int] = None, est_tokens: int = 0, tag: str = "[LLM]") -> Any:
+        """
+        送信枠を確保してfuncを実行し、再試行可能なエラーはバックオフして再実行
+
+        Args:
+            func: OpenAI呼び出し(引数なしの関数)
+            priority: PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND (Noneならコンテキストの既定値)
+            est_tokens: 概算トークン数(TPM制御用)
+            tag: ログ用の識別子
+
+        Returns:
+            funcの戻り値
+        """
+        if priority is None:
+            priority = _default_priority.get()
+        attempt = 0
+        while True:
+            self._acquire(priority, est_tokens)
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                    delay = random.uniform(delay / 2, delay)
+                if getattr(e, "status_code", None) == 429:
+                    self._pause(delay)
+                attempt += 1
+                logger.warning(
+                    "%s retry %d/%d in %.1fs: %s: %s",
+                    tag, attempt, self.max_retries, delay, type(e).__name__, str(e)[:100]
+                )
+                time.sleep(delay)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429/408/409/5xx、接続エラー、タイムアウトを再試行対象とする"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """レスポンスの retry-after-ms / Retry-After ヘッダーから待ち秒数を取得"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return max(0.0, float(retry_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """プロセス共有のスケジューラを取得"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_RETRIES, OPENAI_BACKOFF_BASE, OPENAI_BACKOFF_MAX
+            )
+        return _scheduler
+
+
+def scheduled_call(func: Callable[[], Any], priority: Optional[int] = None, est_tokens: int = 0, tag: str = "[LLM]") -> Any:
+    """
+    共有スケジューラ経由でOpenAIを呼び出す(usageがあれば実トークン数で補正)
+
+    Args:
+        func: OpenAI呼び出し(引数なしの関数)
+        priority: 優先度(Noneならコンテキストの既定値)
+        est_tokens: 概算トークン数
+        tag: ログ用の識別子
+
+    Returns:
+        funcの戻り値
+    """
+    scheduler = get_scheduler()
+    # 待機(レート制限・再試行)を含む所要時間とトークン使用量を記録
+    with span("llm.request", tag=tag, est_tokens=est_tokens) as s:
+        response = scheduler.call(func, priority=priority, est_tokens=est_tokens, tag=tag)
+        usage = getattr(response, "usage", None)
+        s.set_usage(usage)
+    total_tokens = getattr(usage, "total_tokens", None)
+    if isinstance(total_tokens, int):
+        scheduler.adjust_tokens(total_tokens - est_tokens)
+    return response
@@ -0,0 +1,178 @@
+"""
+レポートMarkdownの構文解析(全エクスポート形式で共有)
+
+- 1行ずつ1回だけ走査してブロックのリストを作成(見出し・段落・箇条書き・表・区切り線・コードブロック)
+- 表は列数を問わずヘッダー行+データ行として保持(区切り行 `|---|` がない表はヘッダーなし)
+- 行内は太字(**...** / __...__)のみを区別し、{"text", "bold"} のランのリストで保持
+- 同じレポートの解析結果は `parse_report()` がプロセス内で再利用する(Word/PDF/JSON/HTMLで共通)
+
+ブロックの形式:
+    {"type": "heading", "level": 1-6, "inlines": [...]}
+    {"type": "paragraph", "inlines": [...]}
+    {"type": "list", "ordered": bool, "items": [{"level": int, "inlines": [...]}, ...]}
+    {"type": "table", "header": [[...], ...] または None, "rows": [[[...], ...], ...]}
+    {"type": "rule"}
+    {"type": "code", "text": str}
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Inline = Dict[str, Any]
+Block = Dict[str, Any]
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_RE = re.compile(r"^(\s*)([-*+・]|\d+[.)])\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+
+
+def parse_inlines(text: str) -> List[Inline]:
+    """
+    行内の太字を解析
+
+    Args:
+        text: 1行分のテキスト
+
+    Returns:
+        [{"text": str, "bold": bool}, ...](空のランは含まない)
+    """
+    runs: List[Inline] = []
+    pos = 0
+    for match in _BOLD_RE.finditer(text):
+        if match.start() > pos:
+            runs.append({"text": text[pos:match.start()], "bold": False})
+        runs.append({"text": match.group(1) or match.group(2), "bold": True})
+        pos = match.end()
+    if pos < len(text):
+        runs.append({"text": text[pos:], "bold": False})
+    return runs
+
+
+def inline_text(inlines: List[Inline]) -> str:
+    """ランのリストを装飾なしの文字列に戻す"""
+    return "".join(run["text"] for run in inlines)
+
+
+def _split_row(line: str) -> List[str]:
+    cells = line.strip()
+    if cells.startswith("|"):
+        cells = cells[1:]
+    if cells.endswith("|"):
+        cells = cells[:-1]
+    return [cell.strip() for cell in cells.split("|")]
+
+
+def _table_block(lines: List[str]) -> Block:
+    """連続する `|` 行から表ブロックを作成(2行目が区切り行なら1行目をヘッダーとする)"""
+    header = None
+    if len(lines) >= 2 and _TABLE_SEPARATOR_RE.match(lines[1]):
+        header = [parse_inlines(cell) for cell in _split_row(lines[0])]
+        body = lines[2:]
+    else:
+        body = lines
+    rows = [
+        [parse_inlines(cell) for cell in _split_row(line)]
+        for line in body
+        if not _TABLE_SEPARATOR_RE.match(line)
+    ]
+    width = len(header) if header else max((len(row) for row in rows), default=0)
+    # 列数をヘッダーに揃える(不足は空セル、超過は切り捨て)
+    rows = [row[:width] + [[] for _ in range(width - len(row))] for row in rows]
+    return {"type": "table", "header": header, "rows": rows}
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """
+    行を1回だけ走査してブロックを順に返す
+
+    Args:
+        lines: Markdownの行(改行を含んでもよい)
+
+    Yields:
+        ブロック(dict)
+    """
+    table_lines: List[str] = []
+    list_block: Optional[Block] = None
+    code_lines: Optional[List[str]] = None
+
+    def flush() -> Iterator[Block]:
+        nonlocal table_lines, list_block
+        if table_lines:
+            yield _table_block(table_lines)
+            table_lines = []
+        if list_block:
+            yield list_block
+            list_block = None
+
+    for raw_line in lines:
+        line = raw_line.rstrip("\r\n")
+
+        # コードブロック内はそのまま保持
+        if code_lines is not None:
+            if line.strip().startswith("```"):
+                yield {"type": "code", "text": "\n".join(code_lines)}
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            if list_block:
+                yield list_block
+                list_block = None
+            table_lines.append(stripped)
+            continue
+
+        list_match = _LIST_RE.match(line)
+        if list_match and not _RULE_RE.match(line):
+            if table_lines:
+                yield _table_block(table_lines)
+                table_lines = []
+            ordered = list_match.group(2)[0].isdigit()
+            if list_block is None or list_block["ordered"] != ordered:
+                if list_block:
+                    yield list_block
+                list_block = {"type": "list", "ordered": ordered, "items": []}
+            list_block["items"].append({
+                "level": len(list_match.group(1).expandtabs(4)) // 2,
+                "inlines": parse_inlines(list_match.group(3).strip()),
+            })
+            continue
+
+        yield from flush()
+        if not stripped:
+            continue
+        if stripped.startswith("```"):
+            code_lines = []
+            continue
+        if _RULE_RE.match(stripped):
+            yield {"type": "rule"}
+            continue
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            yield {"type": "heading", "level": len(heading.group(1)), "inlines": parse_inlines(heading.group(2))}
+            continue
+        yield {"type": "paragraph", "inlines": parse_inlines(stripped)}
+
+    yield from flush()
+    if code_lines is not None:
+        yield {"type": "code", "text": "\n".join(code_lines)}
+
+
+@lru_cache(maxsize=32)
+def parse_report(text: str) -> Tuple[Block, ...]:
+    """
+    レポート全体を解析(同じテキストは再解析しない)
+
+    返り値は共有されるため、呼び出し側で変更しないこと。
+
+    Args:
+        text: レポートのMarkdown
+
+    Returns:
+        ブロックのタプル
+    """
+    return tuple(iter_blocks(text.splitlines()))
@@ -4,13 +4,31 @@ OpenAI APIを呼び出すモジュール
 【最重要】プロンプトは絶対に改変しない
 YUTOさんが作成したプロンプトをそのまま使用する
 """
+import contextvars
+import hashlib
+import json
 import os
-from openai import OpenAI
-from typing import Dict
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from .logger import get_logger
+from .openai_client import get_openai_client
+from .cache_store import get_cache, make_cache_key
+from .llm_scheduler import estimate_tokens, scheduled_call
+from .tracing import span
 
 logger = get_logger(__name__)
 
+# パイプライン版Step2で1回のリクエストに含める最小文字数(短い章はまとめて送る)
+STEP2_SECTION_MIN_CHARS = int(os.getenv("STEP2_SECTION_MIN_CHARS", "1500"))
+
+# 生成結果キャッシュ(同一入力・同一プロンプトの再実行を省略、OPENAI_CACHE_DISABLE=1 で無効化)
+OPENAI_MODEL = "gpt-5-mini"
+OPENAI_MAX_COMPLETION_TOKENS = 16000
+OPENAI_CACHE_TTL = int(os.getenv("OPENAI_CACHE_TTL", str(30 * 24 * 3600)))
+OPENAI_CACHE_MAX_BYTES = int(os.getenv("OPENAI_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
 
 def clean_error_message(message: str) -> str:
     """
@@ -33,15 +51,15 @@ def clean_error_message(message: str) -> str:
     return safe_msg
 
 
-def generate_step1_report(
+def build_step1_messages(
     company_name: str,
     job_info: str,
     financials: Dict[str, str],
     market_data: str,
     prompt_template: str
-) -> str:
+) -> List[Dict[str, str]]:
     """
-    Step1: 初回分析レポート生成
+    Step1のリクエストメッセージを組み立てる(通常・ストリーミング共通)
     
     【重要】prompt_templateの内容は一切変更しない
     
@@ -53,7 +71,7 @@ def generate_step1_report(
         prompt_template: YUTOさんのプロンプト(変更禁止)
     
     Returns:
-        初回分析レポート(Markdown)
+        [system, user] のメッセージリスト
     """
     
     # 財務データの型検証とログ出力
@@ -151,35 +169,90 @@ def generate_step1_report(
     final_user_prompt += "\n"
     final_user_prompt += "="*80
     
-    # OpenAI API呼び出し
-    # クライアントを実行時に初期化
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEYが未設定です。環境変数を設定してください。")
-    client = OpenAI(api_key=api_key)
-    
     # デバッグ: 実際に送信するメッセージ内容をログ出力
     logger.info("[Step1] request lengths: system=%d, user=%d", len(system_supplement), len(final_user_prompt))
-    try:
-        response = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {"role": "system", "content": system_supplement},
-                {"role": "user", "content": final_user_prompt}
-            ],
-            max_completion_tokens=16000,
-        )
-        content = response.choices[0].message.content
-        logger.info("[Step1] response length: %d", len(content or ""))
-        return content
-    except Exception as e:
-        logger.exception("[Step1] OpenAI call failed: %s", str(e)[:200])
-        raise
+    return [
+        {"role": "system", "content": system_supplement},
+        {"role": "user", "content": final_user_prompt}
+    ]
+
+
+def generate_step1_report(
+    company_name: str,
+    job_info: str,
+    financials: Dict[str, str],
+    market_data: str,
+    prompt_template: str,
+    use_cache: bool = True
+) -> str:
+    """
+    Step1: 初回分析レポート生成
+    
+    【重要】prompt_templateの内容は一切変更しない
+    
+    Args:
+        company_name: 会社名
+        job_info: 求人情報
+        financials: 財務データ(自動取得)
+        market_data: 業界データ(Web検索結果)
+        prompt_template: YUTOさんのプロンプト(変更禁止)
+        use_cache: 生成結果キャッシュを使うか
+    
+    Returns:
+        初回分析レポート(Markdown)
+    """
+    messages = build_step1_messages(company_name, job_info, financials, market_data, prompt_template)
+    return _complete(messages, "[Step1]", _completion_cache_key(messages, prompt_template, use_cache))
+
+
+def stream_step1_report(
+    company_name: str,
+    job_info: str,
+    financials: Dict[str, str],
+    market_data: str,
+    prompt_template: str,
+    use_cache: bool = True
+) -> Iterator[str]:
+    """
+    Step1: 初回分析レポート生成(ストリーミング版)
+    
+    【重要】prompt_templateの内容は一切変更しない
+    
+    Args:
+        generate_step1_report と同じ
+    
+    Yields:
+        生成テキストの差分(順に連結すると初回分析レポート)
+    """
+    messages = build_step1_messages(company_name, job_info, financials, market_data, prompt_template)
+    yield from _stream_complete(messages, "[Step1]", _completion_cache_key(messages, prompt_template, use_cache))
+
+
+def build_step2_messages(draft_report: str, prompt_template: str) -> List[Dict[str, str]]:
+    """
+    Step2のリクエストメッセージを組み立てる(通常・ストリーミング共通)
+    
+    【重要】prompt_templateの内容は一切変更しない
+    
+    Args:
+        draft_report: Step1の出力結果
+        prompt_template: YUTOさんのプロンプト(変更禁止)
+    
+    Returns:
+        [user] のメッセージリスト
+    """
+    # プロンプト内の指示に従ってStep1出力を挿入
+    final_prompt = prompt_template.replace("{step1_report}", draft_report)
+    
+    # デバッグ: Step2リクエスト内容をログ出力
+    logger.info("[Step2] request user length: %d", len(final_prompt))
+    return [{"role": "user", "content": final_prompt}]
 
 
 def generate_step2_report(
     draft_report: str,
-    prompt_template: str
+    prompt_template: str,
+    use_cache: bool = True
 ) -> str:
     """
     Step2: レビュー・修正版生成
@@ -189,31 +262,525 @@ def generate_step2_report(
     Args:
         draft_report: Step1の出力結果
         prompt_template: YUTOさんのプロンプト(変更禁止)
+        use_cache: 生成結果キャッシュを使うか
     
     Returns:
         完全版レポート(Markdown)
     """
+    messages = build_step2_messages(draft_report, prompt_template)
+    return _complete(messages, "[Step2]", _completion_cache_key(messages, prompt_template, use_cache))
+
+
+def stream_step2_report(
+    draft_report: str,
+    prompt_template: str,
+    use_cache: bool = True
+) -> Iterator[str]:
+    """
+    Step2: レビュー・修正版生成(ストリーミング版)
     
-    # プロンプト内の指示に従ってStep1出力を挿入
-    final_prompt = prompt_template.replace("{step1_report}", draft_report)
+    【重要】prompt_templateの内容は一切変更しない
+    
+    Args:
+        draft_report: Step1の出力結果
+        prompt_template: YUTOさんのプロンプト(変更禁止)
+        use_cache: 生成結果キャッシュを使うか
+    
+    Yields:
+        生成テキストの差分(順に連結すると完全版レポート)
+    """
+    messages = build_step2_messages(draft_report, prompt_template)
+    yield from _stream_complete(messages, "[Step2]", _completion_cache_key(messages, prompt_template, use_cache))
+
+
+def _completion_cache_key(messages: List[Dict[str, str]], prompt_template: str, use_cache: bool) -> Optional[str]:
+    """
+    生成結果キャッシュのキー(モデル + メッセージ + プロンプトファイルの版)
+    
+    Returns:
+        キャッシュキー(キャッシュ無効時はNone)
+    """
+    if not use_cache or os.getenv("OPENAI_CACHE_DISABLE") == "1":
+        return None
+    return make_cache_key({
+        "model": OPENAI_MODEL,
+        "max_completion_tokens": OPENAI_MAX_COMPLETION_TOKENS,
+        "prompt_version": hashlib.sha256(prompt_template.encode("utf-8")).hexdigest(),
+        "messages": messages,
+    })
+
+
+def _completion_cache():
+    return get_cache("completions", max_entries=2000, max_bytes=OPENAI_CACHE_MAX_BYTES)
+
+
+def _cache_completion(cache_key: str, content: str, finish_reason: Optional[str], tag: str) -> None:
+    """
+    生成結果をキャッシュ(正常終了 finish_reason == "stop" の場合のみ)
+
+    出力上限で打ち切られた応答("length")などを保存すると、同じ入力の再実行でも途中までの結果が返り続けるため
+    """
+    if finish_reason != "stop":
+        logger.warning("%s not cached: finish_reason=%s", tag, finish_reason)
+        return
+    _completion_cache().set("chat", cache_key, content, ttl=OPENAI_CACHE_TTL)
+
+
+def _complete(messages: List[Dict[str, str]], tag: str, cache_key: Optional[str] = None) -> str:
+    """
+    OpenAI API呼び出し(一括応答)
     
-    # OpenAI API呼び出し
+    Args:
+        messages: リクエストメッセージ
+        tag: ログ用の識別子(例: "[Step1]")
+        cache_key: 生成結果キャッシュのキー(Noneならキャッシュしない)
+    
+    Returns:
+        生成テキスト
+    """
+    if cache_key:
+        cached = _completion_cache().get("chat", cache_key)
+        if cached is not None:
+            logger.info("%s cache hit: length=%d", tag, len(cached))
+            with span("llm.cache_hit", tag=tag, length=len(cached)):
+                return cached
+
+    # 共有クライアント(コネクションプール再利用)を取得
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEYが未設定です。環境変数を設定してください。")
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
-    # デバッグ: Step2リクエスト内容をログ出力
-    logger.info("[Step2] request user length: %d", len(final_prompt))
+    est_tokens = estimate_tokens(sum(len(m["content"]) for m in messages), OPENAI_MAX_COMPLETION_TOKENS)
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[{"role": "user", "content": final_prompt}],
-            max_completion_tokens=16000,
+        response = scheduled_call(
+            lambda: client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_completion_tokens=OPENAI_MAX_COMPLETION_TOKENS,
+            ),
+            est_tokens=est_tokens,
+            tag=tag,
         )
         content = response.choices[0].message.content
-        logger.info("[Step2] response length: %d", len(content or ""))
-        return content
+        finish_reason = response.choices[0].finish_reason
+        logger.info("%s response length: %d, finish_reason: %s", tag, len(content or ""), finish_reason)
     except Exception as e:
-        logger.exception("[Step2] OpenAI call failed: %s", str(e)[:200])
+        logger.exception("%s OpenAI call failed: %s", tag, str(e)[:200])
         raise
+    if cache_key and content:
+        _cache_completion(cache_key, content, finish_reason, tag)
+    return content
+
+
+def _stream_complete(messages: List[Dict[str, str]], tag: str, cache_key: Optional[str] = None) -> Iterator[str]:
+    """
+    OpenAI API呼び出し(ストリーミング応答)
+    
+    Args:
+        messages: リクエストメッセージ
+        tag: ログ用の識別子(例: "[Step1]")
+        cache_key: 生成結果キャッシュのキー(Noneならキャッシュしない)
+    
+    Yields:
+        生成テキストの差分(キャッシュヒット時は全文を1回で返す)
+    """
+    if cache_key:
+        cached = _completion_cache().get("chat", cache_key)
+        if cached is not None:
+            logger.info("%s cache hit: length=%d", tag, len(cached))
+            with span("llm.cache_hit", tag=tag, length=len(cached)):
+                pass
+            yield cached
+            return
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEYが未設定です。環境変数を設定してください。")
+    client = get_openai_client(api_key)
+    
+    parts: List[str] = []
+    finish_reason: Optional[str] = None
+    est_tokens = estimate_tokens(sum(len(m["content"]) for m in messages), OPENAI_MAX_COMPLETION_TOKENS)
+    # 受信完了までの所要時間・最初の差分までの時間・トークン使用量(最終チャンクのusage)を記録
+    with span("llm.stream", tag=tag) as s:
+        started = time.perf_counter()
+        try:
+            # 再試行は接続確立(最初の応答)まで。受信開始後の切断は呼び出し元へ通知
+            stream = scheduled_call(
+                lambda: client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    max_completion_tokens=OPENAI_MAX_COMPLETION_TOKENS,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                ),
+                est_tokens=est_tokens,
+                tag=tag,
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    s.set_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                # 終了理由は最後の差分のチャンクに入る
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        s.set(first_token_ms=round((time.perf_counter() - started) * 1000.0, 1))
+                    parts.append(delta)
+                    yield delta
+            s.set(length=sum(len(p) for p in parts), finish_reason=finish_reason)
+            logger.info("%s streamed response length: %d, finish_reason: %s", tag, sum(len(p) for p in parts), finish_reason)
+        except Exception as e:
+            logger.exception("%s OpenAI stream failed: %s", tag, str(e)[:200])
+            raise
+    # 最後まで受信でき、正常終了した場合のみキャッシュ
+    if cache_key and parts:
+        _cache_completion(cache_key, "".join(parts), finish_reason, tag)
+
+
+def split_markdown_sections(text: str) -> List[str]:
+    """
+    Markdownを「## 」見出し単位の章に分割(最初の見出し前の前置きは先頭の章に含める)
+    
+    Args:
+        text: Markdownテキスト
+    
+    Returns:
+        章ごとのテキスト(連結すると元のテキスト)
+    """
+    starts = [0] + [m.start() + 1 for m in re.finditer(r"\n## ", text)]
+    if len(starts) > 1 and not text.startswith("## "):
+        # 見出し前の前置きは最初の章に含める
+        starts.pop(1)
+    bounds = starts + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+def _section_keys(text: str) -> List[str]:
+    """章見出しの識別キー(「Step N」があれば番号、なければ見出し文字列)"""
+    keys = []
+    for line in text.split("\n"):
+        if line.startswith("## "):
+            m = re.search(r"Step\s*(\d+)", line)
+            keys.append("step" + m.group(1) if m else line[3:].strip())
+    return keys
+
+
+def _pick_reviewed_sections(review: str, allowed_keys: set) -> str:
+    """Step2出力から、対象の章だけを取り出す(該当なしなら出力全体)"""
+    lines = [line for line in review.split("\n") if line.strip() not in ("```", "```markdown")]
+    cleaned = "\n".join(lines)
+    picked = [
+        section for section in split_markdown_sections(cleaned)
+        if set(_section_keys(section)) & allowed_keys
+    ]
+    if not picked:
+        return cleaned.strip()
+    return "\n\n".join(section.strip() for section in picked)
+
+
+def generate_step2_report_pipelined(
+    step1_deltas: Iterable[str],
+    prompt_template: str,
+    max_workers: int = 4,
+    min_section_chars: int = STEP2_SECTION_MIN_CHARS,
+) -> Tuple[str, str]:
+    """
+    Step1のストリームを章(「## 」見出し)単位で区切り、確定した章から順にStep2を並列実行して
+    章の順序通りに連結する(パイプライン版)
+    
+    【重要】prompt_templateの内容は一切変更しない(章ごとに {step1_report} へ挿入する)
+    
+    Args:
+        step1_deltas: Step1の生成テキスト差分(stream_step1_report の戻り値など)
+        prompt_template: YUTOさんのプロンプト(変更禁止)
+        max_workers: Step2の同時実行数
+        min_section_chars: 1回のStep2に渡す最小文字数(短い章はまとめて送る)
+    
+    Returns:
+        (Step1全文, Step2完全版レポート)
+    """
+    draft_parts: List[str] = []
+    buffer = ""
+    pending: List[str] = []
+    groups: List[List[str]] = []
+    futures = []
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="step2")
+
+    def submit(sections: List[str]) -> None:
+        groups.append(sections)
+        # 呼び出し元の優先度(バッチ処理ではBACKGROUND)をワーカースレッドへ引き継ぐ
+        futures.append(pool.submit(contextvars.copy_context().run, generate_step2_report, "".join(sections), prompt_template))
+        logger.info("[Step2] pipelined section group %d submitted (sections=%d)", len(groups), len(sections))
+
+    try:
+        for delta in step1_deltas:
+            draft_parts.append(delta)
+            buffer += delta
+            # 次の「## 」見出しが現れた時点で、それより前の章は確定
+            last_heading = buffer.rfind("\n## ")
+            if last_heading <= 0:
+                continue
+            completed = split_markdown_sections(buffer[:last_heading + 1])
+            buffer = buffer[last_heading + 1:]
+            for section in completed:
+                pending.append(section)
+                if sum(len(p) for p in pending) >= min_section_chars:
+                    submit(pending)
+                    pending = []
+
+        pending.extend(split_markdown_sections(buffer) if buffer.strip() else [])
+        if pending:
+            submit(pending)
+
+        # 各章のStep2出力から該当章を取り出して順に連結
+        # ※ Step1に存在しない章(Step4の新規作成など)は最後のグループの出力から採用
+        draft_report = "".join(draft_parts)
+        all_keys = set(_section_keys(draft_report))
+        reviewed = []
+        for i, future in enumerate(futures):
+            allowed = set(_section_keys("".join(groups[i])))
+            if i == len(futures) - 1:
+                allowed |= {"step" + str(n) for n in range(1, 10)} - all_keys
+            reviewed.append(_pick_reviewed_sections(future.result() or "", allowed))
+        final_report = "\n\n".join(part for part in reviewed if part)
+        logger.info("[Step2] pipelined response length: %d (groups=%d)", len(final_report), len(groups))
+        return draft_report, final_report
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Batch API モード(夜間の一括生成用。対話的な画面からは使用しない)
+# ---------------------------------------------------------------------------
+
+# 状態確認の間隔(秒)・完了期限・1バッチあたりの最大リクエスト数(API上限 50,000)
+OPENAI_BATCH_POLL_INTERVAL = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+OPENAI_BATCH_COMPLETION_WINDOW = os.getenv("OPENAI_BATCH_COMPLETION_WINDOW", "24h")
+OPENAI_BATCH_MAX_REQUESTS = int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000"))
+# 状態確認を打ち切るまでの最大待機時間(秒、0なら無制限)。完了期限を過ぎても終了状態にならない場合の保険
+OPENAI_BATCH_MAX_WAIT = float(os.getenv("OPENAI_BATCH_MAX_WAIT", str(25 * 3600)))
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_batch_request(custom_id: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Batch API入力JSONLの1行分(同期呼び出しと同じモデル・パラメータ)
+    
+    Args:
+        custom_id: 結果との対応付けに使うID
+        messages: リクエストメッセージ
+    
+    Returns:
+        {"custom_id", "method", "url", "body"}
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": OPENAI_MODEL,
+            "messages": messages,
+            "max_completion_tokens": OPENAI_MAX_COMPLETION_TOKENS,
+        },
+    }
+
+
+def _submit_chat_batch(client, requests: Dict[str, List[Dict[str, str]]], tag: str):
+    """JSONLをアップロードしてバッチを作成"""
+    lines = [json.dumps(build_batch_request(cid, messages), ensure_ascii=False) for cid, messages in requests.items()]
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    input_file = scheduled_call(
+        lambda: client.files.create(file=("batch_input.jsonl", payload, "application/jsonl"), purpose="batch"),
+        tag=tag,
+    )
+    batch = scheduled_call(
+        lambda: client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=OPENAI_BATCH_COMPLETION_WINDOW,
+        ),
+        tag=tag,
+    )
+    logger.info("%s batch submitted: id=%s, requests=%d, bytes=%d", tag, batch.id, len(requests), len(payload))
+    return batch
+
+
+def _wait_for_batch(client, batch_id: str, tag: str, poll_interval: float, max_wait: float = 0):
+    """
+    バッチが終了状態(completed/failed/expired/cancelled)になるまで待機
+
+    max_wait(秒)を過ぎても終了しない場合は、その時点の状態のバッチを返す(0なら無制限に待つ)
+    """
+    deadline = time.monotonic() + max_wait if max_wait > 0 else None
+    while True:
+        batch = scheduled_call(lambda: client.batches.retrieve(batch_id), tag=tag)
+        if batch.status in BATCH_TERMINAL_STATUSES:
+            logger.info("%s batch %s: status=%s", tag, batch_id, batch.status)
+            return batch
+        if deadline is not None and time.monotonic() + poll_interval > deadline:
+            logger.warning("%s batch %s: gave up waiting after %.0fs (status=%s)", tag, batch_id, max_wait, batch.status)
+            return batch
+        counts = getattr(batch, "request_counts", None)
+        logger.info(
+            "%s batch %s: status=%s (%s/%s)", tag, batch_id, batch.status,
+            getattr(counts, "completed", "?"), getattr(counts, "total", "?")
+        )
+        time.sleep(poll_interval)
+
+
+def _read_batch_results(client, batch, tag: str) -> Dict[str, Dict[str, Optional[str]]]:
+    """出力ファイル・エラーファイルを読み、custom_idごとの {"content", "error"(, "finish_reason")} に変換"""
+    results: Dict[str, Dict[str, Optional[str]]] = {}
+    for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+        if not file_id:
+            continue
+        text = scheduled_call(lambda: client.files.content(file_id), tag=tag).text
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            body = response.get("body") or {}
+            if row.get("error"):
+                error = row["error"].get("message") or str(row["error"])
+                results[row["custom_id"]] = {"content": None, "error": error}
+            elif response.get("status_code") != 200:
+                error = (body.get("error") or {}).get("message") or "status " + str(response.get("status_code"))
+                results[row["custom_id"]] = {"content": None, "error": error}
+            else:
+                choice = body["choices"][0]
+                results[row["custom_id"]] = {
+                    "content": choice["message"]["content"],
+                    "error": None,
+                    "finish_reason": choice.get("finish_reason"),
+                }
+    return results
+
+
+def run_chat_batch(
+    requests: Dict[str, List[Dict[str, str]]],
+    prompt_template: str,
+    tag: str,
+    poll_interval: Optional[float] = None,
+    use_cache: bool = True,
+) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    複数のチャットリクエストをBatch APIで実行(生成結果キャッシュにあるものは送信しない)
+    
+    Args:
+        requests: {custom_id: メッセージリスト}
+        prompt_template: キャッシュキー用のプロンプト(変更禁止)
+        tag: ログ用の識別子(例: "[Step1 Batch]")
+        poll_interval: 状態確認の間隔(秒、省略時は OPENAI_BATCH_POLL_INTERVAL)
+        use_cache: 生成結果キャッシュを使うか
+    
+    Returns:
+        {custom_id: {"content": 生成テキスト or None, "error": エラー内容 or None}}(requests と同じ順)
+        ※ OPENAI_BATCH_MAX_WAIT 秒以内に終了しなかったバッチのリクエストはエラー扱い
+    """
+    with span("llm.batch", tag=tag, requests=len(requests)) as s:
+        results = _run_chat_batch(requests, prompt_template, tag, poll_interval, use_cache)
+        s.set(errors=sum(1 for r in results.values() if r["error"]))
+        return results
+
+
+def _run_chat_batch(
+    requests: Dict[str, List[Dict[str, str]]],
+    prompt_template: str,
+    tag: str,
+    poll_interval: Optional[float],
+    use_cache: bool,
+) -> Dict[str, Dict[str, Optional[str]]]:
+    poll_interval = OPENAI_BATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    results: Dict[str, Dict[str, Optional[str]]] = {}
+    cache_keys: Dict[str, Optional[str]] = {}
+    pending: Dict[str, List[Dict[str, str]]] = {}
+    for custom_id, messages in requests.items():
+        cache_key = _completion_cache_key(messages, prompt_template, use_cache)
+        cached = _completion_cache().get("chat", cache_key) if cache_key else None
+        if cached is not None:
+            results[custom_id] = {"content": cached, "error": None}
+        else:
+            cache_keys[custom_id] = cache_key
+            pending[custom_id] = messages
+    logger.info("%s cache hits: %d, to submit: %d", tag, len(results), len(pending))
+    if not pending:
+        return results
+
+    client = get_openai_client()
+    ids = list(pending)
+    # 上限件数ごとに分割して全て投入してから待機(バッチ同士は並行して処理される)
+    chunks = [ids[i:i + OPENAI_BATCH_MAX_REQUESTS] for i in range(0, len(ids), OPENAI_BATCH_MAX_REQUESTS)]
+    batches = [(chunk, _submit_chat_batch(client, {cid: pending[cid] for cid in chunk}, tag)) for chunk in chunks]
+    for chunk, batch in batches:
+        finished = _wait_for_batch(client, batch.id, tag, poll_interval, OPENAI_BATCH_MAX_WAIT)
+        if finished.status not in BATCH_TERMINAL_STATUSES:
+            # 未完了のバッチには出力ファイルがない(バッチIDはログから確認できる)
+            error = "バッチが時間内に完了しませんでした(status=" + str(finished.status) + ", batch=" + batch.id + ")"
+            results.update({cid: {"content": None, "error": error} for cid in chunk})
+            continue
+        # 期限切れ・キャンセル時も処理済み分は出力ファイルに含まれる
+        results.update(_read_batch_results(client, finished, tag))
+
+    for custom_id in ids:
+        result = results.setdefault(custom_id, {"content": None, "error": "バッチ結果に含まれていません"})
+        finish_reason = result.pop("finish_reason", None)
+        if result["content"] and cache_keys[custom_id]:
+            _cache_completion(cache_keys[custom_id], result["content"], finish_reason, tag)
+    # キャッシュヒット・出力ファイルの順ではなく、入力の順で返す
+    return {custom_id: results[custom_id] for custom_id in requests}
+
+
+def generate_reports_batch(
+    items: List[Dict[str, Any]],
+    prompt_step1: str,
+    prompt_step2: str,
+    poll_interval: Optional[float] = None,
+    min_draft_chars: int = 300,
+) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Step1をまとめてBatch APIで生成し、その出力からStep2のバッチを続けて実行
+    
+    【重要】prompt_templateの内容は一切変更しない(メッセージは同期版と同じ組み立て)
+    
+    Args:
+        items: [{"id", "company_name", "job_info", "financials", "market_data"}, ...]
+        prompt_step1: Step1プロンプト(変更禁止)
+        prompt_step2: Step2プロンプト(変更禁止)
+        poll_interval: 状態確認の間隔(秒)
+        min_draft_chars: これより短いStep1出力はStep2へ送らない
+    
+    Returns:
+        {id: {"draft_report", "final_report", "error"}}(items と同じ順)
+    """
+    step1_requests = {
+        item["id"]: build_step1_messages(
+            item["company_name"], item["job_info"], item["financials"], item["market_data"], prompt_step1
+        )
+        for item in items
+    }
+    step1 = run_chat_batch(step1_requests, prompt_step1, "[Step1 Batch]", poll_interval)
+
+    reports: Dict[str, Dict[str, Optional[str]]] = {}
+    step2_requests: Dict[str, List[Dict[str, str]]] = {}
+    for custom_id, result in step1.items():
+        draft = result["content"] or ""
+        reports[custom_id] = {"draft_report": draft, "final_report": None, "error": result["error"]}
+        if result["error"]:
+            continue
+        if len(draft) < min_draft_chars:
+            reports[custom_id]["error"] = "Step1の出力が想定より短い/空です(" + str(len(draft)) + "文字)"
+            continue
+        step2_requests[custom_id] = build_step2_messages(draft, prompt_step2)
+
+    if step2_requests:
+        step2 = run_chat_batch(step2_requests, prompt_step2, "[Step2 Batch]", poll_interval)
+        for custom_id, result in step2.items():
+            reports[custom_id]["final_report"] = result["content"]
+            reports[custom_id]["error"] = result["error"]
+    return reports
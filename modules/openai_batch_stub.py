@@ -0,0 +1,256 @@
+"""
+OpenAI Batch API のローカル代替サーバー(動作確認・テスト用)
+
+- /v1/files (アップロード)・/v1/files/{id}/content・/v1/batches・/v1/batches/{id} のみ実装
+- バッチは状態確認のたびに validating → in_progress → completed と進み、完了時に出力ファイルを作成
+- 応答本文は responder(メッセージ → 文字列)で差し替え可能。既定はStep2へ進める長さのダミーMarkdown
+- 実際のAPIキー・課金なしで Batch API モード(openai_api.run_chat_batch)を通しで確認できる
+
+使い方:
+    python -m modules.openai_batch_stub --port 8787
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=dummy \
+        OPENAI_BATCH_POLL_INTERVAL=1 python -m modules.batch jobs.csv --openai-batch
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+
+def default_responder(messages: List[Dict[str, str]]) -> str:
+    """入力の先頭を含むダミーのMarkdownレポート(Step1の最低文字数ガードを通過する長さ)"""
+    user_text = messages[-1]["content"] if messages else ""
+    body = "スタブ応答です。入力冒頭: " + user_text[:80].replace("\n", " ")
+    return "\n\n".join("## Step" + str(n) + "\n\n" + body for n in range(1, 5)) + "\n"
+
+
+class BatchStubState:
+    """アップロード済みファイルとバッチの状態(スレッドセーフ)"""
+
+    def __init__(self, responder: Callable[[List[Dict[str, str]]], str]):
+        self.responder = responder
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, filename: str, content: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = "file-" + uuid.uuid4().hex[:24]
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = {"meta": meta, "content": content}
+        return meta
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        batch = {
+            "id": "batch_" + uuid.uuid4().hex[:24],
+            "object": "batch",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def advance(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """状態確認ごとに1段階進める(in_progress の次の確認で全件処理して completed)"""
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                self._process(batch)
+            return dict(batch)
+
+    def _process(self, batch: Dict[str, Any]) -> None:
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        outputs, errors = [], []
+        for line in lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            try:
+                content = self.responder(request["body"]["messages"])
+                outputs.append({
+                    "id": "batch_req_" + uuid.uuid4().hex[:16],
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "request_id": uuid.uuid4().hex,
+                        "body": {
+                            "id": "chatcmpl-" + uuid.uuid4().hex[:16],
+                            "object": "chat.completion",
+                            "model": request["body"].get("model"),
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }],
+                        },
+                    },
+                    "error": None,
+                })
+            except Exception as e:
+                errors.append({
+                    "id": "batch_req_" + uuid.uuid4().hex[:16],
+                    "custom_id": request.get("custom_id"),
+                    "response": None,
+                    "error": {"code": "stub_error", "message": str(e)},
+                })
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        for key, rows in (("output_file_id", outputs), ("error_file_id", errors)):
+            if rows:
+                payload = ("\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n").encode("utf-8")
+                file_id = "file-" + uuid.uuid4().hex[:24]
+                self.files[file_id] = {
+                    "meta": {
+                        "id": file_id, "object": "file", "bytes": len(payload), "created_at": int(time.time()),
+                        "filename": key + ".jsonl", "purpose": "batch_output", "status": "processed",
+                    },
+                    "content": payload,
+                }
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "OpenAIBatchStub/1.0"
+
+    @property
+    def state(self) -> BatchStubState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        # 標準エラーへのアクセスログは出さない
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self) -> None:
+        self._send_json(404, {"error": {"message": "not found: " + self.path, "type": "invalid_request_error"}})
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/files":
+            # multipart/form-data (file, purpose) を email パーサーで分解
+            raw = b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + self._read_body()
+            message = BytesParser(policy=HTTP).parsebytes(raw)
+            fields: Dict[str, Any] = {}
+            filename = "upload.jsonl"
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    filename = part.get_filename()
+                fields[name] = part.get_payload(decode=True)
+            if "file" not in fields:
+                self._send_json(400, {"error": {"message": "file is required", "type": "invalid_request_error"}})
+                return
+            purpose = (fields.get("purpose") or b"batch").decode("utf-8")
+            self._send_json(200, self.state.add_file(filename, fields["file"], purpose))
+        elif path == "/v1/batches":
+            params = json.loads(self._read_body() or b"{}")
+            if params.get("input_file_id") not in self.state.files:
+                self._send_json(400, {"error": {"message": "unknown input_file_id", "type": "invalid_request_error"}})
+                return
+            self._send_json(200, self.state.create_batch(
+                params["input_file_id"], params.get("endpoint", "/v1/chat/completions"), params.get("completion_window", "24h")
+            ))
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 3 and parts[:2] == ["v1", "batches"]:
+            batch = self.state.advance(parts[2])
+            if batch is None:
+                self._not_found()
+            else:
+                self._send_json(200, batch)
+        elif len(parts) == 4 and parts[:2] == ["v1", "files"] and parts[3] == "content":
+            entry = self.state.files.get(parts[2])
+            if entry is None:
+                self._not_found()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(entry["content"])))
+            self.end_headers()
+            self.wfile.write(entry["content"])
+        elif len(parts) == 3 and parts[:2] == ["v1", "files"]:
+            entry = self.state.files.get(parts[2])
+            if entry is None:
+                self._not_found()
+            else:
+                self._send_json(200, entry["meta"])
+        else:
+            self._not_found()
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    responder: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+) -> ThreadingHTTPServer:
+    """
+    代替サーバーをバックグラウンドスレッドで起動
+
+    Args:
+        host: 待ち受けアドレス
+        port: ポート(0なら空きポートを自動割り当て)
+        responder: メッセージリストから応答本文を作る関数
+
+    Returns:
+        サーバー(base_url は "http://{host}:{server.server_port}/v1"、終了は shutdown())
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.state = BatchStubState(responder or default_responder)
+    threading.Thread(target=server.serve_forever, name="openai-batch-stub", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OpenAI Batch API のローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args(argv)
+    server = start_stub_server(args.host, args.port)
+    print("OpenAI Batch stub: http://" + args.host + ":" + str(server.server_port) + "/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
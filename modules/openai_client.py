@@ -0,0 +1,60 @@
+"""
+OpenAIクライアントの共有ファクトリ
+
+- (APIキー, base_url) ごとにクライアントを1つだけ生成し、プロセス内の全モジュールで再利用
+- HTTPコネクションプール(keep-alive)を共有し、呼び出しごとのTCP/TLSハンドシェイクを省略
+- `REPLAY_MODE=record/replay` では応答の記録・再生用ラッパーを返す(modules/replay.py)
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import DefaultHttpxClient, OpenAI
+
+from . import replay
+
+# コネクションプール設定(同時利用ユーザー数に応じて環境変数で調整)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+# 16000トークン生成を考慮した読み取りタイムアウト(秒)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+
+_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAI:
+    """
+    共有OpenAIクライアントを取得(スレッドセーフ)
+
+    Args:
+        api_key: APIキー(省略時は環境変数 OPENAI_API_KEY)
+        base_url: APIエンドポイント(省略時は環境変数 OPENAI_BASE_URL、未設定なら公式API)
+
+    Returns:
+        OpenAIクライアント
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEYが未設定です。環境変数を設定してください。")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10.0),
+            )
+            # 再試行は llm_scheduler 側で一元管理するためSDKの自動再試行は無効化
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _clients[key] = client
+    # REPLAY_MODE 指定時は応答の記録・再生を挟む
+    return replay.wrap_openai_client(client)
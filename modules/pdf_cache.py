@@ -0,0 +1,189 @@
+"""
+IR資料PDFのローカルキャッシュ
+
+- URL → PDF本体(sha256)の対応とETag/Last-Modifiedを保持し、再ダウンロード時は条件付きGETで再検証
+- PDF本体は内容ハッシュ名のファイルとして保存(合計サイズ上限を超えたら最終アクセス順に削除)
+- 保存・読み出しはファイルオブジェクト単位で行い、PDF全体をメモリに載せない
+- ページ単位の抽出テキストは内容ハッシュをキーに別途保存(同一PDFの再パースを省略)
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+
+from .cache_store import CACHE_DIR, get_cache, make_cache_key
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdf")
+# PDF本体の合計サイズ上限(バイト)
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# この秒数以内に取得・再検証したURLはネットワークアクセスせずキャッシュを返す
+PDF_CACHE_FRESH_SECONDS = int(os.getenv("PDF_CACHE_FRESH_SECONDS", str(24 * 3600)))
+# 抽出テキストキャッシュの合計サイズ上限(バイト)
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+_evict_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """`PDF_CACHE_DISABLE=1` でキャッシュ無効"""
+    return os.getenv("PDF_CACHE_DISABLE") != "1"
+
+
+def content_hash(content: Union[bytes, BinaryIO]) -> str:
+    """
+    PDF本体の内容ハッシュ(sha256)
+    ※ ファイルオブジェクトの場合は分割読み込みで計算し、読み込み位置を先頭に戻す
+    """
+    if isinstance(content, (bytes, bytearray)):
+        return hashlib.sha256(content).hexdigest()
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(1024 * 1024), b""):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def _blob_path(sha256: str) -> str:
+    return os.path.join(PDF_CACHE_DIR, sha256 + ".pdf")
+
+
+def lookup_url(url: str) -> Optional[Dict[str, Any]]:
+    """
+    URLに対応するキャッシュ情報を取得
+
+    Returns:
+        {"sha256", "etag", "last_modified", "checked_at"} or None(未登録・本体削除済み)
+    """
+    if not is_enabled():
+        return None
+    entry = get_cache("pdf_url").get("url", make_cache_key(url))
+    if entry and os.path.isfile(_blob_path(entry["sha256"])):
+        return entry
+    return None
+
+
+def is_fresh(entry: Dict[str, Any]) -> bool:
+    """再検証不要な期間内かどうか"""
+    return time.time() - entry.get("checked_at", 0) < PDF_CACHE_FRESH_SECONDS
+
+
+def open_blob(sha256: str) -> Optional[BinaryIO]:
+    """PDF本体をバイナリ読み込みで開く(最終アクセス時刻を更新)"""
+    path = _blob_path(sha256)
+    try:
+        f = open(path, "rb")
+        os.utime(path, None)
+        return f
+    except OSError:
+        return None
+
+
+def store_stream(url: str, stream: BinaryIO, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[str]:
+    """
+    PDF本体(ファイルオブジェクト)を保存し、URLとの対応を登録
+    ※ 全体をメモリに載せずに分割コピーする。処理後は読み込み位置を先頭に戻す
+
+    Args:
+        url: PDF URL
+        stream: PDFのファイルオブジェクト(seek可能)
+        etag: レスポンスのETag
+        last_modified: レスポンスのLast-Modified
+
+    Returns:
+        内容ハッシュ(保存失敗時はNone)
+    """
+    if not is_enabled():
+        return None
+    sha256 = content_hash(stream)
+    path = _blob_path(sha256)
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        if not os.path.isfile(path):
+            tmp_path = path + ".tmp" + str(threading.get_ident())
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+            os.replace(tmp_path, path)
+        stream.seek(0)
+    except OSError as e:
+        # 読み取り専用環境などではキャッシュせず続行
+        logger.warning("[PDF Cache] store failed: %s", str(e)[:100])
+        return None
+
+    get_cache("pdf_url").set("url", make_cache_key(url), {
+        "sha256": sha256,
+        "etag": etag,
+        "last_modified": last_modified,
+        "checked_at": time.time(),
+    })
+    _evict_blobs()
+    return sha256
+
+
+def mark_revalidated(url: str, entry: Dict[str, Any]) -> None:
+    """304 Not Modified 受信時に再検証時刻を更新"""
+    if not is_enabled():
+        return
+    updated = dict(entry)
+    updated["checked_at"] = time.time()
+    get_cache("pdf_url").set("url", make_cache_key(url), updated)
+
+
+def _evict_blobs() -> None:
+    """PDF本体の合計サイズが上限を超えたら最終アクセスが古い順に削除"""
+    with _evict_lock:
+        try:
+            files = []
+            for name in os.listdir(PDF_CACHE_DIR):
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(PDF_CACHE_DIR, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        if total <= PDF_CACHE_MAX_BYTES:
+            return
+        files.sort()
+        removed = 0
+        for _, size, path in files:
+            if total <= PDF_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        logger.info("[PDF Cache] evicted %d files", removed)
+
+
+def get_page_texts(sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    抽出済みページテキストを取得
+
+    Returns:
+        {"page_count": 総ページ数, "pages": [1ページ目のテキスト, ...]} or None
+    """
+    if not is_enabled():
+        return None
+    return get_cache("pdf_text", max_bytes=PDF_TEXT_CACHE_MAX_BYTES).get("pages", sha256)
+
+
+def put_page_texts(sha256: str, page_count: int, pages: List[str]) -> None:
+    """
+    ページテキストを保存(既存より多くのページを抽出済みの場合のみ上書き)
+    """
+    if not is_enabled():
+        return
+    cache = get_cache("pdf_text", max_bytes=PDF_TEXT_CACHE_MAX_BYTES)
+    existing = cache.get("pages", sha256)
+    if existing and len(existing.get("pages", [])) >= len(pages):
+        return
+    cache.set("pages", sha256, {"page_count": page_count, "pages": pages})
@@ -0,0 +1,124 @@
+"""
+分析パイプラインの共通処理(Streamlit UI・バッチ処理で共有)
+
+※ ここではStreamlitの描画を行わない(ワーカースレッドから呼ばれるため)
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from .ir_extractor import get_financials_from_ir, generate_industry_estimation
+from .serp_api import search_market_data, extract_industry_keyword
+from .checkpoint import RunCheckpoint
+from .logger import get_logger
+from .tracing import span
+
+logger = get_logger(__name__)
+
+
+def _timed_call(func, *args):
+    """関数を実行し、(戻り値, 経過秒数) を返す"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def fetch_market_branch(job_info: str) -> Tuple[str, str]:
+    """業界キーワード判定 → 業界データ検索 (Step 0 の業界側ブランチ)"""
+    industry_keyword = extract_industry_keyword(job_info)
+    market_data = search_market_data(industry_keyword)
+    return industry_keyword, market_data
+
+
+def run_step0(
+    company_name: str,
+    job_info: str,
+    fetch_financials: Optional[Callable[[str], Dict[str, str]]] = None,
+    fetch_market: Optional[Callable[[str], Tuple[str, str]]] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+) -> dict:
+    """
+    Step 0: IR検索ブランチと業界データブランチを並列実行し、両方の完了を待つ
+    ※ Streamlitの描画はメインスレッドで行うため、ワーカー内ではUI操作をしない
+    ※ 子会社などで推定値を使う場合のフォールバックもIRブランチ内で行う
+
+    Args:
+        company_name: 会社名
+        job_info: 求人情報
+        fetch_financials: 財務データ取得関数(省略時は get_financials_from_ir、バッチでは共有キャッシュ版)
+        fetch_market: 業界ブランチ関数(省略時は fetch_market_branch)
+        checkpoint: 段階別チェックポイント(保存済みのブランチは実行せず、完了したブランチは保存。
+            財務データに "error" がある場合は保存しない)
+
+    Returns:
+        {
+            "financials": 財務データ,
+            "used_estimation": 業界推定値を使用したか,
+            "industry_keyword": 業界キーワード,
+            "market_data": 業界データ,
+            "ir_elapsed": IRブランチ所要秒数,
+            "market_elapsed": 業界ブランチ所要秒数,
+            "total_elapsed": Step 0 全体の所要秒数
+        }
+    """
+    fetch_financials = fetch_financials or get_financials_from_ir
+    fetch_market = fetch_market or fetch_market_branch
+
+    def ir_branch(name: str) -> Tuple[Dict[str, str], bool]:
+        with span("stage.financials") as s:
+            if checkpoint and checkpoint.has("financials"):
+                s.set(checkpoint=True)
+                return checkpoint.get("financials"), checkpoint.get("used_estimation", False)
+            financials, used_estimation = apply_estimation_fallback(fetch_financials(name), name, job_info)
+            s.set(checkpoint=False, used_estimation=used_estimation, ir_error="error" in financials)
+            # 取得に失敗した結果は保存しない(再実行時にIR検索からやり直すため)
+            if checkpoint and "error" not in financials:
+                checkpoint.save(financials=financials, used_estimation=used_estimation)
+            return financials, used_estimation
+
+    def market_branch(info: str) -> Tuple[str, str]:
+        with span("stage.market") as s:
+            if checkpoint and checkpoint.has("market_data"):
+                s.set(checkpoint=True)
+                return checkpoint.get("industry_keyword"), checkpoint.get("market_data")
+            industry_keyword, market_data = fetch_market(info)
+            s.set(checkpoint=False, industry_keyword=industry_keyword)
+            if checkpoint:
+                checkpoint.save(industry_keyword=industry_keyword, market_data=market_data)
+            return industry_keyword, market_data
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="step0") as pool:
+        # 優先度などのコンテキスト変数をワーカースレッドへ引き継ぐ
+        ir_future = pool.submit(contextvars.copy_context().run, _timed_call, ir_branch, company_name)
+        market_future = pool.submit(contextvars.copy_context().run, _timed_call, market_branch, job_info)
+        (financials, used_estimation), ir_elapsed = ir_future.result()
+        (industry_keyword, market_data), market_elapsed = market_future.result()
+    total_elapsed = time.perf_counter() - started
+
+    logger.info(
+        "[Pipeline] Step0 elapsed: ir=%.1fs, market=%.1fs, total=%.1fs (company=%s)",
+        ir_elapsed, market_elapsed, total_elapsed, company_name
+    )
+    return {
+        "financials": financials,
+        "used_estimation": used_estimation,
+        "industry_keyword": industry_keyword,
+        "market_data": market_data,
+        "ir_elapsed": ir_elapsed,
+        "market_elapsed": market_elapsed,
+        "total_elapsed": total_elapsed,
+    }
+
+
+def apply_estimation_fallback(financials: Dict[str, str], company_name: str, job_info: str) -> Tuple[Dict[str, str], bool]:
+    """
+    子会社などIR資料がない場合(use_estimation)に業界推定値へ置き換える
+
+    Returns:
+        (財務データ, 推定値を使用したか)
+    """
+    if "error" in financials and financials.get("use_estimation"):
+        return generate_industry_estimation(company_name, job_info), True
+    return financials, False
@@ -0,0 +1,204 @@
+"""
+外部サービス応答の記録・再生(オフラインでのベンチマーク・動作確認用)
+
+- `REPLAY_MODE=record`: SerpAPIのJSON・PDF本体・OpenAIの応答を REPLAY_DIR に保存しながら通常どおり実行
+- `REPLAY_MODE=replay`: ネットワークに接続せず REPLAY_DIR の記録から応答を返す(記録がなければ ReplayMissError)
+- 未設定時は何もしない(本番の動作に影響なし)
+- キーはリクエスト内容のハッシュ(SerpAPIはAPIキー除外・空白正規化済みパラメータ、OpenAIはモデル+メッセージ等)
+
+保存形式:
+    REPLAY_DIR/serpapi/<key>.json
+    REPLAY_DIR/pdf/<key>.pdf
+    REPLAY_DIR/openai/<key>.json   ({"content", "usage"})
+"""
+import json
+import os
+import shutil
+import threading
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional
+
+from .cache_store import make_cache_key
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+_write_lock = threading.Lock()
+
+
+class ReplayMissError(RuntimeError):
+    """再生モードで対応する記録が見つからない"""
+
+
+def mode() -> Optional[str]:
+    """現在のモード("record" / "replay" / None)"""
+    value = os.getenv("REPLAY_MODE", "").strip().lower()
+    return value if value in (MODE_RECORD, MODE_REPLAY) else None
+
+
+def replay_dir() -> str:
+    return os.getenv(
+        "REPLAY_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures"),
+    )
+
+
+def _path(kind: str, key: str, ext: str) -> str:
+    return os.path.join(replay_dir(), kind, key + ext)
+
+
+def _write_json(path: str, value: Any) -> None:
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def serpapi_search(params: Dict[str, str], search: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    SerpAPI検索の記録・再生
+
+    Args:
+        params: 正規化済みパラメータ(APIキーを含まない)
+        search: 実際の検索を行う関数
+
+    Returns:
+        SerpAPIのレスポンス(dict)
+    """
+    current = mode()
+    if current is None:
+        return search()
+    path = _path("serpapi", make_cache_key(params), ".json")
+    if current == MODE_REPLAY:
+        if not os.path.exists(path):
+            raise ReplayMissError("SerpAPIの記録がありません: " + json.dumps(params, ensure_ascii=False)[:200])
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    results = search()
+    _write_json(path, results)
+    return results
+
+
+def fetch_pdf(url: str, fetch: Callable[[], BinaryIO]) -> BinaryIO:
+    """
+    PDF取得の記録・再生
+
+    Args:
+        url: PDF URL
+        fetch: 実際に取得してファイルオブジェクトを返す関数
+
+    Returns:
+        PDFのファイルオブジェクト(先頭に位置付け済み)
+    """
+    current = mode()
+    if current is None:
+        return fetch()
+    path = _path("pdf", make_cache_key(url), ".pdf")
+    if current == MODE_REPLAY:
+        if not os.path.exists(path):
+            raise ReplayMissError("PDFの記録がありません: " + url[:200])
+        return open(path, "rb")
+    pdf_file = fetch()
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(pdf_file, f, 1024 * 1024)
+    pdf_file.seek(0)
+    return pdf_file
+
+
+def _openai_key(kwargs: Dict[str, Any]) -> str:
+    body = {k: v for k, v in kwargs.items() if k not in ("stream", "stream_options", "timeout")}
+    return make_cache_key(body)
+
+
+def _completion(content: str, usage: Optional[Dict[str, int]]) -> SimpleNamespace:
+    """記録から chat.completions.create の戻り値と同じ属性構造のオブジェクトを作成"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+        usage=SimpleNamespace(**usage) if usage else None,
+    )
+
+
+def _stream_chunks(content: str, usage: Optional[Dict[str, int]], chunk_size: int = 64) -> Iterator[SimpleNamespace]:
+    """記録からストリーミング応答のチャンク列を作成(最後にusageのみのチャンク)"""
+    for i in range(0, len(content), chunk_size):
+        delta = SimpleNamespace(content=content[i:i + chunk_size])
+        yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)], usage=None)
+    yield SimpleNamespace(choices=[], usage=SimpleNamespace(**usage) if usage else None)
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    return {
+        field: getattr(usage, field)
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens")
+        if isinstance(getattr(usage, field, None), int)
+    }
+
+
+class _ReplayCompletions:
+    def __init__(self, completions: Any):
+        self._completions = completions
+
+    def create(self, **kwargs: Any) -> Any:
+        path = _path("openai", _openai_key(kwargs), ".json")
+        stream = bool(kwargs.get("stream"))
+        if mode() == MODE_REPLAY:
+            if not os.path.exists(path):
+                raise ReplayMissError("OpenAIの記録がありません(model=" + str(kwargs.get("model")) + ")")
+            with open(path, "r", encoding="utf-8") as f:
+                recorded = json.load(f)
+        else:
+            response = self._completions.create(**kwargs)
+            if stream:
+                parts, usage = [], None
+                for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                recorded = {"content": "".join(parts), "usage": _usage_dict(usage)}
+            else:
+                recorded = {"content": response.choices[0].message.content, "usage": _usage_dict(response.usage)}
+            _write_json(path, recorded)
+            if not stream:
+                return response
+        if stream:
+            return _stream_chunks(recorded["content"] or "", recorded["usage"])
+        return _completion(recorded["content"], recorded["usage"])
+
+
+class ReplayOpenAIClient:
+    """chat.completions.create のみ記録・再生するクライアントのラッパー(他の属性は元のクライアントへ委譲)"""
+
+    def __init__(self, client: Any):
+        self._client = client
+        self.chat = SimpleNamespace(completions=_ReplayCompletions(client.chat.completions))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def wrap_openai_client(client: Any) -> Any:
+    """記録・再生モードならOpenAIクライアントをラップ(未設定時はそのまま返す)"""
+    return ReplayOpenAIClient(client) if mode() else client
+
+
+def load_pdf_fixtures() -> Dict[str, bytes]:
+    """記録済みPDFをすべて読み込む(ベンチマーク用)"""
+    pdf_dir = os.path.join(replay_dir(), "pdf")
+    fixtures: Dict[str, bytes] = {}
+    if not os.path.isdir(pdf_dir):
+        return fixtures
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.endswith(".pdf"):
+            with open(os.path.join(pdf_dir, name), "rb") as f:
+                fixtures[name] = f.read()
+    return fixtures
@@ -0,0 +1,264 @@
+"""
+完了したレポートの保存と検索
+
+- 完了した分析を1件1行でSQLiteに保存(会社名・業界キーワード・主要財務項目・所要時間・トークン数・モデル)
+- レポート本文はFTS5(trigram)で全文検索できる。分かち書きのない日本語も3文字以上の語で部分一致検索し、
+  2文字以下の語はLIKEで検索する(FTS5が使えないSQLiteでは全てLIKE)
+- 同じ会社名・求人情報の過去の分析を取り出して再利用できる(画面・バッチから共通で利用)
+- `REPORT_STORE_DISABLE=1` で保存しない。DBを作成できない環境ではメモリ上のDBで動作する
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from .cache_store import CACHE_DIR
+from .checkpoint import make_run_id
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH", os.path.join(CACHE_DIR, "reports.sqlite3"))
+
+# 列として保存する財務項目(値は抽出結果の文字列のまま)
+FINANCIAL_COLUMNS = {
+    "revenue": "売上高",
+    "operating_margin": "営業利益率",
+    "equity_ratio": "自己資本比率",
+    "roe": "ROE",
+}
+
+# 一覧・検索で返す列(本文・求人情報は含めない)
+_SUMMARY_COLUMNS = (
+    "id", "company_name", "industry_keyword", "revenue", "operating_margin", "equity_ratio", "roe",
+    "used_estimation", "model", "step0_seconds", "elapsed_seconds", "prompt_tokens", "completion_tokens", "created_at",
+)
+_JSON_COLUMNS = {"financials", "trace"}
+# trigram で検索できる最短の語
+_FTS_MIN_CHARS = 3
+
+
+def _token_totals(trace: Optional[List[Dict[str, Any]]]) -> Dict[str, int]:
+    """区間別集計(RunTrace.summary)からLLMのトークン数を合計"""
+    rows = [row for row in trace or [] if str(row.get("区間", "")).startswith("llm.")]
+    return {
+        "prompt_tokens": sum(row.get("入力トークン", 0) for row in rows),
+        "completion_tokens": sum(row.get("出力トークン", 0) for row in rows),
+    }
+
+
+class ReportStore:
+    """レポート表(SQLite + FTS5)の読み書き(スレッドセーフ)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            # 読み取り専用環境ではプロセス内のみで保持(再起動で消える)
+            logger.warning("[Reports] using in-memory store (%s): %s", path, str(e)[:100])
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT NOT NULL UNIQUE,"
+            " run_id TEXT NOT NULL,"
+            " company_name TEXT NOT NULL,"
+            " job_info TEXT NOT NULL,"
+            " industry_keyword TEXT,"
+            " revenue TEXT,"
+            " operating_margin TEXT,"
+            " equity_ratio TEXT,"
+            " roe TEXT,"
+            " used_estimation INTEGER NOT NULL DEFAULT 0,"
+            " financials TEXT,"
+            " model TEXT,"
+            " step0_seconds REAL,"
+            " elapsed_seconds REAL,"
+            " prompt_tokens INTEGER,"
+            " completion_tokens INTEGER,"
+            " trace TEXT,"
+            " final_report TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_run ON reports(run_id, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_company ON reports(company_name, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created ON reports(created_at)")
+        try:
+            # 本文は reports 表のみに保持し、索引だけを作成(external content)
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+                " company_name, industry_keyword, final_report,"
+                " content='reports', content_rowid='seq', tokenize='trigram')"
+            )
+            self.fts_enabled = True
+        except sqlite3.Error as e:
+            logger.warning("[Reports] FTS5 unavailable, using LIKE search: %s", str(e)[:100])
+            self.fts_enabled = False
+        self._conn.commit()
+
+    def save(
+        self,
+        company_name: str,
+        job_info: str,
+        final_report: str,
+        step0: Optional[Dict[str, Any]] = None,
+        trace: Optional[List[Dict[str, Any]]] = None,
+        elapsed: Optional[float] = None,
+        model: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        完了したレポートを保存
+
+        Args:
+            company_name: 会社名
+            job_info: 求人情報
+            final_report: 完全版レポート
+            step0: run_step0 の結果(財務データ・業界キーワード・所要時間)
+            trace: 区間別集計(RunTrace.summary)
+            elapsed: 分析全体の所要時間(秒)
+            model: 生成に使用したモデル
+
+        Returns:
+            レポートID(保存しなかった・失敗した場合はNone)
+        """
+        if os.getenv("REPORT_STORE_DISABLE") == "1" or not final_report:
+            return None
+        step0 = step0 or {}
+        financials = step0.get("financials") or {}
+        report_id = uuid.uuid4().hex
+        row = {
+            "id": report_id,
+            "run_id": make_run_id(company_name, job_info),
+            "company_name": company_name,
+            "job_info": job_info,
+            "industry_keyword": step0.get("industry_keyword"),
+            "used_estimation": 1 if step0.get("used_estimation") else 0,
+            "financials": json.dumps(financials, ensure_ascii=False),
+            "model": model,
+            "step0_seconds": step0.get("total_elapsed"),
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "trace": json.dumps(trace, ensure_ascii=False) if trace is not None else None,
+            "final_report": final_report,
+            "created_at": time.time(),
+        }
+        for column, key in FINANCIAL_COLUMNS.items():
+            value = financials.get(key) if isinstance(financials, dict) else None
+            row[column] = str(value) if value is not None else None
+        row.update(_token_totals(trace))
+        try:
+            with self._lock:
+                cur = self._conn.execute(
+                    "INSERT INTO reports (" + ", ".join(row) + ") VALUES (" + ", ".join("?" * len(row)) + ")",
+                    list(row.values()),
+                )
+                if self.fts_enabled:
+                    self._conn.execute(
+                        "INSERT INTO reports_fts (rowid, company_name, industry_keyword, final_report) VALUES (?, ?, ?, ?)",
+                        (cur.lastrowid, company_name, row["industry_keyword"] or "", final_report),
+                    )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # 保存の失敗で分析結果の表示を止めない
+            logger.warning("[Reports] save failed (company=%s): %s", company_name, str(e)[:200])
+            return None
+        logger.info("[Reports] saved: id=%s company=%s", report_id, company_name)
+        return report_id
+
+    def _row_to_report(self, columns: List[str], row) -> Dict[str, Any]:
+        report = dict(zip(columns, row))
+        for column in _JSON_COLUMNS & set(report):
+            if report[column]:
+                report[column] = json.loads(report[column])
+        if "used_estimation" in report:
+            report["used_estimation"] = bool(report["used_estimation"])
+        return report
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """レポート1件(本文・求人情報を含む)を取得(存在しなければNone)"""
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM reports WHERE id = ?", (report_id,))
+            row = cur.fetchone()
+            columns = [d[0] for d in cur.description]
+        return self._row_to_report(columns, row) if row else None
+
+    def find_latest(self, company_name: str, job_info: str) -> Optional[Dict[str, Any]]:
+        """同じ会社名・求人情報で最後に保存したレポート(なければNone)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM reports WHERE run_id = ? ORDER BY created_at DESC LIMIT 1",
+                (make_run_id(company_name, job_info),),
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def search(self, query: str = "", limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        レポートを検索(空白区切りの語をすべて含むもの。会社名・業界キーワード・本文が対象)
+
+        Args:
+            query: 検索語(空なら新しい順)
+            limit: 最大件数
+
+        Returns:
+            一覧用の列 + "snippet"(該当箇所の抜粋。FTS5で検索した場合のみ)のリスト
+        """
+        terms = [t for t in query.split() if t]
+        fts_terms = [t for t in terms if self.fts_enabled and len(t) >= _FTS_MIN_CHARS]
+        like_terms = [t for t in terms if t not in fts_terms]
+
+        select = ", ".join("r." + c for c in _SUMMARY_COLUMNS)
+        params: List[Any] = []
+        if fts_terms:
+            sql = (
+                "SELECT " + select + ", snippet(reports_fts, 2, '[', ']', '…', 12)"
+                " FROM reports_fts JOIN reports r ON r.seq = reports_fts.rowid WHERE reports_fts MATCH ?"
+            )
+            # 各語をフレーズとして AND 検索
+            params.append(" AND ".join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+        else:
+            sql = "SELECT " + select + ", NULL FROM reports r WHERE 1 = 1"
+        for term in like_terms:
+            sql += " AND (r.company_name LIKE ? ESCAPE '\\' OR r.industry_keyword LIKE ? ESCAPE '\\' OR r.final_report LIKE ? ESCAPE '\\')"
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern] * 3)
+        sql += (" ORDER BY bm25(reports_fts)" if fts_terms else " ORDER BY r.created_at DESC") + " LIMIT ?"
+        params.append(limit)
+
+        columns = list(_SUMMARY_COLUMNS) + ["snippet"]
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("[Reports] search failed (%s): %s", query[:50], str(e)[:200])
+            return []
+        return [self._row_to_report(columns, row) for row in rows]
+
+    def iter_reports(self, report_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """指定IDのレポートを1件ずつ読み込む(ZIP一括エクスポート用)"""
+        for report_id in report_ids:
+            report = self.get(report_id)
+            if report:
+                yield report
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+
+_store: Optional[ReportStore] = None
+_store_lock = threading.Lock()
+
+
+def get_report_store() -> ReportStore:
+    """プロセス共有のレポートストアを取得"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ReportStore(REPORT_STORE_PATH)
+        return _store
@@ -5,16 +5,87 @@
  - 業界データ検索結果の空判定改善
  - IR PDF検索: クエリを増強し多段試行 + 拡張フィルタ
  - デバッグ用環境変数 `DEBUG_SERPAPI=1` で内部状態簡易出力
+ - IR PDF検索: ウェーブ単位の並列発行 + 高スコア候補発見時の早期打ち切り
+ - 検索結果をSQLiteに永続キャッシュ(クエリ種別ごとのTTL, `SERPAPI_CACHE_DISABLE=1` で無効化)
 """
+import contextvars
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, List, Dict, Any
 
+from . import replay
+from .cache_store import get_cache, make_cache_key
+from .tracing import span
+
+
+# クエリ種別ごとのキャッシュ有効期間(秒)
+SERPAPI_CACHE_TTL = {
+    "market": int(os.getenv("SERPAPI_CACHE_TTL_MARKET", str(7 * 24 * 3600))),
+    "ir_pdf": int(os.getenv("SERPAPI_CACHE_TTL_IR_PDF", str(3 * 24 * 3600))),
+    "general": int(os.getenv("SERPAPI_CACHE_TTL_GENERAL", str(24 * 3600))),
+}
+SERPAPI_CACHE_MAX_ENTRIES = int(os.getenv("SERPAPI_CACHE_MAX_ENTRIES", "20000"))
+
+# IR PDF検索の同時実行数と、早期打ち切りするスコアのしきい値(社名一致10 + IRキーワード5)
+# 2以上にすると最優先クエリで見つからなかった場合に最大その件数を同時に発行する。
+# 発行済みのクエリは結果を使わなくてもSerpAPIの検索回数として課金されるため、既定は逐次(1)
+SERPAPI_IR_CONCURRENCY = int(os.getenv("SERPAPI_IR_CONCURRENCY", "1"))
+SERPAPI_IR_CONFIDENCE = int(os.getenv("SERPAPI_IR_CONFIDENCE", "15"))
+
 
 def _debug(msg: str):
     # 常にログ出力(Streamlitログで確認可能)
     print("[SerpAPI DEBUG] " + str(msg))
 
 
+def _normalize_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """キャッシュキー用にパラメータを正規化(APIキー除外・空白統一)"""
+    normalized = {}
+    for k, v in params.items():
+        if k == "api_key":
+            continue
+        normalized[k] = " ".join(str(v).split())
+    return normalized
+
+
+def _search(search_cls, params: Dict[str, Any]) -> Dict[str, Any]:
+    """SerpAPI検索を実行(REPLAY_MODE 指定時は記録・再生)"""
+    return replay.serpapi_search(_normalize_params(params), lambda: search_cls(params).get_dict())
+
+
+def _cached_search(search_cls, params: Dict[str, Any], family: str) -> Dict[str, Any]:
+    """
+    SerpAPI検索(キャッシュ経由)
+
+    Args:
+        search_cls: GoogleSearchクラス
+        params: 検索パラメータ
+        family: クエリ種別("market" / "ir_pdf" / "general") ※TTLと集計の単位
+
+    Returns:
+        SerpAPIのレスポンス(dict)
+    """
+    with span("serpapi.search", family=family, q=str(params.get("q", ""))[:100]) as s:
+        if os.getenv("SERPAPI_CACHE_DISABLE") == "1":
+            return _search(search_cls, params)
+
+        cache = get_cache("serpapi", max_entries=SERPAPI_CACHE_MAX_ENTRIES)
+        key = make_cache_key(_normalize_params(params))
+        cached = cache.get(family, key)
+        if cached is not None:
+            stats = cache.stats().get(family, {})
+            _debug("cache hit (" + family + ") hits=" + str(stats.get("hits", 0)) + " misses=" + str(stats.get("misses", 0)))
+            s.set(cache_hit=True)
+            return cached
+
+        results = _search(search_cls, params)
+        s.set(cache_hit=False)
+        # エラー応答はキャッシュしない(一時的な失敗を固定化しないため)
+        if isinstance(results, dict) and "error" not in results:
+            cache.set(family, key, results, ttl=SERPAPI_CACHE_TTL.get(family))
+        return results
+
+
 def search_market_data(industry_keyword: str) -> str:
     """業界規模・トレンドデータを検索 (上位有機結果のスニペット集約)"""
     api_key = os.getenv("SERPAPI_KEY")
@@ -48,7 +119,7 @@ def search_market_data(industry_keyword: str) -> str:
         }
         try:
             _debug("market search query='" + str(q) + "'")
-            results = GoogleSearch(params).get_dict()
+            results = _cached_search(GoogleSearch, params, "market")
             _debug("Results keys: " + str(list(results.keys())))
             organic = results.get('organic_results', [])
             _debug("organic_results count: " + str(len(organic)))
@@ -83,8 +154,18 @@ def search_market_data(industry_keyword: str) -> str:
     return "\n\n".join(snippets)
 
 
-def search_ir_pdf_url(company_name: str) -> Optional[str]:
-    """IR関連PDF(決算説明資料/有価証券報告書/統合報告書等)のURLを探索 - 段階的検索強化版"""
+def search_ir_pdf_url(company_name: str, concurrency: Optional[int] = None) -> Optional[str]:
+    """
+    IR関連PDF(決算説明資料/有価証券報告書/統合報告書等)のURLを探索 - 段階的検索強化版
+
+    Args:
+        company_name: 企業名
+        concurrency: 最優先クエリで見つからなかった場合に同時発行するクエリ数
+            (1なら従来通りの逐次検索、Noneなら環境変数 `SERPAPI_IR_CONCURRENCY`。既定は1)
+
+    Returns:
+        PDFのURL or None
+    """
     api_key = os.getenv("SERPAPI_KEY")
     if not api_key:
         _debug("SerpAPI key missing; abort IR pdf search")
@@ -149,54 +230,142 @@ def search_ir_pdf_url(company_name: str) -> Optional[str]:
             _debug("ImportError GoogleSearch: " + error_msg)
             return None
     
+    if concurrency is None:
+        concurrency = SERPAPI_IR_CONCURRENCY
+    if concurrency > 1:
+        return _search_ir_pdf_parallel(GoogleSearch, all_queries, company_name, api_key, is_ir_pdf, concurrency)
+
     # 段階的検索実行
     for i, q in enumerate(all_queries):
-        params = {
-            "q": q,
-            "location": "Japan",
-            "hl": "ja",
-            "gl": "jp",
-            "num": 15,  # 検索結果数を増加
-            "api_key": api_key,
-        }
         try:
-            _debug(f"IR pdf search query {i+1}/{len(all_queries)}='{str(q)}'")
-            results = GoogleSearch(params).get_dict()
+            results = _run_ir_pdf_query(GoogleSearch, q, api_key, i, len(all_queries))
         except Exception as e:
             error_msg = str(e)[:100]
             _debug("IR pdf search error: " + error_msg)
             continue
 
         # 結果を優先度付きで評価
-        pdf_candidates = []
-        for result in results.get("organic_results", []):
-            link = result.get("link", "")
-            title = result.get("title", "")
-            
-            if is_ir_pdf(link):
-                # PDF の関連度スコアリング
-                score = 0
-                if company_name.replace("株式会社", "") in title:
-                    score += 10
-                if any(kw in title.lower() for kw in ["決算", "ir", "investor", "financial"]):
-                    score += 5
-                if "2024" in title or "2023" in title:
-                    score += 3
-                
-                pdf_candidates.append((link, score, title))
-        
+        pdf_candidates = _score_ir_pdf_candidates(results, company_name, is_ir_pdf)
+
         # スコア順にソートして最適なPDFを選択
         if pdf_candidates:
-            pdf_candidates.sort(key=lambda x: x[1], reverse=True)
-            best_pdf = pdf_candidates[0][0]
-            best_title = pdf_candidates[0][2]
-            _debug(f"Found IR PDF (score: {pdf_candidates[0][1]}): {best_title[:50]} -> {str(best_pdf)}")
+            best_pdf, best_score, best_title = pdf_candidates[0]
+            _debug(f"Found IR PDF (score: {best_score}): {best_title[:50]} -> {str(best_pdf)}")
             return best_pdf
 
     _debug("No IR PDF found after enhanced queries")
     return None
 
 
+def _run_ir_pdf_query(search_cls, q: str, api_key: str, index: int, total: int) -> Dict[str, Any]:
+    """IR PDF検索クエリを1件実行"""
+    params = {
+        "q": q,
+        "location": "Japan",
+        "hl": "ja",
+        "gl": "jp",
+        "num": 15,  # 検索結果数を増加
+        "api_key": api_key,
+    }
+    _debug(f"IR pdf search query {index+1}/{total}='{str(q)}'")
+    return _cached_search(search_cls, params, "ir_pdf")
+
+
+def _score_ir_pdf_candidates(results: Dict[str, Any], company_name: str, is_ir_pdf) -> List[tuple]:
+    """
+    検索結果からIR PDF候補を抽出し関連度スコア順に並べる
+
+    Returns:
+        [(link, score, title), ...] (スコア降順)
+    """
+    pdf_candidates = []
+    for result in results.get("organic_results", []):
+        link = result.get("link", "")
+        title = result.get("title", "")
+
+        if is_ir_pdf(link):
+            # PDF の関連度スコアリング
+            score = 0
+            if company_name.replace("株式会社", "") in title:
+                score += 10
+            if any(kw in title.lower() for kw in ["決算", "ir", "investor", "financial"]):
+                score += 5
+            if "2024" in title or "2023" in title:
+                score += 3
+
+            pdf_candidates.append((link, score, title))
+
+    pdf_candidates.sort(key=lambda x: x[1], reverse=True)
+    return pdf_candidates
+
+
+def _search_ir_pdf_parallel(
+    search_cls,
+    all_queries: List[str],
+    company_name: str,
+    api_key: str,
+    is_ir_pdf,
+    concurrency: int,
+) -> Optional[str]:
+    """
+    IR PDF検索の並列版: 最優先のクエリを単独で実行し、見つからなかった場合だけ
+    残りを `concurrency` 件ずつのウェーブで同時発行してウェーブ内の全結果を横断してスコアリングする。
+    (多くの企業は最優先クエリで見つかるため、検索回数は逐次検索と同じ1回で済む)
+    しきい値以上の候補が見つかった時点で結果を返し、以降のウェーブは発行しない。
+    同じウェーブで実行中のクエリは止められず、検索回数として課金される。
+    """
+    if not all_queries:
+        return None
+    try:
+        results = _run_ir_pdf_query(search_cls, all_queries[0], api_key, 0, len(all_queries))
+        pdf_candidates = _score_ir_pdf_candidates(results, company_name, is_ir_pdf)
+        if pdf_candidates:
+            link, score, title = pdf_candidates[0]
+            _debug(f"Found IR PDF (score: {score}): {title[:50]} -> {str(link)}")
+            return link
+    except Exception as e:
+        error_msg = str(e)[:100]
+        _debug("IR pdf search error: " + error_msg)
+
+    best: Optional[tuple] = None
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ir-search")
+    try:
+        for wave_start in range(1, len(all_queries), concurrency):
+            wave = all_queries[wave_start:wave_start + concurrency]
+            futures = [
+                pool.submit(
+                    contextvars.copy_context().run,
+                    _run_ir_pdf_query, search_cls, q, api_key, wave_start + j, len(all_queries)
+                )
+                for j, q in enumerate(wave)
+            ]
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    error_msg = str(e)[:100]
+                    _debug("IR pdf search error: " + error_msg)
+                    continue
+
+                pdf_candidates = _score_ir_pdf_candidates(results, company_name, is_ir_pdf)
+                if pdf_candidates and (best is None or pdf_candidates[0][1] > best[1]):
+                    best = pdf_candidates[0]
+                if best is not None and best[1] >= SERPAPI_IR_CONFIDENCE:
+                    _debug(f"Found IR PDF (score: {best[1]}, early stop): {best[2][:50]} -> {str(best[0])}")
+                    return best[0]
+
+            # ウェーブ内で候補が見つかれば(しきい値未満でも)最良候補を採用
+            if best is not None:
+                _debug(f"Found IR PDF (score: {best[1]}): {best[2][:50]} -> {str(best[0])}")
+                return best[0]
+    finally:
+        # 実行中のリクエストの完了は待たない(結果は破棄)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    _debug("No IR PDF found after enhanced queries")
+    return None
+
+
 def extract_industry_keyword(job_info: str) -> str:
     """
     求人情報から業界キーワードをLLMで判定
@@ -213,8 +382,9 @@ def extract_industry_keyword(job_info: str) -> str:
         return _extract_industry_keyword_fallback(job_info)
     
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
+        from .openai_client import get_openai_client
+        from .llm_scheduler import PRIORITY_BACKGROUND, estimate_tokens, scheduled_call
+        client = get_openai_client(api_key)
         
         prompt = f"""以下の求人情報から、該当する業界を1つだけ選んで業界名のみを回答してください。
 選択肢以外の回答は絶対にしないでください。
@@ -240,11 +410,16 @@ def extract_industry_keyword(job_info: str) -> str:
 
 【回答形式】業界名のみ(例: 自動車産業)"""
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.3
+        response = scheduled_call(
+            lambda: client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=50,
+                temperature=0.3
+            ),
+            priority=PRIORITY_BACKGROUND,
+            est_tokens=estimate_tokens(len(prompt), 50),
+            tag="[Industry]",
         )
         industry = response.choices[0].message.content.strip()
         _debug("LLM industry classification: " + str(industry))
@@ -309,7 +484,7 @@ def search_general_info(query: str) -> str:
     
     try:
         _debug(f"General web search query='{query}'")
-        results = GoogleSearch(params).get_dict()
+        results = _cached_search(GoogleSearch, params, "general")
         organic = results.get("organic_results", [])
         _debug(f"General search results count: {len(organic)}")
         
@@ -0,0 +1,201 @@
+"""
+処理時間・トークン使用量の軽量トレース
+
+- `with span("serpapi.search", family="market") as s:` で区間を計測し、1区間1行のJSONで logs/trace.jsonl に出力
+- 区間は入れ子にでき(parent_id)、`trace_run()` 内の区間は実行単位で集計できる(画面の処理時間内訳に使用)
+- コンテキスト変数で現在の実行・区間を保持するため、ワーカースレッドへは contextvars.copy_context() で引き継ぐ
+- `TRACE_DISABLE=1` でJSON出力を無効化(集計は継続)。出力先は `TRACE_LOG_PATH` で変更可能
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "logs/trace.jsonl")
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("trace_run", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+_trace_logger: Optional[logging.Logger] = None
+_trace_logger_lock = threading.Lock()
+
+
+def _get_trace_logger() -> logging.Logger:
+    """JSON行出力用のロガー(メッセージのみ、コンソールには出さない)"""
+    global _trace_logger
+    with _trace_logger_lock:
+        if _trace_logger is None:
+            trace_logger = logging.getLogger("trace")
+            trace_logger.setLevel(logging.INFO)
+            trace_logger.propagate = False
+            try:
+                log_dir = os.path.dirname(TRACE_LOG_PATH)
+                if log_dir and not os.path.exists(log_dir):
+                    os.makedirs(log_dir, exist_ok=True)
+                handler = RotatingFileHandler(TRACE_LOG_PATH, maxBytes=5_000_000, backupCount=3, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                trace_logger.addHandler(handler)
+            except (OSError, PermissionError):
+                # 読み取り専用環境ではファイル出力をスキップ(集計のみ行う)
+                trace_logger.addHandler(logging.NullHandler())
+            _trace_logger = trace_logger
+        return _trace_logger
+
+
+class Span:
+    """計測中の区間(set() で属性を追加)"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = _current_span.get()
+        self.attrs = dict(attrs)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def set_usage(self, usage: Any) -> None:
+        """OpenAIレスポンスの usage からトークン数を記録"""
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            value = getattr(usage, field, None)
+            if isinstance(value, int):
+                self.attrs[field] = value
+
+
+class RunTrace:
+    """1回の実行(分析1件など)に属する区間の集計"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attrs = dict(attrs)
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        区間名(LLMはタグ別)ごとの集計
+
+        Returns:
+            [{"区間", "回数", "合計秒", "最大秒", "入力トークン", "出力トークン", "エラー"}, ...] ※合計秒の降順
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            key = record["name"] + (" " + record["attrs"]["tag"] if record["attrs"].get("tag") else "")
+            row = rows.setdefault(key, {
+                "区間": key, "回数": 0, "合計秒": 0.0, "最大秒": 0.0,
+                "入力トークン": 0, "出力トークン": 0, "エラー": 0,
+            })
+            seconds = record["duration_ms"] / 1000.0
+            row["回数"] += 1
+            row["合計秒"] += seconds
+            row["最大秒"] = max(row["最大秒"], seconds)
+            row["入力トークン"] += record["attrs"].get("prompt_tokens", 0)
+            row["出力トークン"] += record["attrs"].get("completion_tokens", 0)
+            row["エラー"] += 1 if record["status"] == "error" else 0
+        for row in rows.values():
+            row["合計秒"] = round(row["合計秒"], 2)
+            row["最大秒"] = round(row["最大秒"], 2)
+        return sorted(rows.values(), key=lambda r: r["合計秒"], reverse=True)
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    run = _current_run.get()
+    if run is not None:
+        record["trace_id"] = run.trace_id
+        run.add(record)
+    if os.getenv("TRACE_DISABLE") == "1":
+        return
+    try:
+        _get_trace_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+    except Exception:
+        # トレース出力の失敗で本処理を止めない
+        pass
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    区間を計測してJSON行を出力
+
+    Args:
+        name: 区間名(例: "serpapi.search", "pdf.download", "llm.request")
+        **attrs: 記録する属性(JSON化可能な値)
+
+    Yields:
+        Span(処理中に set()/set_usage() で属性を追加できる)
+    """
+    current = Span(name, attrs)
+    token = _current_span.set(current.span_id)
+    started_at = datetime.now().isoformat(timespec="milliseconds")
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = "error"
+        current.set(error=type(e).__name__ + ": " + str(e)[:200])
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000.0
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # ジェネレーターが別コンテキストで終了した場合
+            pass
+        _emit({
+            "name": name,
+            "span_id": current.span_id,
+            "parent_id": current.parent_id,
+            "started_at": started_at,
+            "duration_ms": round(duration_ms, 1),
+            "status": status,
+            "thread": threading.current_thread().name,
+            "attrs": current.attrs,
+        })
+
+
+@contextmanager
+def trace_run(name: str, **attrs: Any) -> Iterator[RunTrace]:
+    """
+    実行単位の集計を開始(内側の区間は RunTrace に集められる)
+
+    Args:
+        name: 実行の種類(例: "analysis", "batch_job")
+        **attrs: 記録する属性(会社名など)
+
+    Yields:
+        RunTrace(summary() で区間別の集計を取得)
+    """
+    run = RunTrace(name, attrs)
+    token = _current_run.set(run)
+    try:
+        with span("run." + name, **attrs):
+            yield run
+    finally:
+        _current_run.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """関数全体を区間として計測するデコレーター"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,79 @@
+"""SQLiteCache の TTL・LRU・集計"""
+import types
+
+import pytest
+
+from modules import cache_store
+from modules.cache_store import SQLiteCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """cache_store が参照する時刻を手動で進める"""
+    now = {"t": 1_000_000.0}
+    monkeypatch.setattr(cache_store, "time", types.SimpleNamespace(time=lambda: now["t"]))
+    return now
+
+
+def test_make_cache_key_ignores_dict_order():
+    assert make_cache_key({"q": "売上", "hl": "ja"}) == make_cache_key({"hl": "ja", "q": "売上"})
+    assert make_cache_key({"q": "売上"}) != make_cache_key({"q": "利益"})
+
+
+def test_roundtrip_and_namespaces(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"))
+    cache.set("market", "k", {"organic_results": [{"title": "自動車"}]})
+    assert cache.get("market", "k") == {"organic_results": [{"title": "自動車"}]}
+    assert cache.get("general", "k") is None
+    assert cache.stats() == {"market": {"hits": 1, "misses": 0}, "general": {"hits": 0, "misses": 1}}
+
+
+def test_expired_entry_is_a_miss(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"))
+    cache.set("ir_pdf", "k", "v", ttl=60)
+    clock["t"] += 59
+    assert cache.get("ir_pdf", "k") == "v"
+    clock["t"] += 2
+    assert cache.get("ir_pdf", "k") is None
+
+
+@pytest.mark.parametrize("ttl", [0, -1])
+def test_non_positive_ttl_is_not_stored(tmp_path, clock, ttl):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"))
+    cache.set("general", "k", "古い値")
+    cache.set("general", "k", "v", ttl=ttl)
+    assert cache.get("general", "k") is None
+    cache.set("general", "k2", "v", ttl=ttl)
+    assert cache.get("general", "k2") is None
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"), max_entries=2)
+    cache.set("ns", "a", 1)
+    clock["t"] += 1
+    cache.set("ns", "b", 2)
+    clock["t"] += 1
+    assert cache.get("ns", "a") == 1  # a を最近使ったことにする
+    clock["t"] += 1
+    cache.set("ns", "c", 3)
+    assert cache.get("ns", "b") is None
+    assert cache.get("ns", "a") == 1
+    assert cache.get("ns", "c") == 3
+
+
+def test_evicts_by_total_size(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"), max_bytes=250)
+    for i in range(3):
+        cache.set("ns", str(i), "x" * 100)
+        clock["t"] += 1
+    assert cache.get("ns", "0") is None
+    assert cache.get("ns", "2") == "x" * 100
+
+
+def test_unwritable_path_disables_cache(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = SQLiteCache(str(blocker / "sub" / "c.sqlite3"))
+    assert not cache.enabled
+    cache.set("ns", "k", "v")
+    assert cache.get("ns", "k") is None
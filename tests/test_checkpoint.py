@@ -0,0 +1,50 @@
+"""段階別チェックポイントの保存と再開"""
+import pytest
+
+from modules import checkpoint
+from modules.cache_store import SQLiteCache
+from modules.checkpoint import make_run_id, open_run
+
+
+@pytest.fixture(autouse=True)
+def runs_cache(tmp_path, monkeypatch):
+    cache = SQLiteCache(str(tmp_path / "runs.sqlite3"))
+    monkeypatch.setattr(checkpoint, "get_cache", lambda name: cache)
+    monkeypatch.delenv("RUN_CHECKPOINT_DISABLE", raising=False)
+    return cache
+
+
+def test_run_id_ignores_surrounding_whitespace():
+    assert make_run_id(" テスト工業 ", "求人\n") == make_run_id("テスト工業", "求人")
+    assert make_run_id("テスト工業", "求人A") != make_run_id("テスト工業", "求人B")
+
+
+def test_resumes_from_first_missing_stage():
+    run = open_run("テスト工業", "求人")
+    assert run.first_missing() == "financials"
+    run.save(financials={"売上高": "1兆円"}, used_estimation=False)
+    run.save(industry_keyword="自動車", market_data="業界データ")
+
+    resumed = open_run("テスト工業", "求人")
+    assert resumed.resumed_stages == ["financials", "used_estimation", "industry_keyword", "market_data"]
+    assert resumed.first_missing() == "draft_report"
+    assert resumed.get("financials") == {"売上高": "1兆円"}
+
+
+def test_completed_run_starts_fresh():
+    run = open_run("テスト工業", "求人")
+    run.save(financials={}, used_estimation=False, industry_keyword="", market_data="", draft_report="d")
+    run.save(final_report="f")
+    assert open_run("テスト工業", "求人").resumed_stages == []
+
+
+def test_resume_false_and_disabled(monkeypatch):
+    open_run("テスト工業", "求人").save(financials={"売上高": "1兆円"})
+    assert not open_run("テスト工業", "求人", resume=False).has("financials")
+
+    monkeypatch.setenv("RUN_CHECKPOINT_DISABLE", "1")
+    assert not open_run("テスト工業", "求人").has("financials")
+    run = open_run("別会社", "求人")
+    run.save(financials={"売上高": "2兆円"})
+    monkeypatch.delenv("RUN_CHECKPOINT_DISABLE")
+    assert not open_run("別会社", "求人").has("financials")
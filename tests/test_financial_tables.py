@@ -0,0 +1,65 @@
+"""financial_tables のルールベース抽出(当期列・当期行の特定)"""
+from modules.financial_tables import extract_from_table, parse_number
+
+
+def test_parse_number_handles_units_and_negatives():
+    assert parse_number("1,234百万円") == 1234.0
+    assert parse_number("△12.5") == -12.5
+    assert parse_number("(300)") == -300.0
+    assert parse_number("12.3%") == 12.3
+    assert parse_number("－") is None
+
+
+def test_row_label_table_picks_current_period_column_over_previous():
+    table = [
+        ["(単位:百万円)", "2023年3月期", "2024年3月期"],
+        ["売上高", "1,000", "1,200"],
+    ]
+    value, unit, row, col = extract_from_table(table, None)["売上高"]
+    assert (value, unit, row, col) == (1200.0, "百万円", 1, 2)
+
+
+def test_row_label_table_ignores_percent_change_column():
+    table = [
+        ["(単位:百万円)", "増減率", "2024年3月期", "2023年3月期"],
+        ["売上高", "20.0%", "1,200", "1,000"],
+    ]
+    assert extract_from_table(table, None)["売上高"][0] == 1200.0
+
+
+def test_row_label_table_without_current_period_returns_nothing():
+    # 前期・増減率の列しか判別できない表からは値を採らない(LLM抽出に任せる)
+    table = [
+        ["(単位:百万円)", "前期", "増減率"],
+        ["売上高", "1,000", "20.0%"],
+        ["自己資本比率", "45.0%", "1.2%"],
+    ]
+    assert extract_from_table(table, None) == {}
+
+
+def test_row_label_table_with_empty_current_cell_returns_nothing():
+    table = [
+        ["(単位:百万円)", "2023年3月期", "2024年3月期"],
+        ["売上高", "1,000", "-"],
+    ]
+    assert "売上高" not in extract_from_table(table, None)
+
+
+def test_column_header_table_picks_latest_period_row():
+    table = [
+        ["", "売上高", "営業利益"],
+        ["2023年3月期", "1,000", "80"],
+        ["2024年3月期", "1,200", "100"],
+    ]
+    found = extract_from_table(table, "百万円")
+    assert found["売上高"][:3] == (1200.0, "百万円", 2)
+    assert found["営業利益"][0] == 100.0
+
+
+def test_column_header_table_without_period_rows_returns_nothing():
+    table = [
+        ["", "売上高", "営業利益"],
+        ["前期", "1,000", "80"],
+        ["増減率", "20.0%", "25.0%"],
+    ]
+    assert extract_from_table(table, "百万円") == {}
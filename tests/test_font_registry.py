@@ -0,0 +1,89 @@
+"""日本語フォントの共有とPDFへの埋め込み(実際のTTFを使用)"""
+import pytest
+
+pytest.importorskip("fontTools")
+pytest.importorskip("fpdf")
+pytest.importorskip("docx")
+
+from fontTools.fontBuilder import FontBuilder  # noqa: E402
+from fontTools.pens.ttGlyphPen import TTGlyphPen  # noqa: E402
+from fpdf import fonts as fpdf_fonts  # noqa: E402
+
+from modules import export, font_registry  # noqa: E402
+
+# ASCII・かな・漢字(CJK統合漢字の先頭)
+_CODEPOINTS = list(range(0x20, 0x7F)) + list(range(0x3041, 0x3097)) + list(range(0x4E00, 0x5E00))
+
+
+def _glyph(seed: int):
+    """文字ごとに形の異なる字形(フォントを実際の日本語フォントに近い大きさにする)"""
+    pen = TTGlyphPen(None)
+    for i in range(6):
+        x, y = (seed * 37 + i * 131) % 800, (seed * 53 + i * 97) % 800
+        pen.moveTo((x, y))
+        pen.lineTo((x + 150, y))
+        pen.lineTo((x + 150, y + 40 + i * 10))
+        pen.lineTo((x, y + 40 + i * 10))
+        pen.closePath()
+    return pen.glyph()
+
+
+@pytest.fixture(scope="module")
+def font_file(tmp_path_factory):
+    names = [".notdef"] + ["g%04x" % cp for cp in _CODEPOINTS]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({cp: "g%04x" % cp for cp in _CODEPOINTS})
+    builder.setupGlyf({name: _glyph(i) for i, name in enumerate(names)})
+    builder.setupHorizontalMetrics({name: (1000, 0) for name in names})
+    builder.setupHorizontalHeader(ascent=880, descent=-120)
+    builder.setupNameTable({"familyName": "TestJP", "styleName": "Regular"})
+    builder.setupOS2(sTypoAscender=880, usWinAscent=880, usWinDescent=120)
+    builder.setupPost()
+    path = tmp_path_factory.mktemp("fonts") / "NotoSansJP-Regular.ttf"
+    builder.save(str(path))
+    return path
+
+
+@pytest.fixture
+def parsed(font_file, monkeypatch):
+    """プロセス内のレジストリを作り直し、fpdf2 がフォントを解析した回数を数える"""
+    counts = {"parse": 0}
+    original = fpdf_fonts.TTFFont.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counts["parse"] += 1
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(fpdf_fonts.TTFFont, "__init__", counting_init)
+    monkeypatch.setattr(font_registry, "JAPANESE_FONT_CANDIDATES", [font_file])
+    monkeypatch.setattr(font_registry, "_registry", font_registry._FontRegistry())
+    monkeypatch.delenv("PDF_FONT_SHARE_DISABLE", raising=False)
+    return counts
+
+
+def test_font_is_parsed_once_and_subset_on_output(font_file, parsed):
+    first = export.export_to_pdf("テスト工業", "## 一二\n\nあいう **丁七**")
+    second = export.export_to_pdf("サンプル商事", "## 三上\n\nかきく")
+    assert parsed["parse"] == 1
+    assert font_registry._registry._share_failed is False
+
+    # 埋め込まれるのは使用した字形だけ
+    size = font_file.stat().st_size
+    assert size > 200_000
+    assert len(first) < size / 10
+    assert len(second) < size / 10
+    assert b"/FontFile2" in first and b"/FontFile2" in second
+
+
+def test_share_disabled_uses_add_font(font_file, parsed, monkeypatch):
+    monkeypatch.setenv("PDF_FONT_SHARE_DISABLE", "1")
+    export.export_to_pdf("テスト工業", "あいう")
+    export.export_to_pdf("テスト工業", "かきく")
+    assert parsed["parse"] == 2
+
+
+def test_no_font_falls_back_to_ascii(parsed, monkeypatch):
+    monkeypatch.setattr(font_registry, "JAPANESE_FONT_CANDIDATES", [])
+    assert export.export_to_pdf("Test Corp", "本文").startswith(b"%PDF")
+    assert parsed["parse"] == 0
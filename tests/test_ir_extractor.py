@@ -0,0 +1,118 @@
+"""get_financials_from_ir のルールベース経路(LLM呼び出し回数・返却形式)"""
+import io
+import types
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import ir_extractor, serp_api  # noqa: E402
+from modules.openai_api import build_step1_messages  # noqa: E402
+
+COMPANY = "テスト工業株式会社"
+PAGE_TEXT = COMPANY + " 2024年3月期 決算短信 " + "売上高 営業利益 自己資本比率 " * 20
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    counts = {"llm": 0, "segments": 0, "fields": None}
+
+    @contextmanager
+    def fake_fetch_pdf(url):
+        yield io.BytesIO(b"%PDF")
+
+    def fake_llm(text, company_name, known_fields=None, fields=None):
+        counts["llm"] += 1
+        counts["fields"] = fields
+        result = {field: "LLM値" for field in fields or ir_extractor.FINANCIAL_SCHEMA}
+        result["主力事業セグメント"] = "自動車事業: 4兆円(75パーセント)、金融事業: 1兆円(25パーセント)"
+        return result
+
+    def fake_segments(text, api_key):
+        counts["segments"] += 1
+        return "機械事業: 800億円(67パーセント)、素材事業: 400億円(33パーセント)"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("IR_RULE_EXTRACTION", "1")
+    monkeypatch.setattr(serp_api, "search_ir_pdf_url", lambda company_name: "https://example.com/ir.pdf")
+    monkeypatch.setattr(ir_extractor, "fetch_pdf", fake_fetch_pdf)
+    monkeypatch.setattr(ir_extractor, "extract_pages_from_pdf", lambda pdf_file, max_pages: [PAGE_TEXT])
+    monkeypatch.setattr(ir_extractor, "strict_company_verification", lambda text, company: True)
+    monkeypatch.setattr(ir_extractor, "extract_financials_with_llm", fake_llm)
+    monkeypatch.setattr(ir_extractor, "extract_detailed_segments", fake_segments)
+    return counts
+
+
+def _local_result(fields):
+    provenance = [field + ": p.1 表1 (2行3列, 百万円)" for field in fields]
+    return lambda pdf_file, page_indices, page_texts: ({field: "1.0パーセント" for field in fields}, provenance)
+
+
+def test_core_fields_from_tables_leave_only_remaining_fields_to_llm(calls, monkeypatch):
+    monkeypatch.setattr(ir_extractor, "extract_financials_from_pdf", _local_result(["売上高", "営業利益率", "自己資本比率"]))
+
+    financials = ir_extractor.get_financials_from_ir(COMPANY)
+
+    assert calls["llm"] == 1 and calls["segments"] == 0
+    assert calls["fields"] == ir_extractor.FINANCIAL_SCHEMA[3:]
+    assert list(financials) == ir_extractor.FINANCIAL_SCHEMA
+    assert financials["売上高"] == "1.0パーセント"
+    assert financials["ROE"] == "LLM値"
+    assert financials["中期経営計画"] == "LLM値"
+
+
+def test_all_fields_from_tables_skip_llm(calls, monkeypatch):
+    monkeypatch.setattr(ir_extractor, "extract_financials_from_pdf", _local_result(ir_extractor.FINANCIAL_SCHEMA))
+
+    financials = ir_extractor.get_financials_from_ir(COMPANY)
+
+    # 表の値はセグメント詳細化の条件(20文字未満)に当たるため詳細化のみ1回
+    assert calls["llm"] == 0 and calls["segments"] == 1
+    assert financials["ROE"] == "1.0パーセント"
+
+
+def test_missing_core_field_uses_llm_and_keeps_table_values(calls, monkeypatch):
+    monkeypatch.setattr(ir_extractor, "extract_financials_from_pdf", _local_result(["売上高"]))
+
+    financials = ir_extractor.get_financials_from_ir(COMPANY)
+
+    assert calls["llm"] == 1 and calls["segments"] == 0
+    assert calls["fields"] == ir_extractor.FINANCIAL_SCHEMA[1:]
+    assert financials["売上高"] == "1.0パーセント"
+    assert financials["営業利益率"] == "LLM値"
+
+
+def test_llm_prompt_is_limited_to_requested_fields(monkeypatch):
+    sent = []
+
+    def create(**kwargs):
+        sent.append(kwargs["messages"][0]["content"])
+        message = types.SimpleNamespace(content='{"ROE": "12パーセント"}')
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(ir_extractor, "get_openai_client", lambda api_key=None: client)
+    monkeypatch.setattr(ir_extractor, "scheduled_call", lambda func, **kwargs: func())
+
+    result = ir_extractor.extract_financials_with_llm(
+        PAGE_TEXT, COMPANY, known_fields={"売上高": "1000億円", "_provenance": ["p.1"]}, fields=["売上高", "ROE"]
+    )
+
+    assert result == {"ROE": "12パーセント"}
+    prompt = sent[0]
+    output_format = prompt[prompt.index("【出力JSON形式】"):]
+    assert '"ROE"' in output_format and '"売上高"' not in output_format and '"強み"' not in output_format
+    assert "1. ROE:" in prompt and "第1段階" not in prompt
+    assert "- 売上高: 1000億円" in prompt and "_provenance" not in prompt
+
+
+@pytest.mark.parametrize("fields", [["売上高", "営業利益率", "自己資本比率"], ["売上高"]])
+def test_provenance_is_not_sent_to_step1_prompt(calls, monkeypatch, fields):
+    monkeypatch.setattr(ir_extractor, "extract_financials_from_pdf", _local_result(fields))
+
+    financials = ir_extractor.get_financials_from_ir(COMPANY)
+    messages = build_step1_messages(COMPANY, "求人情報", financials, "業界データ", "{company_name}\n{financials}")
+
+    assert not any(key.startswith("_") for key in financials)
+    assert all("_provenance" not in m["content"] and "p.1 表1" not in m["content"] for m in messages)
@@ -0,0 +1,102 @@
+"""ジョブ表と再投入"""
+import threading
+import time
+
+import pytest
+
+from modules import job_queue
+from modules.job_queue import STATUS_DONE, STATUS_ERROR, STATUS_RUNNING, JobQueue, JobStore, _PartialWriter
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture
+def ran(monkeypatch):
+    """ワーカーで実行されたジョブID(分析そのものは行わない)"""
+    job_ids = []
+    done = threading.Event()
+
+    def fake_run(store, job_id):
+        job_ids.append(job_id)
+        done.set()
+
+    monkeypatch.setattr(job_queue, "run_analysis_job", fake_run)
+    return job_ids, done
+
+
+def test_create_reuses_active_job(store):
+    job_id, created = store.create("テスト工業", "求人")
+    assert created
+    assert store.create("テスト工業", "求人") == (job_id, False)
+    assert store.create("テスト工業", "別の求人")[1]
+
+    store.update(job_id, status=STATUS_DONE)
+    new_id, created = store.create("テスト工業", "求人")
+    assert created and new_id != job_id
+
+
+def test_update_roundtrips_json_columns(store):
+    job_id, _ = store.create("テスト工業", "求人")
+    step0 = {"financials": {"売上高": "1兆円"}, "used_estimation": False}
+    store.update(job_id, status=STATUS_RUNNING, progress=50, step0=step0, trace=[{"区間": "llm.request", "回数": 1}])
+    job = store.get(job_id)
+    assert job["status"] == STATUS_RUNNING
+    assert job["progress"] == 50
+    assert job["step0"] == step0
+    assert job["trace"] == [{"区間": "llm.request", "回数": 1}]
+    assert store.get("missing") is None
+
+
+def test_active_ids_and_purge(store):
+    running, _ = store.create("A社", "求人")
+    finished, _ = store.create("B社", "求人")
+    store.update(running, status=STATUS_RUNNING)
+    store.update(finished, status=STATUS_ERROR)
+    assert store.active_ids() == [running]
+
+    assert store.purge(older_than=3600) == 0
+    time.sleep(0.01)
+    assert store.purge(older_than=0) == 1
+    assert store.get(finished) is None
+    assert store.get(running) is not None
+
+
+def test_unwritable_path_uses_memory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    store = JobStore(str(blocker / "sub" / "jobs.sqlite3"))
+    job_id, _ = store.create("テスト工業", "求人")
+    assert store.get(job_id)["company_name"] == "テスト工業"
+
+
+def test_partial_writer_passes_deltas_through_and_stores_text(store):
+    job_id, _ = store.create("テスト工業", "求人")
+    writer = _PartialWriter(store, job_id, interval=3600)
+    assert list(writer.stream(iter(["## Step1", "\n本文"]))) == ["## Step1", "\n本文"]
+    assert store.get(job_id)["partial_report"] == "## Step1\n本文"
+
+
+def test_submit_runs_once_per_active_input(store, ran):
+    job_ids, done = ran
+    queue = JobQueue(store, workers=1)
+    first = queue.submit("テスト工業", "求人")
+    assert done.wait(5)
+    assert queue.submit("テスト工業", "求人") == first
+    queue._pool.shutdown(wait=True)
+    assert job_ids == [first]
+
+
+def test_unfinished_jobs_are_resubmitted_on_restart(tmp_path, ran):
+    job_ids, _ = ran
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobStore(path)
+    queued, _ = first.create("A社", "求人")
+    finished, _ = first.create("B社", "求人")
+    first.update(finished, status=STATUS_DONE)
+
+    queue = JobQueue(JobStore(path), workers=1)
+    queue._pool.shutdown(wait=True)
+    assert job_ids == [queued]
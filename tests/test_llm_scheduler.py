@@ -0,0 +1,93 @@
+"""OpenAI呼び出しスケジューラの再試行・待機・優先度"""
+import email.utils
+import threading
+import time
+import types
+
+import pytest
+
+from modules.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    RequestScheduler,
+    TokenBucket,
+    retry_after_seconds,
+)
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__("status " + str(status_code))
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+def _scheduler(max_retries=3):
+    return RequestScheduler(rpm=10_000, tpm=10_000_000, max_retries=max_retries, backoff_base=0.001, backoff_max=0.01)
+
+
+def _failing(errors, result="ok"):
+    """errors を順に送出し、尽きたら result を返す関数と呼び出し回数"""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return func, calls
+
+
+def test_retries_rate_limit_then_succeeds():
+    func, calls = _failing([APIError(429, {"retry-after-ms": "1"}), APIError(503)])
+    assert _scheduler().call(func) == "ok"
+    assert len(calls) == 3
+
+
+def test_non_retryable_error_is_raised_immediately():
+    func, calls = _failing([APIError(400)])
+    with pytest.raises(APIError):
+        _scheduler().call(func)
+    assert len(calls) == 1
+
+
+def test_gives_up_after_max_retries():
+    func, calls = _failing([APIError(500)] * 10)
+    with pytest.raises(APIError):
+        _scheduler(max_retries=2).call(func)
+    assert len(calls) == 3
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(APIError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(APIError(429, {"retry-after": "7"})) == 7.0
+    http_date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_seconds(APIError(429, {"retry-after": http_date})) <= 31
+    assert retry_after_seconds(APIError(429)) is None
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    # 1秒に1トークン補充
+    assert 9.0 < bucket.wait_time(10) <= 10.0
+    # 容量を超える要求は容量分として扱う(永久に待たない)
+    assert bucket.wait_time(1000) <= 60.0
+
+
+def test_background_waits_for_interactive():
+    scheduler = _scheduler()
+    with scheduler._cond:
+        scheduler._waiting[PRIORITY_INTERACTIVE] += 1
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: scheduler.call(done.set, priority=PRIORITY_BACKGROUND))
+    thread.start()
+    assert not done.wait(0.2)
+
+    with scheduler._cond:
+        scheduler._waiting[PRIORITY_INTERACTIVE] -= 1
+        scheduler._cond.notify_all()
+    thread.join(timeout=5)
+    assert done.is_set()
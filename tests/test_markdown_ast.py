@@ -0,0 +1,74 @@
+"""レポートMarkdownのブロック解析"""
+from modules.markdown_ast import inline_text, iter_blocks, parse_inlines, parse_report
+
+
+def test_parse_inlines_bold():
+    assert parse_inlines("前**強調**後__太字__") == [
+        {"text": "前", "bold": False},
+        {"text": "強調", "bold": True},
+        {"text": "後", "bold": False},
+        {"text": "太字", "bold": True},
+    ]
+    assert parse_inlines("") == []
+    assert inline_text(parse_inlines("a**b**c")) == "abc"
+
+
+def test_block_types_in_order():
+    text = "\n".join([
+        "# 見出し ##",
+        "本文 **太字**",
+        "",
+        "- 項目1",
+        "  - 子項目",
+        "1. 番号付き",
+        "---",
+        "```",
+        "| コード内の表 |",
+        "```",
+    ])
+    blocks = list(iter_blocks(text.splitlines()))
+    assert [b["type"] for b in blocks] == ["heading", "paragraph", "list", "list", "rule", "code"]
+    assert blocks[0]["level"] == 1 and inline_text(blocks[0]["inlines"]) == "見出し"
+    assert blocks[1]["inlines"][1] == {"text": "太字", "bold": True}
+    bullets, numbered = blocks[2], blocks[3]
+    assert not bullets["ordered"] and [i["level"] for i in bullets["items"]] == [0, 1]
+    assert numbered["ordered"] and inline_text(numbered["items"][0]["inlines"]) == "番号付き"
+    assert blocks[5]["text"] == "| コード内の表 |"
+
+
+def test_table_with_header_pads_and_truncates_rows():
+    blocks = list(iter_blocks([
+        "| 項目 | 内容 | 根拠 |",
+        "|---|:---:|---|",
+        "| 売上高 | **5兆円** |",
+        "| ROE | 10% | 決算短信 | 余分 |",
+    ]))
+    assert len(blocks) == 1
+    table = blocks[0]
+    assert [inline_text(c) for c in table["header"]] == ["項目", "内容", "根拠"]
+    assert [[inline_text(c) for c in row] for row in table["rows"]] == [
+        ["売上高", "5兆円", ""],
+        ["ROE", "10%", "決算短信"],
+    ]
+    assert table["rows"][0][1] == [{"text": "5兆円", "bold": True}]
+
+
+def test_table_without_separator_has_no_header():
+    table = next(iter_blocks(["| a | b |", "| c |"]))
+    assert table["header"] is None
+    assert [[inline_text(c) for c in row] for row in table["rows"]] == [["a", "b"], ["c", ""]]
+
+
+def test_list_then_table_are_separate_blocks():
+    blocks = list(iter_blocks(["- 項目", "| a | b |", "- 次"]))
+    assert [b["type"] for b in blocks] == ["list", "table", "list"]
+
+
+def test_unclosed_code_block_is_kept():
+    assert list(iter_blocks(["```", "print(1)"])) == [{"type": "code", "text": "print(1)"}]
+
+
+def test_parse_report_is_cached():
+    text = "## Step1\n\n本文"
+    assert parse_report(text) is parse_report(text)
+    assert isinstance(parse_report(text), tuple)
@@ -0,0 +1,135 @@
+"""Batch API モードをローカル代替サーバー(openai_batch_stub)に対して通しで実行"""
+import json
+import types
+import urllib.request
+import uuid
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import openai_api  # noqa: E402
+from modules.cache_store import SQLiteCache  # noqa: E402
+from modules.openai_batch_stub import default_responder, start_stub_server  # noqa: E402
+
+PROMPT1 = "Step1プロンプト {company_name}"
+PROMPT2 = "Step2プロンプト {step1_report}"
+
+
+def _namespace(payload):
+    return json.loads(json.dumps(payload), object_hook=lambda d: types.SimpleNamespace(**d))
+
+
+class StubClient:
+    """OpenAI SDK の files / batches のうち Batch API モードが使う部分だけをHTTPで実装"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.retrieves = 0
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _request(self, method, path, data=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers or {})
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+
+    def _create_file(self, file, purpose):
+        name, payload, content_type = file
+        boundary = uuid.uuid4().hex
+        body = (
+            "--" + boundary + "\r\nContent-Disposition: form-data; name=\"purpose\"\r\n\r\n" + purpose + "\r\n"
+            "--" + boundary + "\r\nContent-Disposition: form-data; name=\"file\"; filename=\"" + name + "\"\r\n"
+            "Content-Type: " + content_type + "\r\n\r\n"
+        ).encode("utf-8") + payload + ("\r\n--" + boundary + "--\r\n").encode("utf-8")
+        headers = {"Content-Type": "multipart/form-data; boundary=" + boundary}
+        return _namespace(json.loads(self._request("POST", "/files", body, headers)))
+
+    def _file_content(self, file_id):
+        return types.SimpleNamespace(text=self._request("GET", "/files/" + file_id + "/content").decode("utf-8"))
+
+    def _create_batch(self, **params):
+        body = json.dumps(params).encode("utf-8")
+        return _namespace(json.loads(self._request("POST", "/batches", body, {"Content-Type": "application/json"})))
+
+    def _retrieve_batch(self, batch_id):
+        self.retrieves += 1
+        return _namespace(json.loads(self._request("GET", "/batches/" + batch_id)))
+
+
+def _responder(messages):
+    """C社のStep1と、D社を含むStep2の入力は失敗させる"""
+    text = messages[-1]["content"]
+    if "C社" in text and "Step1" in json.dumps(messages, ensure_ascii=False):
+        raise RuntimeError("step1 failed for C社")
+    if "Step2プロンプト" in text and "D社" in text:
+        raise RuntimeError("step2 failed for D社")
+    return default_responder(messages)
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = start_stub_server(responder=_responder)
+    client = StubClient("http://127.0.0.1:" + str(server.server_port) + "/v1")
+    cache = SQLiteCache(str(tmp_path / "completions.sqlite3"))
+    monkeypatch.setattr(openai_api, "get_openai_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(openai_api, "_completion_cache", lambda: cache)
+    monkeypatch.setenv("TRACE_DISABLE", "1")
+    monkeypatch.delenv("OPENAI_CACHE_DISABLE", raising=False)
+    yield client
+    server.shutdown()
+    server.server_close()
+
+
+def _items(*companies):
+    return [
+        {"id": "job-" + company, "company_name": company, "job_info": company + "の求人", "financials": {}, "market_data": "業界"}
+        for company in companies
+    ]
+
+
+def test_generate_reports_batch_end_to_end(stub):
+    items = _items("A社", "B社", "C社", "D社")
+    reports = openai_api.generate_reports_batch(items, PROMPT1, PROMPT2, poll_interval=0.01)
+
+    assert list(reports) == [item["id"] for item in items]
+    for company in ("A社", "B社"):
+        report = reports["job-" + company]
+        assert report["error"] is None
+        assert company in report["draft_report"]
+        assert report["final_report"].startswith("## Step1")
+
+    # Step1で失敗したリクエストはStep2へ送らない
+    assert "step1 failed" in reports["job-C社"]["error"]
+    assert reports["job-C社"]["final_report"] is None
+    # Step2だけ失敗した場合は草稿を残す
+    assert "step2 failed" in reports["job-D社"]["error"]
+    assert "D社" in reports["job-D社"]["draft_report"]
+    assert reports["job-D社"]["final_report"] is None
+
+    # 作成時は validating。Step1・Step2とも in_progress → completed の2回ずつ状態確認する
+    assert stub.retrieves == 4
+
+
+def test_results_follow_request_order_with_cache_hits(stub):
+    openai_api.generate_reports_batch(_items("B社"), PROMPT1, PROMPT2, poll_interval=0.01)
+    retrieves = stub.retrieves
+
+    items = _items("A社", "B社")
+    reports = openai_api.generate_reports_batch(items, PROMPT1, PROMPT2, poll_interval=0.01)
+    # B社はキャッシュから返り、A社だけが投入されるが、順序は入力どおり
+    assert list(reports) == ["job-A社", "job-B社"]
+    assert "A社" in reports["job-A社"]["draft_report"]
+    assert "B社" in reports["job-B社"]["draft_report"]
+    assert stub.retrieves - retrieves == 4
+
+
+def test_wait_gives_up_after_max_wait(stub, monkeypatch):
+    monkeypatch.setattr(openai_api, "OPENAI_BATCH_MAX_WAIT", 0.001)
+    reports = openai_api.generate_reports_batch(_items("A社", "B社"), PROMPT1, PROMPT2, poll_interval=0.01)
+
+    assert stub.retrieves == 1
+    for report in reports.values():
+        assert "時間内に完了しませんでした" in report["error"]
+        assert "status=in_progress" in report["error"]
+        assert report["final_report"] is None
@@ -0,0 +1,62 @@
+"""生成結果キャッシュ: 正常終了(finish_reason == "stop")の応答のみ保存"""
+import types
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import openai_api  # noqa: E402
+from modules.cache_store import SQLiteCache  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "入力"}]
+
+
+def _response(content, finish_reason):
+    choice = types.SimpleNamespace(message=types.SimpleNamespace(content=content), finish_reason=finish_reason)
+    return types.SimpleNamespace(choices=[choice], usage=None)
+
+
+def _stream(parts, finish_reason):
+    chunks = [
+        types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=p), finish_reason=None)], usage=None)
+        for p in parts
+    ]
+    chunks.append(types.SimpleNamespace(
+        choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=None), finish_reason=finish_reason)], usage=None
+    ))
+    # include_usage 指定時の最終チャンク(choices が空)
+    chunks.append(types.SimpleNamespace(choices=[], usage=None))
+    return iter(chunks)
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    state = {"reply": None, "calls": 0}
+
+    def create(**kwargs):
+        state["calls"] += 1
+        return state["reply"]()
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    cache = SQLiteCache(str(tmp_path / "completions.sqlite3"))
+    monkeypatch.setattr(openai_api, "get_openai_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(openai_api, "_completion_cache", lambda: cache)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TRACE_DISABLE", "1")
+    return state
+
+
+@pytest.mark.parametrize("finish_reason, cached", [("stop", True), ("length", False), ("content_filter", False)])
+def test_complete_caches_only_finished_responses(fake, finish_reason, cached):
+    fake["reply"] = lambda: _response("レポート本文", finish_reason)
+    assert openai_api._complete(MESSAGES, "[Test]", cache_key="k") == "レポート本文"
+    assert openai_api._complete(MESSAGES, "[Test]", cache_key="k") == "レポート本文"
+    assert fake["calls"] == (1 if cached else 2)
+
+
+@pytest.mark.parametrize("finish_reason, cached", [("stop", True), ("length", False)])
+def test_stream_caches_only_finished_responses(fake, finish_reason, cached):
+    fake["reply"] = lambda: _stream(["## Step1", "\n本文"], finish_reason)
+    assert "".join(openai_api._stream_complete(MESSAGES, "[Test]", cache_key="k")) == "## Step1\n本文"
+    assert "".join(openai_api._stream_complete(MESSAGES, "[Test]", cache_key="k")) == "## Step1\n本文"
+    assert fake["calls"] == (1 if cached else 2)
@@ -0,0 +1,50 @@
+"""run_step0 のチェックポイント保存"""
+import pytest
+
+pytest.importorskip("openai")
+
+from modules.checkpoint import RunCheckpoint  # noqa: E402
+from modules.pipeline import run_step0  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_persist(monkeypatch):
+    monkeypatch.setenv("RUN_CHECKPOINT_DISABLE", "1")
+    monkeypatch.setenv("TRACE_DISABLE", "1")
+
+
+def _market(job_info):
+    return "自動車", "業界データ"
+
+
+def test_financials_error_is_not_checkpointed():
+    checkpoint = RunCheckpoint("run")
+    step0 = run_step0(
+        "テスト工業", "求人",
+        fetch_financials=lambda name: {"error": "IR資料が見つかりません"},
+        fetch_market=_market,
+        checkpoint=checkpoint,
+    )
+    assert "error" in step0["financials"]
+    assert not checkpoint.has("financials")
+    assert not checkpoint.has("used_estimation")
+    assert checkpoint.first_missing() == "financials"
+    # 業界ブランチは成功しているので保存される
+    assert checkpoint.get("market_data") == "業界データ"
+
+
+def test_financials_success_is_checkpointed_and_reused():
+    calls = []
+
+    def fetch(name):
+        calls.append(name)
+        return {"売上高": "1兆円"}
+
+    checkpoint = RunCheckpoint("run")
+    run_step0("テスト工業", "求人", fetch_financials=fetch, fetch_market=_market, checkpoint=checkpoint)
+    assert checkpoint.get("financials") == {"売上高": "1兆円"}
+    assert checkpoint.get("used_estimation") is False
+
+    step0 = run_step0("テスト工業", "求人", fetch_financials=fetch, fetch_market=_market, checkpoint=checkpoint)
+    assert step0["financials"] == {"売上高": "1兆円"}
+    assert calls == ["テスト工業"]
@@ -0,0 +1,77 @@
+"""完了レポートの保存・再利用・全文検索"""
+import pytest
+
+from modules.report_store import ReportStore
+
+STEP0 = {
+    "financials": {"売上高": "5兆円", "営業利益率": "8.5%", "自己資本比率": "40%", "ROE": "10%"},
+    "used_estimation": False,
+    "industry_keyword": "自動車部品",
+    "total_elapsed": 12.3,
+}
+TRACE = [
+    {"区間": "llm.request", "回数": 2, "入力トークン": 1000, "出力トークン": 3000},
+    {"区間": "serpapi.search", "回数": 5},
+    {"区間": "llm.batch", "回数": 1, "入力トークン": 10, "出力トークン": 20},
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.delenv("REPORT_STORE_DISABLE", raising=False)
+    return ReportStore(str(tmp_path / "reports.sqlite3"))
+
+
+def test_save_and_get(store):
+    report_id = store.save("テスト工業", "求人", "## Step1\n電動化への投資", step0=STEP0, trace=TRACE, elapsed=42.04, model="m")
+    report = store.get(report_id)
+    assert report["company_name"] == "テスト工業"
+    assert (report["revenue"], report["operating_margin"], report["equity_ratio"], report["roe"]) == ("5兆円", "8.5%", "40%", "10%")
+    assert report["financials"] == STEP0["financials"]
+    assert report["used_estimation"] is False
+    assert report["industry_keyword"] == "自動車部品"
+    assert report["elapsed_seconds"] == 42.0
+    assert (report["prompt_tokens"], report["completion_tokens"]) == (1010, 3020)
+    assert report["trace"] == TRACE
+    assert store.get("missing") is None
+
+
+def test_disabled_or_empty_report_is_not_saved(store, monkeypatch):
+    assert store.save("テスト工業", "求人", "") is None
+    monkeypatch.setenv("REPORT_STORE_DISABLE", "1")
+    assert store.save("テスト工業", "求人", "本文") is None
+    assert store.count() == 0
+
+
+def test_find_latest_matches_company_and_job(store):
+    store.save("テスト工業", "求人A", "古い")
+    newer = store.save("テスト工業", "求人A", "新しい")
+    store.save("テスト工業", "求人B", "別の求人")
+    assert store.find_latest(" テスト工業", "求人A\n")["id"] == newer
+    assert store.find_latest("テスト工業", "求人C") is None
+
+
+def test_search_full_text_and_short_terms(store):
+    a = store.save("テスト工業", "求人", "## Step1\n電動化への投資を拡大", step0=STEP0)
+    b = store.save("サンプル商事", "求人", "## Step1\n海外物流網の強化", step0={"industry_keyword": "商社"})
+
+    assert [r["id"] for r in store.search("電動化")] == [a]
+    assert [r["id"] for r in store.search("商社")] == [b]  # 業界キーワード(2文字は部分一致)
+    assert [r["id"] for r in store.search("サンプル 物流")] == [b]
+    assert store.search("電動化 物流") == []
+    assert {r["id"] for r in store.search("")} == {a, b}
+    assert "final_report" not in store.search("")[0]
+    if store.fts_enabled:
+        assert "電動化" in store.search("電動化")[0]["snippet"]
+
+
+def test_search_escapes_like_wildcards(store):
+    store.save("テスト工業", "求人", "成長率100%")
+    assert len(store.search("%")) == 1
+    assert store.search("_") == []
+
+
+def test_iter_reports_skips_missing(store):
+    a = store.save("A社", "求人", "本文A")
+    b = store.save("B社", "求人", "本文B")
+    assert [r["final_report"] for r in store.iter_reports([b, "missing", a])] == ["本文B", "本文A"]
@@ -0,0 +1,64 @@
+"""IR PDF検索の発行回数(SerpAPIの課金単位)"""
+import threading
+
+import pytest
+
+from modules import serp_api
+
+COMPANY = "テスト工業株式会社"
+QUERIES = ["q0", "q1", "q2", "q3", "q4", "q5"]
+
+
+def _is_pdf(link):
+    return link.endswith(".pdf")
+
+
+def _make_search(hits):
+    """hits に含まれるクエリだけPDFを返す GoogleSearch 代替と、発行したクエリの記録"""
+    issued = []
+    lock = threading.Lock()
+
+    class FakeSearch:
+        def __init__(self, params):
+            self.q = params["q"]
+
+        def get_dict(self):
+            with lock:
+                issued.append(self.q)
+            if self.q in hits:
+                return {"organic_results": [{"link": "https://example.com/" + self.q + ".pdf", "title": hits[self.q]}]}
+            return {"organic_results": []}
+
+    return FakeSearch, issued
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setenv("SERPAPI_CACHE_DISABLE", "1")
+    monkeypatch.delenv("REPLAY_MODE", raising=False)
+
+
+def test_default_concurrency_is_sequential():
+    assert serp_api.SERPAPI_IR_CONCURRENCY == 1
+
+
+def test_parallel_top_query_hit_issues_one_query():
+    search, issued = _make_search({"q0": COMPANY + " 決算説明資料"})
+    url = serp_api._search_ir_pdf_parallel(search, QUERIES, COMPANY, "key", _is_pdf, 4)
+    assert url == "https://example.com/q0.pdf"
+    assert issued == ["q0"]
+
+
+def test_parallel_fans_out_only_after_miss():
+    search, issued = _make_search({"q2": COMPANY + " 決算短信"})
+    url = serp_api._search_ir_pdf_parallel(search, QUERIES, COMPANY, "key", _is_pdf, 2)
+    assert url == "https://example.com/q2.pdf"
+    # 最優先クエリ + 最初のウェーブ(2件)だけで止まる
+    assert issued[0] == "q0"
+    assert sorted(issued[1:]) == ["q1", "q2"]
+
+
+def test_parallel_no_hit_issues_each_query_once():
+    search, issued = _make_search({})
+    assert serp_api._search_ir_pdf_parallel(search, QUERIES, COMPANY, "key", _is_pdf, 4) is None
+    assert sorted(issued) == QUERIES